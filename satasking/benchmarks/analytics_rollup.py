@@ -0,0 +1,89 @@
+"""Compare the analytics aggregates computed from the rollups against scanning the executions.
+
+Executions are inserted in a temporary SQLite database and their `SatelliteHour` rollups built,
+then each aggregate is computed for all the history and for one day, from the rollups and from
+the executions table. It also measures the incremental update of the rollups on a dispatch.
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.analytics_rollup --executions 1000000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.executions_api import START, populate
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from simulator import analytics
+from simulator.models import SatelliteHour, Task, TaskExecution, link_resources
+
+
+def best_time(function, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--executions', type=int, default=1000000)
+    parser.add_argument('--dispatch', type=int, default=10000,
+                        help="Executions of the dispatch whose rollups are updated.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DEBUG = False
+
+    with tempfile.TemporaryDirectory() as folder:
+        settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(folder, 'bench.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        populate(args.satellites, args.tasks, args.executions)
+        link_resources(Task.objects.all())
+        elapsed, _ = best_time(SatelliteHour.rebuild, 1)
+        print("{} executions, {} rollups built in {:.1f}s".format(
+            args.executions, SatelliteHour.objects.count(), elapsed))
+
+        day = {'since': START + timedelta(days=1), 'until': START + timedelta(days=2)}
+        executions, rollups = TaskExecution.objects.all(), SatelliteHour.objects.all()
+        day_executions = executions.filter(date_time__gte=day['since'],
+                                           date_time__lt=day['until'])
+        day_rollups = rollups.filter(hour__gte=day['since'], hour__lt=day['until'])
+        total = analytics.capacity()
+        cases = [
+            ('payoff, all', lambda: analytics.payoff_by_hour(rollups),
+             lambda: analytics.scan_payoff_by_hour(executions)),
+            ('payoff, day', lambda: analytics.payoff_by_hour(day_rollups),
+             lambda: analytics.scan_payoff_by_hour(day_executions)),
+            ('utilization, all', lambda: analytics.utilization(rollups, total),
+             lambda: analytics.scan_utilization(executions, total)),
+            ('utilization, day', lambda: analytics.utilization(day_rollups, total),
+             lambda: analytics.scan_utilization(day_executions, total)),
+        ]
+        print("{:17} {:>7} {:>11} {:>11} {:>8}".format('aggregate', 'rows', 'rollups ms',
+                                                        'scan ms', 'speedup'))
+        for name, rollup_function, scan_function in cases:
+            rollup_time, rows = best_time(lambda: list(rollup_function()), args.repeat)
+            scan_time, scanned = best_time(lambda: list(scan_function()), args.repeat)
+            assert rows == scanned, name
+            print("{:17} {:>7} {:>11.1f} {:>11.1f} {:>7.0f}x".format(
+                name, len(rows), rollup_time * 1e3, scan_time * 1e3, scan_time / rollup_time))
+
+        now = timezone.now()
+        dispatched = [(idx % args.satellites + 1, now, 1, 1) for idx in range(args.dispatch)]
+        elapsed, _ = best_time(lambda: SatelliteHour.add(dispatched), 1)
+        print("rollups of a {} executions dispatch updated in {:.1f} ms".format(
+            args.dispatch, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Measure the dispatch throughput of a ground station sharded in 1 to 4 node processes.
+
+Satellites are sharded between the nodes by consistent hashing, and a batch of tasks is
+dispatched through the `Coordinator`. Nodes solve their part in parallel, so with a CPU by node
+the dispatch takes as long as the busiest node: each node is also timed alone with its part of
+the batch, to show the scaling on hosts with less CPUs than nodes. Run from the project folder
+with:
+
+    satasking/ $ python -m benchmarks.cluster_scaling --satellites 4000 --tasks 100000
+"""
+import argparse
+import logging
+import os
+import time
+
+from benchmarks.dispatch_matching import FakeClient, build_workload
+
+from django.conf import settings
+
+from simulator.cluster import Coordinator
+from simulator.journal import task_record
+
+
+def start(n_nodes, clients):
+    coordinator = Coordinator(settings.DEFAULT_SERVER_HOSTNAME, 0, n_nodes)
+    for client, resources in clients:
+        coordinator.call(coordinator.ring.node_for(client.name), 'update_resources',
+                         FakeClient(client.name), resources, client.name)
+    return coordinator
+
+
+def run(n_nodes, clients, tasks):
+    """Return the wall time of the dispatch through the coordinator, the time of the busiest
+    node dispatching its part alone, and the dispatched tasks and payoff.
+    """
+    coordinator = start(n_nodes, clients)
+    try:
+        begin = time.perf_counter()
+        assignments = coordinator.dispatch_assignments(tasks)
+        wall = time.perf_counter() - begin
+    finally:
+        coordinator.server_close()
+    coordinator = start(n_nodes, clients)
+    try:
+        busiest = 0
+        for node in range(n_nodes):
+            commands = [None] * n_nodes
+            commands[node] = ('dispatch', ([task_record(task) for task in tasks[node::n_nodes]],))
+            begin = time.perf_counter()
+            coordinator._run(commands)
+            busiest = max(busiest, time.perf_counter() - begin)
+    finally:
+        coordinator.server_close()
+    return wall, busiest, len(assignments), sum(task.payoff for task, _ in assignments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=4000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--nodes', type=int, default=4, help="Up to this amount of nodes.")
+    parser.add_argument('--resources', type=int, default=400, help="Resource universe size.")
+    parser.add_argument('--client-resources', type=int, default=40)
+    parser.add_argument('--task-resources', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DISPATCH_WINDOW = 0
+
+    clients, tasks = build_workload(args.satellites, args.tasks, args.resources,
+                                    args.client_resources, args.task_resources, args.seed)
+    print("{} satellites, {} tasks, {} CPUs".format(len(clients), len(tasks), os.cpu_count()))
+    print("{:>5} {:>9} {:>14} {:>12} {:>16} {:>8} {:>11} {:>9}".format(
+        'nodes', 'wall ms', 'wall tasks/s', 'busiest ms', 'busiest tasks/s', 'scaling',
+        'dispatched', 'payoff'))
+    baseline = None
+    for n_nodes in range(1, args.nodes + 1):
+        wall, busiest, dispatched, payoff = run(n_nodes, clients, tasks)
+        baseline = baseline or busiest
+        print("{:>5} {:>9.0f} {:>14.0f} {:>12.0f} {:>16.0f} {:>7.2f}x {:>11} {:>9}".format(
+            n_nodes, wall * 1000, len(tasks) / wall, busiest * 1000, len(tasks) / busiest,
+            baseline / busiest, dispatched, payoff))
+
+
+if __name__ == '__main__':
+    main()
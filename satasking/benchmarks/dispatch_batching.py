@@ -0,0 +1,124 @@
+"""Compare dispatching tasks as one message per task or one batch message per client.
+
+The clients run in a child process (multiplexed in an asyncio loop) with the framed protocol,
+offering or not the batch messages in the ping. Each client can execute `tasks / clients` tasks.
+Without batches, tasks are sent with a write per task (`single`, as before batches were added)
+or with all the task messages of a client joined in one write (`joined`).
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.dispatch_batching --clients 100 --tasks 50000
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+
+from benchmarks.dispatch_matching import FakeTask
+from benchmarks.server_scaling import SERVERS
+from simulator.messages import MSG_BATCH, MSG_FRAMED, TYPE_PING, TYPE_RESOURCES, TYPE_TASK
+from simulator.protocol import FramedProtocol, TextProtocol
+from simulator.solvers import task_resources
+
+
+def run_clients(address, n_clients, tasks_by_client, features, queue):
+    """Connect `n_clients`, wait until all their tasks arrive and report the time to `queue`."""
+
+    async def handshake(idx):
+        reader, writer = await asyncio.open_connection(*address)
+        protocol = FramedProtocol()
+        writer.write(TextProtocol().encode(TYPE_PING, features))
+        await reader.read(1024)  # Pong, the framed protocol is used from now on
+        resources = ['c{}-{}'.format(idx, res) for res in range(tasks_by_client)]
+        writer.write(protocol.encode(TYPE_RESOURCES, resources, 's%d' % idx))
+        await reader.read(1024)
+        return reader, writer, protocol
+
+    async def wait_tasks(reader, protocol):
+        received = 0
+        while received < tasks_by_client:
+            for kind, fields in protocol.feed(await reader.read(65536)):
+                received += 1 if kind == TYPE_TASK else len(fields[0])
+        return time.time()
+
+    async def main():
+        connections = [await handshake(idx) for idx in range(n_clients)]
+        queue.put(True)
+        arrivals = await asyncio.gather(
+            *[wait_tasks(reader, protocol) for reader, _, protocol in connections])
+        queue.put(max(arrivals))
+        for _, writer, _ in connections:
+            writer.close()
+
+    asyncio.run(main())
+
+
+def measure(mode, n_clients, n_tasks, variant):
+    server = SERVERS[mode]('localhost', 0)
+    th_server = threading.Thread(target=server.serve_forever)
+    th_server.start()
+    tasks_by_client = n_tasks // n_clients
+    features = [MSG_FRAMED, MSG_BATCH] if variant == 'batch' else [MSG_FRAMED]
+
+    queue = multiprocessing.Queue()
+    clients = multiprocessing.Process(
+        target=run_clients, args=(server.server_address, n_clients, tasks_by_client, features,
+                                  queue))
+    clients.start()
+    queue.get()
+    while len(server.clients) < n_clients:
+        time.sleep(0.01)
+
+    writes = []
+    for client in server.clients:
+        write = client._write
+
+        def counted_write(data, write=write):
+            writes.append(len(data))
+            write(data)
+        client._write = counted_write
+        if variant == 'single':
+            client.new_tasks_available = lambda tasks, client=client: [
+                client.send(TYPE_TASK, task.name, task.payoff, task_resources(task))
+                for task in tasks]
+
+    tasks = [FakeTask('t{}-{}'.format(idx, res), 1, 'c{}-{}'.format(idx, res))
+             for res in range(tasks_by_client) for idx in range(n_clients)]
+    start, wall_start = time.perf_counter(), time.time()
+    server.dispatch_tasks(tasks)
+    dispatch_time = time.perf_counter() - start
+    delivery = queue.get() - wall_start
+    clients.join()
+
+    server.shutdown()
+    th_server.join()
+    server.server_close()
+    return {
+        'dispatch_ms': dispatch_time * 1000,
+        'delivery_ms': delivery * 1000,
+        'writes': len(writes),
+        'bytes': sum(writes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--modes', nargs='+', default=sorted(SERVERS), choices=sorted(SERVERS))
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print("{} tasks dispatched to {} clients".format(args.tasks, args.clients))
+    print("{:9} {:>7} {:>12} {:>12} {:>8} {:>12}".format(
+        'mode', 'sends', 'dispatch ms', 'delivery ms', 'writes', 'bytes'))
+    for mode in args.modes:
+        for variant in ('single', 'joined', 'batch'):
+            result = measure(mode, args.clients, args.tasks, variant)
+            print("{:9} {:>7} {dispatch_ms:>12.1f} {delivery_ms:>12.1f} {writes:>8} "
+                  "{bytes:>12}".format(mode, variant, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Measure the latency of the dispatch API against dispatching in the request, by batch size.
+
+Tasks are inserted in a temporary SQLite database and dispatched to satellites connected to an
+in-process ground station. Each batch is dispatched synchronously (as the admin action does),
+and through the API by filter and by ids, timing the request and then the job in the worker.
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.dispatch_jobs --batches 100 1000 10000 100000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.dispatch_matching import FakeClient
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+
+from simulator.ground_station import GroundStationServer
+from simulator.models import DispatchJob, GroundStation, Satellite, Task, link_resources
+
+
+def populate(n_satellites, batches):
+    """Insert the tasks of each batch, requiring its own resource so they can be filtered."""
+    resources = ['b%d' % batch for batch in batches]
+    Satellite.objects.bulk_create(
+        [Satellite(name='s%d' % i, resources=','.join(resources)) for i in range(n_satellites)])
+    satellites = list(Satellite.objects.all())  # SQLite doesn't return the ids of bulk_create
+    link_resources(satellites)
+    for batch in batches:
+        Task.objects.bulk_create(
+            [Task(name='t%d' % i, payoff=i % 100 + 1, resources='b%d' % batch)
+             for i in range(batch)])
+        link_resources(Task.objects.filter(resources='b%d' % batch))
+    return satellites
+
+
+def start_server(satellites):
+    """Run a ground station with the `satellites` connected and free."""
+    if settings.SERVER is not None:
+        settings.SERVER.server_close()
+    server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+    for sat in satellites:
+        server.update_resources(FakeClient(sat.name), sat.resources.split(','), sat.name)
+    settings.SERVER = server
+
+
+def wait(job_id):
+    while True:
+        job = DispatchJob.objects.get(pk=job_id)
+        if job.status in (DispatchJob.DONE, DispatchJob.FAILED):
+            return job
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--satellites', type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DEBUG = False
+    settings.DISPATCH_WINDOW = 0
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    with tempfile.TemporaryDirectory() as folder:
+        settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(folder, 'bench.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        satellites = populate(args.satellites, args.batches)
+        station = GroundStation.load()
+        client = Client()
+        client.force_login(User.objects.create_superuser('admin', '', 'admin'))
+        print("{:>7} {:>10} {:>16} {:>14} {:>15} {:>13}".format(
+            'tasks', 'sync ms', 'filter req ms', 'ids req ms', 'filter job ms', 'ids job ms'))
+        for batch in args.batches:
+            tasks = list(Task.objects.filter(resources='b%d' % batch))
+            start_server(satellites)
+            start = time.perf_counter()
+            station.dispatch_tasks(tasks)
+            sync = time.perf_counter() - start
+
+            times = []
+            for query in ({'filter': {'resource': 'b%d' % batch}},
+                          {'tasks': [task.pk for task in tasks]}):
+                start_server(satellites)
+                start = time.perf_counter()
+                response = client.post('/api/dispatch/', json.dumps(query),
+                                       content_type='application/json')
+                times.append(time.perf_counter() - start)
+                wait(response.json()['id'])
+                times.append(time.perf_counter() - start)
+            filter_req, filter_job, ids_req, ids_job = times
+            print("{:>7} {:>10.1f} {:>16.1f} {:>14.1f} {:>15.1f} {:>13.1f}".format(
+                batch, sync * 1000, filter_req * 1000, ids_req * 1000, filter_job * 1000,
+                ids_job * 1000))
+        settings.SERVER.server_close()
+
+
+if __name__ == '__main__':
+    main()
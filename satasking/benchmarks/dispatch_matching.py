@@ -0,0 +1,123 @@
+"""Compare the set intersection greedy against the `ResourceIndex` one in `dispatch_tasks`.
+
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.dispatch_matching --clients 10000 --tasks 100000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+sys.path.append('.')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satasking.settings')
+import django
+django.setup()
+
+from django.conf import settings
+
+from simulator.ground_station import GroundStationServer
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class FakeClient:
+    """Stand in for `GroundStationHandler`, it doesn't send anything."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def new_task_available(self, task):
+        pass
+
+    def new_tasks_available(self, tasks):
+        pass
+
+
+def build_workload(n_clients, n_tasks, n_resources, client_resources, task_resources, seed):
+    rnd = random.Random(seed)
+    universe = [str(r) for r in range(n_resources)]
+    clients = [(FakeClient('s%d' % i), rnd.sample(universe, client_resources))
+               for i in range(n_clients)]
+    tasks = [FakeTask('t%d' % i, rnd.randint(1, 100),
+                      ','.join(rnd.sample(universe, rnd.randint(1, task_resources))))
+             for i in range(n_tasks)]
+    return clients, tasks
+
+
+def set_based_dispatch(clients, tasks):
+    """Previous `dispatch_tasks` loop, picking the first registered client on ties."""
+    order = {client: idx for idx, (client, _) in enumerate(clients)}
+    resources_by_clients = defaultdict(set)
+    for client, resources in clients:
+        for res in resources:
+            resources_by_clients[res].add(client)
+    results = dict()
+    payoff_by_resources = [
+        (idx, float(t.payoff) / len(t.resources)) for idx, t in enumerate(tasks)
+    ]
+    payoff_by_resources.sort(key=lambda x: x[1], reverse=True)
+    for idx, _ in payoff_by_resources:
+        task_resources = tasks[idx].resources.split(',')
+        clients_available = set(order)
+        for tr in task_resources:
+            clients_available &= resources_by_clients[tr]
+        if clients_available:
+            candidate = min(clients_available, key=order.__getitem__)
+            for r in task_resources:
+                resources_by_clients[r].remove(candidate)
+            results[tasks[idx].name] = candidate.name
+    return results
+
+
+def index_dispatch(clients, tasks):
+    server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+    try:
+        for client, resources in clients:
+            server.update_resources(client, resources, client.name)
+        return server.dispatch_tasks(tasks)
+    finally:
+        server.server_close()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--resources', type=int, default=200, help="Resource universe size.")
+    parser.add_argument('--client-resources', type=int, default=20)
+    parser.add_argument('--task-resources', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-set-based', action='store_true',
+                        help="Only run the index based dispatch (the set based one is slow).")
+    args = parser.parse_args()
+
+    # Keep dispatch log output out of the measures
+    logging.disable(logging.ERROR)
+
+    clients, tasks = build_workload(args.clients, args.tasks, args.resources,
+                                    args.client_resources, args.task_resources, args.seed)
+    print("{} clients, {} tasks, {} resources".format(len(clients), len(tasks), args.resources))
+
+    index_results, index_time = timed(index_dispatch, clients, tasks)
+    print("index:     {:8.3f}s  assigned={}".format(index_time, len(index_results)))
+    if not args.skip_set_based:
+        set_results, set_time = timed(set_based_dispatch, clients, tasks)
+        print("set based: {:8.3f}s  assigned={}".format(set_time, len(set_results)))
+        print("speedup:   {:8.1f}x  identical={}".format(set_time / index_time,
+                                                        set_results == index_results))
+
+
+if __name__ == '__main__':
+    main()
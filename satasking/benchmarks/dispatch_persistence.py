@@ -0,0 +1,88 @@
+"""Compare saving the executions of a dispatch one by one against the bulk insert.
+
+Executions are saved in a temporary SQLite database with the assignments already solved, so
+only the persistence is measured. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.dispatch_persistence --satellites 100 --tasks 10000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+sys.path.append('.')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satasking.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+
+from simulator.models import GroundStation, Satellite, Task, TaskExecution
+
+
+def one_by_one_dispatch(gs, tasks, solver=None):
+    """Previous `GroundStation.dispatch_tasks`, three queries by execution."""
+    dispatched = settings.SERVER.dispatch_tasks(tasks, solver=solver)
+    for task, sat in dispatched.items():
+        TaskExecution.objects.create(
+            task_id=Task.objects.get(name=task).id,
+            satellite_id=Satellite.objects.get(name=sat).id
+        )
+
+
+def bulk_dispatch(gs, tasks, solver=None):
+    gs.dispatch_tasks(tasks, solver=solver)
+
+
+def measure(dispatch, gs, tasks):
+    TaskExecution.objects.all().delete()
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        start = time.perf_counter()
+        dispatch(gs, tasks)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(queries), TaskExecution.objects.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=10000)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as folder:
+        settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(folder, 'bench.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+
+        gs = GroundStation.objects.create()
+        satellites = Satellite.objects.bulk_create(
+            [Satellite(name='s%d' % idx, resources='1') for idx in range(args.satellites)])
+        Task.objects.bulk_create(
+            [Task(name='t%d' % idx, payoff=1, resources='1') for idx in range(args.tasks)])
+        tasks = list(Task.objects.all())
+        assignments = [(task, satellites[idx % len(satellites)].name)
+                       for idx, task in enumerate(tasks)]
+        settings.SERVER = MagicMock()
+        settings.SERVER.dispatch_assignments.return_value = assignments
+        settings.SERVER.dispatch_tasks.return_value = {task.name: sat for task, sat in assignments}
+
+        print("{} executions of {} satellites".format(args.tasks, args.satellites))
+        print("{:11} {:>10} {:>9} {:>11}".format('', 'seconds', 'queries', 'executions'))
+        for name, dispatch in (('one by one', one_by_one_dispatch), ('bulk', bulk_dispatch)):
+            elapsed, queries, executions = measure(dispatch, gs, tasks)
+            print("{:11} {:>10.3f} {:>9} {:>11}".format(name, elapsed, queries, executions))
+
+
+if __name__ == '__main__':
+    main()
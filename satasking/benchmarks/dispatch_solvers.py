@@ -0,0 +1,49 @@
+"""Compare the payoff achieved and the time spent by each dispatch solver.
+
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.dispatch_solvers --clients 1000 --tasks 10000
+"""
+import argparse
+import logging
+
+from benchmarks.dispatch_matching import build_workload
+from simulator.matching import ResourceIndex
+from simulator.solvers import SOLVERS, BranchAndBoundSolver, LocalSearchSolver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--resources', type=int, default=200, help="Resource universe size.")
+    parser.add_argument('--client-resources', type=int, default=20)
+    parser.add_argument('--task-resources', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--time-limit', type=float, default=1.0,
+                        help="Time limit for the exact and local search solvers.")
+    parser.add_argument('--solvers', nargs='+', default=sorted(SOLVERS), choices=sorted(SOLVERS))
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    clients, tasks = build_workload(args.clients, args.tasks, args.resources,
+                                    args.client_resources, args.task_resources, args.seed)
+    index = ResourceIndex()
+    for client, resources in clients:
+        index.add_client(client, resources)
+    print("{} clients, {} tasks, {} resources".format(len(clients), len(tasks), args.resources))
+
+    for name in args.solvers:
+        if name == 'exact':
+            solver = BranchAndBoundSolver(time_limit=args.time_limit)
+        elif name == 'local':
+            solver = LocalSearchSolver(time_limit=args.time_limit)
+        else:
+            solver = SOLVERS[name]()
+        result = solver.solve(tasks, index)
+        print("{:8} {:8.3f}s  assigned={:<8} payoff={}".format(
+            name, result.elapsed, len(result.assignments), result.total_payoff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Run a synthetic workload end to end and report the results as JSON.
+
+A ground station and `--satellites` `SatelliteClient`s connected over localhost, in threads of
+this process or spread over `--satellite-processes` child processes. Tasks of a `Workload`
+arrive at `--rate` tasks/sec during `--seconds`, and are submitted to the dispatch scheduler
+(`stream`) or dispatched in a call each tick (`batch`). The report has the dispatch latency and
+wait time percentiles, the payoff dispatched and achieved, the throughput and the memory of the
+ground station. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.end_to_end --satellites 50 --task-zipf 1.2 --output run.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.server_scaling import SERVERS, percentile
+from benchmarks.workloads import PAYOFFS, Workload
+from simulator.satellite import SatelliteClient
+
+
+def memory_mb():
+    """Return the current and peak resident memory of this process in MB."""
+    memory = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                memory[line.split(':')[0]] = int(line.split()[1]) / 1024.0
+    return {'rss_mb': memory.get('VmRSS', 0.0), 'peak_rss_mb': memory.get('VmHWM', 0.0)}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_satellites(address, satellites, duration):
+    """Connect the (name, resources) `satellites`, each one running in a thread."""
+    started = []
+    for name, resources in satellites:
+        client = SatelliteClient(address[0], address[1], ','.join(resources), name,
+                                 task_duration=duration)
+        client.init_client()
+        th_client = threading.Thread(target=client.run)
+        th_client.start()
+        started.append((client, th_client))
+    return started
+
+
+def stop_satellites(satellites):
+    for client, th_client in satellites:
+        client.stop()
+        th_client.join()
+
+
+def run_satellites(address, satellites, duration, stop_event):
+    """Child process: run the `satellites` until `stop_event` is set."""
+    logging.disable(logging.ERROR)
+    started = start_satellites(address, satellites, duration)
+    stop_event.wait()
+    stop_satellites(started)
+
+
+def wait_registered(server, amount, timeout=60.0):
+    """Wait until `amount` clients sent their resources to `server`."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        registered = [client for client in server.clients if 'name' in server.clients[client]]
+        if len(registered) >= amount:
+            return
+        time.sleep(0.01)
+    raise RuntimeError("Only {} of {} satellites registered".format(len(server.clients), amount))
+
+
+def run(config):
+    workload = Workload(config['resources'], config['satellite_resources'],
+                        config['task_resources'], config['satellite_zipf'], config['task_zipf'],
+                        config['payoff'], config['seed'])
+    server = SERVERS[config['mode']]('localhost', 0)
+    server.scheduler.window = config['window']
+    server.scheduler.solver = config['solver']
+    th_server = threading.Thread(target=server.serve_forever)
+    th_server.start()
+
+    satellites = workload.satellites(config['satellites'])
+    threads, processes, stop_event = [], [], multiprocessing.Event()
+    if config['satellite_processes']:
+        for part in range(config['satellite_processes']):
+            process = multiprocessing.Process(target=run_satellites, args=(
+                server.server_address, satellites[part::config['satellite_processes']],
+                config['duration'], stop_event))
+            process.start()
+            processes.append(process)
+    else:
+        threads = start_satellites(server.server_address, satellites, config['duration'])
+    wait_registered(server, len(satellites))
+
+    batch_latencies = []
+    tick, created = config['tick'], 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < config['seconds']:
+        expected = int((time.perf_counter() - start) * config['rate'])
+        tasks = workload.tasks(max(0, expected - created))
+        created += len(tasks)
+        if tasks and config['dispatch'] == 'stream':
+            server.submit_tasks(tasks)
+        elif tasks:
+            call_start = time.perf_counter()
+            server.dispatch_tasks(tasks)
+            batch_latencies.append(time.perf_counter() - call_start)
+        time.sleep(tick)
+    elapsed = time.perf_counter() - start
+    stats = dict(server.stats)
+    scheduler = server.scheduler.metrics()
+    memory = memory_mb()
+
+    stop_event.set()
+    for process in processes:
+        process.join()
+    stop_satellites(threads)
+    server.shutdown()
+    th_server.join()
+    server.server_close()
+
+    if config['dispatch'] == 'stream':
+        latencies = list(server.scheduler.dispatch_latencies.values)
+        waits = list(server.scheduler.wait_times.values)
+    else:
+        latencies, waits = batch_latencies, []
+    report = {
+        'config': config,
+        'revision': git_revision(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'elapsed': elapsed,
+        'tasks': {
+            'created': created,
+            'dispatched': stats.get('dispatched', 0),
+            'started': stats.get('started', 0),
+            'completed': stats.get('completed', 0),
+            'failed': stats.get('failed', 0),
+            'queued': scheduler['queue_depth'],
+        },
+        'payoff': {
+            'dispatched': stats.get('dispatched_payoff', 0),
+            'completed': stats.get('completed_payoff', 0),
+        },
+        'throughput': {
+            'created_per_sec': created / elapsed,
+            'completed_per_sec': stats.get('completed', 0) / elapsed,
+            'completed_payoff_per_sec': stats.get('completed_payoff', 0) / elapsed,
+        },
+        'dispatch_latency_ms': {
+            'rounds': len(latencies),
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': max(latencies, default=0.0) * 1000,
+        },
+        'memory': memory,
+    }
+    if waits:
+        report['wait_time_ms'] = {
+            'p50': percentile(waits, 50) * 1000,
+            'p90': percentile(waits, 90) * 1000,
+            'p99': percentile(waits, 99) * 1000,
+            'max': max(waits) * 1000,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', default='threaded', choices=sorted(SERVERS))
+    parser.add_argument('--dispatch', default='stream', choices=['stream', 'batch'])
+    parser.add_argument('--satellites', type=int, default=20)
+    parser.add_argument('--satellite-processes', type=int, default=0,
+                        help="Child processes running the satellites, 0 to use threads.")
+    parser.add_argument('--resources', type=int, default=100,
+                        help="Size of the resources universe.")
+    parser.add_argument('--satellite-resources', type=int, default=10)
+    parser.add_argument('--task-resources', type=int, nargs=2, default=[1, 3])
+    parser.add_argument('--satellite-zipf', type=float, default=0.0,
+                        help="Zipf exponent of the satellite resources, 0 for uniform.")
+    parser.add_argument('--task-zipf', type=float, default=0.0,
+                        help="Zipf exponent of the task resources, 0 for uniform.")
+    parser.add_argument('--payoff', default='uniform', choices=sorted(PAYOFFS))
+    parser.add_argument('--rate', type=float, default=1000.0, help="Tasks created by second.")
+    parser.add_argument('--tick', type=float, default=0.01)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--duration', type=float, nargs=2, default=[0.05, 0.2],
+                        help="Range of seconds that takes to execute a task.")
+    parser.add_argument('--window', type=float, default=0.0)
+    parser.add_argument('--solver', default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON file to write, stdout if it's not given.")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    config = vars(args).copy()
+    output = config.pop('output')
+    config['task_resources'] = tuple(config['task_resources'])
+    config['duration'] = tuple(config['duration'])
+    report = run(config)
+    if output:
+        with open(output, 'w') as out:
+            json.dump(report, out, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Measure the latency of the TaskExecution API pages with a million executions.
+
+Executions are inserted in a temporary SQLite database, and the pages are requested with the
+Django test client: cold (empty cache), deep in the cursor pagination, filtered, cached and
+revalidated with their ETag. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.executions_api --executions 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append('.')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satasking.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+
+from benchmarks.server_scaling import percentile
+from simulator.models import Satellite, Task
+
+URL = '/api/taskexecution/'
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def populate(n_satellites, n_tasks, n_executions):
+    Satellite.objects.bulk_create(
+        [Satellite(name='s%d' % idx, resources='1') for idx in range(n_satellites)])
+    Task.objects.bulk_create(
+        [Task(name='t%d' % idx, payoff=idx, resources='1') for idx in range(n_tasks)])
+    rnd = random.Random(42)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, n_executions, 100000):
+            cursor.executemany(
+                'INSERT INTO simulator_taskexecution (task_id, satellite_id, date_time) '
+                'VALUES (%s, %s, %s)',
+                [(rnd.randint(1, n_tasks), rnd.randint(1, n_satellites),
+                  START + timedelta(seconds=idx))
+                 for idx in range(start, min(start + 100000, n_executions))])
+
+
+def measure(client, requests, cold):
+    times, queries = [], []
+
+    def count_query(execute, sql, params, many, context):
+        queries[-1] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        for path, headers in requests:
+            if cold:
+                cache.clear()
+            queries.append(0)
+            start = time.perf_counter()
+            response = client.get(path, **headers)
+            times.append(time.perf_counter() - start)
+            assert response.status_code in (200, 304), response.status_code
+    return times, max(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--executions', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    rnd = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as folder:
+        settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(folder, 'bench.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        start = time.perf_counter()
+        populate(args.satellites, args.tasks, args.executions)
+        print("{} executions inserted in {:.1f}s".format(
+            args.executions, time.perf_counter() - start))
+        client = Client()
+
+        # Cursors of pages all along the history, following the `next` links
+        deep = []
+        page = client.get(URL, {'page_size': 1000}).json()
+        while page['next'] and len(deep) < args.requests:
+            deep.append((page['next'].replace('page_size=1000', 'page_size=100'), {}))
+            for _ in range(max(1, args.executions // 1000 // args.requests)):
+                if page['next']:
+                    page = client.get(page['next']).json()
+
+        def time_range():
+            since = START + timedelta(seconds=rnd.randrange(args.executions))
+            return '{}?since={}&until={}'.format(URL, since.isoformat().replace('+', '%2B'),
+                                                 (since + timedelta(hours=1)).isoformat()
+                                                 .replace('+', '%2B'))
+
+        cases = [
+            ('first page', [(URL, {})] * args.requests, True),
+            ('deep pages', deep, True),
+            ('by satellite', [(URL + '?satellite=s%d' % rnd.randrange(args.satellites), {})
+                              for _ in range(args.requests)], True),
+            ('by task', [(URL + '?task=t%d' % rnd.randrange(args.tasks), {})
+                         for _ in range(args.requests)], True),
+            ('time range', [(time_range(), {}) for _ in range(args.requests)], True),
+            ('cached', [(URL, {})] * args.requests, False),
+        ]
+        etag = client.get(URL)['ETag']
+        cases.append(('not modified', [(URL, {'HTTP_IF_NONE_MATCH': etag})] * args.requests,
+                      False))
+
+        print("{:13} {:>9} {:>9} {:>9} {:>8}".format('request', 'p50 ms', 'p95 ms', 'max ms',
+                                                      'queries'))
+        for name, requests, cold in cases:
+            times, queries = measure(client, requests, cold)
+            times.sort()
+            print("{:13} {:>9.2f} {:>9.2f} {:>9.2f} {:>8}".format(
+                name, percentile(times, 50) * 1e3, percentile(times, 95) * 1e3, times[-1] * 1e3,
+                queries))
+
+
+if __name__ == '__main__':
+    main()
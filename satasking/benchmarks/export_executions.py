@@ -0,0 +1,94 @@
+"""Measure the streaming export of the executions: time, size and peak memory by format.
+
+Executions are inserted in a temporary SQLite database and exported with the view, consuming
+its streaming response. The peak memory is the growth of the process resident memory (VmHWM,
+reset before each export). `--materialized` measures too serializing all the executions at once
+with the API serializer, as the API did before its pagination. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.export_executions --executions 1000000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.executions_api import populate
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+
+from simulator import export
+from simulator.models import TaskExecution
+from simulator.serializers import TaskExecutionSerializer
+
+
+def memory_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak():
+    """Reset VmHWM to the current resident memory, see proc(5)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def measure(function):
+    reset_peak()
+    before = memory_kb('VmRSS')
+    start = time.perf_counter()
+    size = function()
+    elapsed = time.perf_counter() - start
+    return elapsed, size, (memory_kb('VmHWM') - before) / 1024
+
+
+def streamed(client, format):
+    def function():
+        response = client.get('/export/executions.' + format)
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return function
+
+
+def materialized():
+    queryset = TaskExecution.objects.select_related('task', 'satellite').order_by('id')
+    return len(json.dumps(TaskExecutionSerializer(queryset, many=True).data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--executions', type=int, default=1000000)
+    parser.add_argument('--materialized', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DEBUG = False  # Don't keep the queries
+
+    with tempfile.TemporaryDirectory() as folder:
+        settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(folder, 'bench.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        populate(args.satellites, args.tasks, args.executions)
+        client = Client()
+
+        print("{} executions".format(args.executions))
+        print("{:13} {:>9} {:>10} {:>9} {:>14}".format('format', 'seconds', 'rows/s', 'MB',
+                                                        'peak memory MB'))
+        cases = [(format, streamed(client, format)) for format in sorted(export.FORMATS)]
+        if args.materialized:
+            cases.append(('materialized', materialized))
+        for name, function in cases:
+            elapsed, size, peak = measure(function)
+            print("{:13} {:>9.2f} {:>10.0f} {:>9.1f} {:>14.1f}".format(
+                name, elapsed, args.executions / elapsed, size / 1e6, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare the incremental dispatch rounds of the scheduler against re-evaluating the queue.
+
+A backlog of tasks that no satellite can execute is queued, and then satellites connect one by
+one with a few resources each. Each connection triggers a round with only the tasks that
+require some of its resources (incremental) or with all the queued ones (full). Run from the
+project folder with:
+
+    satasking/ $ python -m benchmarks.incremental_dispatch --tasks 100000
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.dispatch_matching import FakeClient, build_workload
+from benchmarks.server_scaling import percentile
+
+from django.conf import settings
+
+from simulator.ground_station import GroundStationServer
+
+
+def run_events(tasks, clients, incremental):
+    server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+    try:
+        server.submit_tasks(tasks)  # Nobody is connected yet, so everything stays queued
+        scheduler = server.scheduler
+        evaluated = scheduler.metrics()['evaluated']
+        times = []
+        for client, resources in clients:
+            server.clients.register(client, resources, client.name)
+            start = time.perf_counter()
+            scheduler.trigger(resources if incremental else None)
+            times.append(time.perf_counter() - start)
+        metrics = scheduler.metrics()
+        return {
+            'p50': percentile(times, 50) * 1000,
+            'p99': percentile(times, 99) * 1000,
+            'evaluated': (metrics['evaluated'] - evaluated) / len(clients),
+            'dispatched': metrics['dispatched'],
+            'payoff': server.stats['dispatched_payoff'],
+        }
+    finally:
+        server.scheduler.stop()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--events', type=int, default=50, help="Satellites that connect.")
+    parser.add_argument('--resources', type=int, default=1000, help="Resource universe size.")
+    parser.add_argument('--client-resources', type=int, default=3)
+    parser.add_argument('--task-resources', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DISPATCH_WINDOW = 0
+
+    clients, tasks = build_workload(args.events, args.tasks, args.resources,
+                                    args.client_resources, args.task_resources, args.seed)
+    clients = [(FakeClient(client.name), resources) for client, resources in clients]
+    print("{} queued tasks, {} satellites connecting".format(len(tasks), len(clients)))
+    print("{:>12} {:>12} {:>12} {:>10} {:>11} {:>9}".format(
+        'rounds', 'trigger p50', 'trigger p99', 'evaluated', 'dispatched', 'payoff'))
+    for name, incremental in (('full', False), ('incremental', True)):
+        result = run_events(tasks, clients, incremental)
+        print("{:>12} {p50:>9.2f} ms {p99:>9.2f} ms {evaluated:>10.0f} {dispatched:>11} "
+              "{payoff:>9}".format(name, **result))
+
+
+if __name__ == '__main__':
+    main()
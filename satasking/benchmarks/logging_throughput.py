@@ -0,0 +1,95 @@
+"""Measure the messages/sec handled by the ground station with the logging and tracing modes.
+
+A handler without socket receives heartbeats (one by read) and answers each one, so every
+message is logged twice. Modes:
+
+* `off`: INFO level, the default without DEBUG.
+* `eager`: INFO level, formatting each read as before the lazy logging.
+* `debug`, `debug-sampled`: DEBUG level to /dev/null, logging every message or 1 of 100.
+* `trace-jsonl`, `trace-binary`: INFO level, recording every message to a trace file.
+
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.logging_throughput --messages 200000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.metrics_overhead import FakeHandler
+from django.conf import settings
+
+from simulator import ground_station, tracing
+from simulator.ground_station import GroundStationServer
+from simulator.messages import TYPE_HEARTBEAT
+from simulator.protocol import FramedProtocol
+
+MODES = ['off', 'eager', 'debug', 'debug-sampled', 'trace-jsonl', 'trace-binary']
+
+
+class EagerHandler(FakeHandler):
+    """Formats each read and write, as the handlers did before."""
+
+    def data_received(self, data):
+        ground_station.logger.debug("Received message: {} from peer: {}".format(
+            data, self.client_address))
+        super().data_received(data)
+
+    def _write(self, data):
+        ground_station.logger.debug("Sent message: {} to peer: {}".format(
+            data, self.client_address))
+
+
+def measure(mode, n_messages):
+    logger = logging.getLogger('simulator')
+    null_handler = logging.StreamHandler(open(os.devnull, 'w'))
+    logger.addHandler(null_handler)
+    logger.setLevel(logging.DEBUG if mode.startswith('debug') else logging.INFO)
+    ground_station.message_log.sample = 100 if mode == 'debug-sampled' else 1
+    ground_station.message_log.count = 0
+    trace = None
+    if mode.startswith('trace'):
+        fd, trace = tempfile.mkstemp()
+        os.close(fd)
+        tracing.start_trace(trace, mode.split('-')[1])
+
+    server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+    try:
+        handler = (EagerHandler if mode == 'eager' else FakeHandler)(server)
+        handler.server.update_resources(handler, ['1'], 's1')
+        data = FramedProtocol().encode(TYPE_HEARTBEAT)
+        start = time.perf_counter()
+        for _ in range(n_messages):
+            handler.data_received(data)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.server_close()
+        logger.removeHandler(null_handler)
+        null_handler.stream.close()
+        logger.setLevel(logging.NOTSET)
+        tracing.stop_trace()
+    size = 0
+    if trace:
+        size = os.path.getsize(trace)
+        os.remove(trace)
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    args = parser.parse_args()
+
+    print("{} heartbeats received and answered".format(args.messages))
+    print("{:14} {:>9} {:>12} {:>11}".format('mode', 'seconds', 'messages/s', 'trace MB'))
+    for mode in args.modes:
+        elapsed, size = measure(mode, args.messages)
+        print("{:14} {:>9.3f} {:>12.0f} {:>11.1f}".format(
+            mode, elapsed, args.messages * 2 / elapsed, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
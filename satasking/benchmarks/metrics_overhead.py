@@ -0,0 +1,89 @@
+"""Measure the overhead of the metrics in the hot paths, with `METRICS_ENABLED` on and off.
+
+Two paths are measured: `dispatch_tasks` (phase timers and tasks counters) and the handling of
+the task feedback messages received by the ground station (bytes and messages counters).
+Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.metrics_overhead --clients 1000 --tasks 100000
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.dispatch_matching import build_workload
+from django.conf import settings
+
+from simulator import metrics
+from simulator.ground_station import GroundStationHandlerMixin, GroundStationServer
+from simulator.messages import TYPE_ACK
+from simulator.protocol import FramedProtocol
+
+
+class FakeHandler(GroundStationHandlerMixin):
+    """Handler without a socket, that drops the data written."""
+
+    def __init__(self, server):
+        self.server = server
+        self.client_address = ('localhost', 0)
+        self.setup()
+        self.protocol = FramedProtocol()
+
+    def _write(self, data):
+        pass
+
+
+def dispatch(clients, tasks):
+    server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+    try:
+        for client, resources in clients:
+            server.update_resources(client, resources, client.name)
+        start = time.perf_counter()
+        server.dispatch_tasks(tasks)
+        return time.perf_counter() - start
+    finally:
+        server.server_close()
+
+
+def receive(n_messages, by_read):
+    server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+    try:
+        handler = FakeHandler(server)
+        data = b''.join(FramedProtocol().encode(TYPE_ACK, 't%d' % idx) for idx in range(by_read))
+        start = time.perf_counter()
+        for _ in range(n_messages // by_read):
+            handler.data_received(data)
+        return time.perf_counter() - start
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--messages', type=int, default=500000)
+    parser.add_argument('--messages-by-read', type=int, default=1,
+                        help="Messages in each chunk of data received.")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    clients, tasks = build_workload(args.clients, args.tasks, 200, 20, 3, 42)
+    print("{:10} {:>8} {:>10} {:>10} {:>9}".format('path', 'metrics', 'seconds', 'per op us',
+                                                    'overhead'))
+    for path, func, ops, func_args in (
+            ('dispatch', dispatch, args.tasks, (clients, tasks)),
+            ('receive', receive, args.messages, (args.messages, args.messages_by_read))):
+        times = {False: float('inf'), True: float('inf')}
+        for _ in range(args.repeat):  # Alternated, so both see the same machine state
+            for enabled in (False, True):
+                metrics.REGISTRY.enabled = enabled
+                times[enabled] = min(times[enabled], func(*func_args))
+        for enabled in (False, True):
+            print("{:10} {:>8} {:>10.3f} {:>10.3f} {:>8.1f}%".format(
+                path, 'on' if enabled else 'off', times[enabled], times[enabled] / ops * 1e6,
+                (times[enabled] / times[False] - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
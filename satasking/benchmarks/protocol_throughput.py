@@ -0,0 +1,106 @@
+"""Compare the messages/sec of the text and the framed protocols.
+
+Measures encoding plus decoding of task messages one by one for both protocols, and the framed
+protocol decoded in big chunks and streamed through a local socket, where messages are split
+and coalesced by the kernel (the text protocol can't be used that way, it needs one read per
+message). Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.protocol_throughput --messages 200000
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append('.')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satasking.settings')
+import django
+django.setup()
+
+from simulator.messages import TYPE_TASK
+from simulator.protocol import FramedProtocol, TextProtocol
+
+
+def build_messages(n_messages, n_resources):
+    resources = [str(r) for r in range(n_resources)]
+    return [(TYPE_TASK, ('task-%d' % idx, idx % 1000, resources)) for idx in range(n_messages)]
+
+
+def codec_rate(protocol_class, messages):
+    """Return messages/sec encoding and decoding each message on its own."""
+    sender, receiver = protocol_class(), protocol_class()
+    start = time.perf_counter()
+    for kind, fields in messages:
+        receiver.feed(sender.encode(kind, *fields))
+    return len(messages) / (time.perf_counter() - start)
+
+
+def stream_rate(messages, chunk_size):
+    """Return messages/sec encoding framed messages and decoding them in `chunk_size` chunks."""
+    sender, receiver = FramedProtocol(), FramedProtocol()
+    start = time.perf_counter()
+    data = b''.join(sender.encode(kind, *fields) for kind, fields in messages)
+    received = 0
+    for offset in range(0, len(data), chunk_size):
+        received += len(receiver.feed(data[offset:offset + chunk_size]))
+    assert received == len(messages)
+    return received / (time.perf_counter() - start)
+
+
+def message_size(protocol_class, messages):
+    protocol = protocol_class()
+    return sum(len(protocol.encode(kind, *fields)) for kind, fields in messages) / len(messages)
+
+
+def socket_rate(messages, chunk_size):
+    """Return messages/sec sending framed messages through a socket pair."""
+    sender_sock, receiver_sock = socket.socketpair()
+    protocol = FramedProtocol()
+
+    def send():
+        sender = FramedProtocol()
+        for kind, fields in messages:
+            sender_sock.sendall(sender.encode(kind, *fields))
+        sender_sock.close()
+
+    received = 0
+    start = time.perf_counter()
+    th_sender = threading.Thread(target=send)
+    th_sender.start()
+    while True:
+        data = receiver_sock.recv(chunk_size)
+        if not data:
+            break
+        received += len(protocol.feed(data))
+    elapsed = time.perf_counter() - start
+    th_sender.join()
+    receiver_sock.close()
+    assert received == len(messages)
+    return received / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--resources', type=int, default=4, help="Resources by task.")
+    parser.add_argument('--chunk-size', type=int, default=65536, help="Bytes read by recv.")
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages, args.resources)
+    print("{} task messages with {} resources".format(args.messages, args.resources))
+    text_size, framed_size = (message_size(TextProtocol, messages),
+                              message_size(FramedProtocol, messages))
+    print("text size:      {:12.1f} bytes/msg".format(text_size))
+    print("framed size:    {:12.1f} bytes/msg".format(framed_size))
+    assert framed_size < text_size, "The framed protocol must be smaller than the text one"
+    print("text codec:     {:12,.0f} msg/s".format(codec_rate(TextProtocol, messages)))
+    print("framed codec:   {:12,.0f} msg/s".format(codec_rate(FramedProtocol, messages)))
+    print("framed stream:  {:12,.0f} msg/s".format(stream_rate(messages, args.chunk_size)))
+    print("framed socket:  {:12,.0f} msg/s".format(socket_rate(messages, args.chunk_size)))
+
+
+if __name__ == '__main__':
+    main()
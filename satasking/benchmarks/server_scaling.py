@@ -0,0 +1,139 @@
+"""Measure memory and latency of the ground station servers with many connected clients.
+
+The clients run in a child process (multiplexed in an asyncio loop), so the memory measured is
+the one used by the server. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.server_scaling --clients 100 1000 10000
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+
+from benchmarks.dispatch_matching import FakeTask
+from simulator.aio_ground_station import AsyncGroundStationServer
+from simulator.ground_station import GroundStationServer
+from simulator.messages import MSG_ENCODING, MSG_PING, MSG_RESOURCES_PREFIX, MSG_SEPARATOR
+
+
+SERVERS = {
+    'threaded': GroundStationServer,
+    'asyncio': AsyncGroundStationServer,
+}
+
+
+def rss_mb():
+    """Return the resident memory of the current process in MB."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def run_clients(address, n_clients, concurrency, queue):
+    """Connect `n_clients`, wait for one task in each one and report the timings to `queue`."""
+
+    async def handshake(idx, semaphore, latencies):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_connection(*address)
+                writer.write(bytes(MSG_PING, MSG_ENCODING))
+                await reader.read(1024)
+                writer.write(bytes("{}r{},shared{}s{}".format(
+                    MSG_RESOURCES_PREFIX, idx, MSG_SEPARATOR, idx), MSG_ENCODING))
+                if not await reader.read(1024):
+                    raise ConnectionError
+            except OSError:
+                return None  # Rejected by the server
+            latencies.append(time.perf_counter() - start)
+        return reader, writer
+
+    async def wait_task(reader, arrivals):
+        await reader.read(1024)
+        arrivals.append(time.time())
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, arrivals = [], []
+        connections = await asyncio.gather(
+            *[handshake(idx, semaphore, latencies) for idx in range(n_clients)])
+        connections = [conn for conn in connections if conn is not None]
+        queue.put(latencies)
+        await asyncio.gather(*[wait_task(reader, arrivals) for reader, _ in connections])
+        queue.put(arrivals)
+        for _, writer in connections:
+            writer.close()
+
+    asyncio.run(main())
+
+
+def measure(mode, n_clients, concurrency):
+    server = SERVERS[mode]('localhost', 0)
+    th_server = threading.Thread(target=server.serve_forever)
+    th_server.start()
+    base_rss, base_threads = rss_mb(), threading.active_count()
+
+    queue = multiprocessing.Queue()
+    clients = multiprocessing.Process(
+        target=run_clients, args=(server.server_address, n_clients, concurrency, queue))
+    clients.start()
+    latencies = queue.get()
+    while len(server.clients) < len(latencies):
+        time.sleep(0.01)
+    rss, threads = rss_mb() - base_rss, threading.active_count() - base_threads
+
+    tasks = [FakeTask('t%d' % idx, 1, 'r%d' % idx) for idx in range(n_clients)]
+    start, wall_start = time.perf_counter(), time.time()
+    server.dispatch_tasks(tasks)
+    dispatch_time = time.perf_counter() - start
+    deliveries = [arrival - wall_start for arrival in queue.get()]
+    clients.join()
+
+    server.shutdown()
+    th_server.join()
+    server.server_close()
+    return {
+        'failed': n_clients - len(latencies),
+        'handshake_p50': percentile(latencies, 50) * 1000,
+        'handshake_p99': percentile(latencies, 99) * 1000,
+        'rss_mb': rss,
+        'threads': threads,
+        'dispatch_ms': dispatch_time * 1000,
+        'delivery_p50': percentile(deliveries, 50) * 1000,
+        'delivery_p99': percentile(deliveries, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--modes', nargs='+', default=sorted(SERVERS), choices=sorted(SERVERS))
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help="Max amount of clients doing the handshake at the same time.")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print("{:9} {:>7} {:>7} {:>14} {:>14} {:>9} {:>8} {:>12} {:>14} {:>14}".format(
+        'mode', 'clients', 'failed', 'handshake p50', 'handshake p99', 'rss (MB)', 'threads',
+        'dispatch ms', 'delivery p50', 'delivery p99'))
+    for n_clients in args.clients:
+        for mode in args.modes:
+            result = measure(mode, n_clients, args.concurrency)
+            print("{:9} {:>7} {failed:>7} {handshake_p50:>14.2f} {handshake_p99:>14.2f} "
+                  "{rss_mb:>9.1f} {threads:>8} {dispatch_ms:>12.1f} {delivery_p50:>14.1f} "
+                  "{delivery_p99:>14.1f}".format(mode, n_clients, **result))
+
+
+if __name__ == '__main__':
+    main()
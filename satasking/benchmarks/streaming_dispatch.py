@@ -0,0 +1,80 @@
+"""Measure the streaming dispatch of the scheduler with different micro-batching windows.
+
+Tasks are submitted to the scheduler every `--tick` seconds, and dispatched as they arrive and
+as satellites finish tasks (see `benchmarks.sustained_load`). Longer windows make less dispatch
+rounds with more tasks each one, at the cost of waiting more. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.streaming_dispatch --windows 0 0.005 0.02 0.1
+"""
+import argparse
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from benchmarks.server_scaling import SERVERS
+from benchmarks.sustained_load import random_tasks, start_constellation, stop_constellation
+
+
+def run_stream(mode, window, n_satellites, n_resources, seconds, tick, tasks_by_tick, duration,
+               seed):
+    rnd = random.Random(seed)
+    universe = [str(r) for r in range(n_resources)]
+    settings.DISPATCH_WINDOW = window
+    constellation = start_constellation(mode, n_satellites, universe, duration)
+    server = constellation[0]
+
+    created = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        tasks = random_tasks(rnd, universe, len(created), tasks_by_tick)
+        created.extend(tasks)
+        server.submit_tasks(tasks)
+        time.sleep(tick)
+    elapsed = time.perf_counter() - start
+    metrics = server.scheduler.metrics()
+    completed = server.stats['completed']
+    payoff = (sum(task.payoff for task in created) -
+              sum(task.payoff for task in server.scheduler.tasks))
+    stop_constellation(*constellation)
+    return {
+        'completed_per_sec': completed / elapsed,
+        'rounds': metrics['rounds'],
+        'queue_depth': metrics['queue_depth'],
+        'wait_p50': metrics['wait_time']['p50'] * 1000,
+        'wait_p99': metrics['wait_time']['p99'] * 1000,
+        'latency_p50': metrics['dispatch_latency']['p50'] * 1000,
+        'latency_p99': metrics['dispatch_latency']['p99'] * 1000,
+        'payoff_per_sec': payoff / elapsed,  # Of the dispatched tasks
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 0.005, 0.02, 0.1])
+    parser.add_argument('--satellites', type=int, default=20)
+    parser.add_argument('--resources', type=int, default=10, help="Resources by satellite.")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--tick', type=float, default=0.01)
+    parser.add_argument('--tasks-by-tick', type=int, default=5)
+    parser.add_argument('--duration', type=float, nargs=2, default=[0.05, 0.2],
+                        help="Range of seconds that takes to execute a task.")
+    parser.add_argument('--mode', default='asyncio', choices=sorted(SERVERS))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print("{:>7} {:>12} {:>7} {:>6} {:>9} {:>9} {:>12} {:>12} {:>9}".format(
+        'window', 'completed/s', 'rounds', 'queue', 'wait p50', 'wait p99', 'dispatch p50',
+        'dispatch p99', 'payoff/s'))
+    for window in args.windows:
+        result = run_stream(args.mode, window, args.satellites, args.resources, args.seconds,
+                            args.tick, args.tasks_by_tick, args.duration, args.seed)
+        print("{:>7} {completed_per_sec:>12.1f} {rounds:>7} {queue_depth:>6} {wait_p50:>9.1f} "
+              "{wait_p99:>9.1f} {latency_p50:>12.2f} {latency_p99:>12.2f} "
+              "{payoff_per_sec:>9.0f}".format(window, **result))
+
+
+if __name__ == '__main__':
+    main()
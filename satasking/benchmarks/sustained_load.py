@@ -0,0 +1,97 @@
+"""Measure the tasks completed per second by a ground station under sustained load.
+
+Satellites run in threads of this process, finishing each task after a random time in
+`--duration` and giving back its resources, while new tasks are dispatched every `--tick`
+seconds. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.sustained_load --satellites 20 --seconds 10
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+
+from benchmarks.dispatch_matching import FakeTask
+from benchmarks.server_scaling import SERVERS
+from simulator.satellite import SatelliteClient
+
+
+def start_constellation(mode, n_satellites, universe, duration):
+    """Start a server and `n_satellites` with all the `universe` resources, in threads."""
+    server = SERVERS[mode]('localhost', 0)
+    th_server = threading.Thread(target=server.serve_forever)
+    th_server.start()
+    satellites = []
+    for idx in range(n_satellites):
+        client = SatelliteClient(server.server_address[0], server.server_address[1],
+                                 ','.join(universe), 's%d' % idx, task_duration=duration)
+        client.init_client()
+        th_client = threading.Thread(target=client.run)
+        th_client.start()
+        satellites.append((client, th_client))
+    return server, th_server, satellites
+
+
+def stop_constellation(server, th_server, satellites):
+    for client, th_client in satellites:
+        client.stop()
+        th_client.join()
+    server.shutdown()
+    th_server.join()
+    server.server_close()
+
+
+def random_tasks(rnd, universe, first, amount):
+    return [FakeTask('t%d' % idx, rnd.randint(1, 100),
+                     ','.join(rnd.sample(universe, rnd.randint(1, 3))))
+            for idx in range(first, first + amount)]
+
+
+def run_load(mode, n_satellites, n_resources, seconds, tick, tasks_by_tick, duration, seed):
+    rnd = random.Random(seed)
+    universe = [str(r) for r in range(n_resources)]
+    constellation = start_constellation(mode, n_satellites, universe, duration)
+    server = constellation[0]
+
+    created = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        tasks = random_tasks(rnd, universe, created, tasks_by_tick)
+        created += len(tasks)
+        server.dispatch_tasks(tasks)
+        time.sleep(tick)
+    elapsed = time.perf_counter() - start
+    stats = dict(server.stats)
+
+    stop_constellation(*constellation)
+    stats['created'] = created
+    stats['completed_per_sec'] = stats.get('completed', 0) / elapsed
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=20)
+    parser.add_argument('--resources', type=int, default=10, help="Resources by satellite.")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--tick', type=float, default=0.01)
+    parser.add_argument('--tasks-by-tick', type=int, default=20)
+    parser.add_argument('--duration', type=float, nargs=2, default=[0.05, 0.2],
+                        help="Range of seconds that takes to execute a task.")
+    parser.add_argument('--modes', nargs='+', default=sorted(SERVERS), choices=sorted(SERVERS))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print("{:9} {:>8} {:>11} {:>9} {:>10} {:>7} {:>12}".format(
+        'mode', 'created', 'dispatched', 'started', 'completed', 'failed', 'completed/s'))
+    for mode in args.modes:
+        stats = run_load(mode, args.satellites, args.resources, args.seconds, args.tick,
+                         args.tasks_by_tick, args.duration, args.seed)
+        print("{:9} {created:>8} {dispatched:>11} {started:>9} {completed:>10} {failed:>7} "
+              "{completed_per_sec:>12.1f}".format(mode, **stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measure the bulk ingestion of tasks from NDJSON and CSV files, and its memory.
+
+Files of generated tasks (with a few duplicated and invalid rows) are ingested in a temporary
+SQLite database, in increasing sizes. The peak memory of the process shouldn't grow with them.
+Creating the tasks one by one, as the admin does, is measured for comparison. Run from the
+project folder with:
+
+    satasking/ $ python -m benchmarks.task_ingest --rows 100000 400000
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satasking.settings')
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+
+from simulator.ingest import ingest
+from simulator.models import Task
+
+
+def generate(path, format, rows, prefix, resources=200, seed=42):
+    """Write `rows` tasks, 1% of them duplicated and 1% invalid."""
+    rnd = random.Random(seed)
+    with open(path, 'w', newline='') as output:
+        writer = csv.writer(output) if format == 'csv' else None
+        if writer:
+            writer.writerow(['name', 'payoff', 'resources'])
+        for i in range(rows):
+            name = '{}-{}'.format(prefix, i - 1 if i % 100 == 1 else i)
+            payoff = -1 if i % 100 == 2 else rnd.randint(1, 100)
+            required = ','.join(str(rnd.randrange(resources)) for _ in range(rnd.randint(1, 3)))
+            if writer:
+                writer.writerow([name, payoff, required])
+            else:
+                output.write(json.dumps({'name': name, 'payoff': payoff,
+                                         'resources': required}) + '\n')
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 400000])
+    parser.add_argument('--single', type=int, default=2000,
+                        help="Tasks created one by one for comparison.")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DEBUG = False
+
+    with tempfile.TemporaryDirectory() as folder:
+        settings.DATABASES['default']['TEST'] = {'NAME': os.path.join(folder, 'bench.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        start = time.perf_counter()
+        for i in range(args.single):
+            Task.objects.create(name='single-%d' % i, payoff=1, resources='1,2')
+        single = args.single / (time.perf_counter() - start)
+        print("one by one: {:.0f} rows/s".format(single))
+
+        print("{:>7} {:>8} {:>9} {:>9} {:>8} {:>11} {:>10} {:>13}".format(
+            'format', 'rows', 'MB', 'created', 'invalid', 'duplicates', 'rows/s', 'peak RSS MB'))
+        for rows in args.rows:
+            for format in ('ndjson', 'csv'):
+                path = os.path.join(folder, 'tasks.' + format)
+                generate(path, format, rows, '{}{}'.format(format, rows))
+                with open(path, 'rb') as lines:
+                    report = ingest(lines, format)
+                print("{:>7} {:>8} {:>9.1f} {:>9} {:>8} {:>11} {:>10.0f} {:>13.0f}".format(
+                    format, rows, os.path.getsize(path) / 1e6, report.created, report.invalid,
+                    report.duplicates, report.rows_per_second, peak_mb()))
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare the original greedy against the NumPy one (`VectorGreedySolver`) on 100k tasks.
+
+Each workload is solved by both solvers, keeping the best of `--repeat` runs. The payoff and the
+assignments must be the same. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.vector_greedy --tasks 100000
+"""
+import argparse
+import logging
+
+from benchmarks.dispatch_matching import build_workload
+from simulator.matching import ResourceIndex
+from simulator.solvers import GreedySolver, VectorGreedySolver, numpy
+
+# (clients, resources universe, resources by client)
+WORKLOADS = [
+    (1000, 200, 20),
+    (10000, 200, 20),
+    (10000, 2000, 50),
+    (50000, 1000, 30),
+]
+
+
+def best_of(solver, tasks, index, repeat):
+    results = [solver.solve(tasks, index) for _ in range(repeat)]
+    return min(results, key=lambda result: result.elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--task-resources', type=int, default=3)
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if numpy is None:
+        parser.error("numpy isn't installed")
+    logging.disable(logging.WARNING)
+
+    print("{:>8} {:>10} {:>9} {:>9} {:>10} {:>10} {:>8} {:>10}".format(
+        'clients', 'resources', 'assigned', 'payoff', 'greedy s', 'vector s', 'speedup',
+        'identical'))
+    for clients, resources, client_resources in WORKLOADS:
+        workload, tasks = build_workload(clients, args.tasks, resources, client_resources,
+                                         args.task_resources, args.seed)
+        index = ResourceIndex()
+        for client, available in workload:
+            index.add_client(client, available)
+        greedy = best_of(GreedySolver(), tasks, index, args.repeat)
+        vector = best_of(VectorGreedySolver(args.block_size), tasks, index, args.repeat)
+        print("{:>8} {:>10} {:>9} {:>9} {:>10.3f} {:>10.3f} {:>7.2f}x {:>10}".format(
+            clients, resources, len(vector.assignments), vector.total_payoff, greedy.elapsed,
+            vector.elapsed, greedy.elapsed / vector.elapsed,
+            str(greedy.assignments == vector.assignments)))
+
+
+if __name__ == '__main__':
+    main()
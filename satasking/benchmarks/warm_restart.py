@@ -0,0 +1,124 @@
+"""Measure the restore of the ground station state after a restart, with 100k assignments.
+
+A server with `STATE_DIR` dispatches the tasks to the satellites and dies. The restarted server
+restores the state from the journal (or from the snapshot written by a clean stop), and the
+satellites connect again resuming their tasks. It's compared against dispatching the tasks
+again from scratch. Run from the project folder with:
+
+    satasking/ $ python -m benchmarks.warm_restart --satellites 1000 --tasks 100000
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+
+from benchmarks.dispatch_matching import FakeClient
+
+from django.conf import settings
+
+from simulator.ground_station import GroundStationServer
+from simulator.journal import StateStore
+from simulator.messages import MSG_RESUME
+
+
+FakeTask = namedtuple('FakeTask', ['pk', 'name', 'payoff', 'resources'])
+
+
+class ResumingClient(FakeClient):
+    """Satellite that kept executing its tasks while the server was down."""
+
+    features = [MSG_RESUME]
+
+
+def build_workload(n_satellites, n_tasks, n_resources):
+    universe = [str(r) for r in range(n_resources)]
+    tasks = [FakeTask(i, 't%d' % i, i % 100 + 1, universe[(i // n_satellites) % n_resources])
+             for i in range(n_tasks)]
+    return universe, tasks
+
+
+def connect(server, n_satellites, universe, client_class=FakeClient):
+    """Connect the satellites, the resuming ones telling the server all their tasks."""
+    for i in range(n_satellites):
+        client = client_class('s%d' % i)
+        server.update_resources(client, universe, client.name)
+        if client_class is ResumingClient:
+            server.resume_tasks(client, {task.name for task in server.clients[client]['tasks']})
+
+
+def dispatch(server, tasks, batch):
+    """Dispatch the `tasks` in rounds of `batch` tasks."""
+    for pos in range(0, len(tasks), batch):
+        server.submit_tasks(tasks[pos:pos + batch])
+    return server.stats['dispatched']
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--satellites', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--resources', type=int, default=200, help="Resources by satellite.")
+    parser.add_argument('--batch', type=int, default=1000, help="Tasks by dispatch round.")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    settings.DISPATCH_WINDOW = 0
+    universe, tasks = build_workload(args.satellites, args.tasks, args.resources)
+    host = settings.DEFAULT_SERVER_HOSTNAME
+    print("{} satellites, {} tasks".format(args.satellites, len(tasks)))
+
+    server = GroundStationServer(host, 0)
+    connect(server, args.satellites, universe)
+    _, plain_ms = timed(dispatch, server, tasks, args.batch)
+    server.server_close()
+
+    directory = tempfile.mkdtemp()
+    try:
+        settings.STATE_DIR = directory
+        server = GroundStationServer(host, 0)
+        connect(server, args.satellites, universe)
+        _, journaled_ms = timed(dispatch, server, tasks, args.batch)
+        server.socket.close()  # It dies, without a snapshot
+        print("dispatch: {:.0f} ms, {:.0f} ms journaling it ({:.1f} MB)".format(
+            plain_ms, journaled_ms,
+            os.path.getsize(os.path.join(directory, 'journal')) / 1e6))
+
+        state, journal_ms = timed(StateStore(directory).restore)
+        store = StateStore(directory)
+        store.restore()
+        store.close()
+        state, snapshot_ms = timed(StateStore(directory).restore)
+        print("restore {} assignments: {:.1f} ms from the journal, {:.1f} ms from the snapshot "
+              "({:.1f} MB)".format(len(state), journal_ms, snapshot_ms,
+                                   os.path.getsize(os.path.join(directory, 'snapshot')) / 1e6))
+
+        print("{:<8} {:>12} {:>12} {:>12} {:>10}".format(
+            'restart', 'start ms', 'connect ms', 'dispatch ms', 'resent'))
+        restarted, start_ms = timed(GroundStationServer, host, 0)
+        _, connect_ms = timed(connect, restarted, args.satellites, universe, ResumingClient)
+        print("{:<8} {:>12.1f} {:>12.1f} {:>12} {:>10}".format(
+            'warm', start_ms, connect_ms, '-', restarted.stats['dispatched']))
+        restarted.server_close()
+    finally:
+        settings.STATE_DIR = None
+        shutil.rmtree(directory)
+
+    # Without state, the tasks are dispatched again from scratch
+    restarted, start_ms = timed(GroundStationServer, host, 0)
+    _, connect_ms = timed(connect, restarted, args.satellites, universe)
+    resent, dispatch_ms = timed(dispatch, restarted, tasks, args.batch)
+    print("{:<8} {:>12.1f} {:>12.1f} {:>12.1f} {:>10}".format(
+        'cold', start_ms, connect_ms, dispatch_ms, resent))
+    restarted.server_close()
+
+
+if __name__ == '__main__':
+    main()
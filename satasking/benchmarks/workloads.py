@@ -0,0 +1,93 @@
+"""Synthetic constellations and task workloads for the benchmarks.
+
+Resources are drawn from a universe of `n_resources` ids, uniformly or following a Zipf law
+(the resource of rank `k` is drawn with a weight of `1 / k ** exponent`), so a few hot resources
+are wanted by most of the tasks or owned by most of the satellites.
+"""
+import random
+
+from benchmarks.dispatch_matching import FakeTask
+
+
+def payoff_uniform(rnd):
+    return rnd.randint(1, 100)
+
+
+def payoff_exponential(rnd):
+    return 1 + int(rnd.expovariate(1 / 20.0))
+
+
+def payoff_pareto(rnd):
+    """Heavy tailed: most of the tasks pay little, a few of them pay a lot."""
+    return min(10000, int(rnd.paretovariate(1.5) * 10))
+
+
+PAYOFFS = {
+    'uniform': payoff_uniform,
+    'exponential': payoff_exponential,
+    'pareto': payoff_pareto,
+}
+
+
+class ResourceUniverse:
+    """Resource ids '0' to 'n_resources - 1', drawn with Zipf weights if `exponent` isn't 0."""
+
+    def __init__(self, n_resources, exponent=0.0):
+        self.resources = [str(r) for r in range(n_resources)]
+        self.exponent = exponent
+        if exponent:
+            weights = [1.0 / (rank ** exponent) for rank in range(1, n_resources + 1)]
+            total = sum(weights)
+            self.cum_weights = []
+            acc = 0.0
+            for weight in weights:
+                acc += weight / total
+                self.cum_weights.append(acc)
+        else:
+            self.cum_weights = None
+
+    def sample(self, rnd, count):
+        """Return `count` different resources."""
+        count = min(count, len(self.resources))
+        if self.cum_weights is None:
+            return rnd.sample(self.resources, count)
+        chosen = []
+        while len(chosen) < count:
+            for res in rnd.choices(self.resources, cum_weights=self.cum_weights,
+                                   k=count - len(chosen)):
+                if res not in chosen:
+                    chosen.append(res)
+        return chosen
+
+
+class Workload:
+    """Generator of satellites and tasks with a fixed seed, so runs can be compared.
+
+    `satellite_resources` is the amount of resources of each satellite, and `task_resources`
+    the (min, max) range of resources required by each task.
+    """
+
+    def __init__(self, n_resources=100, satellite_resources=10, task_resources=(1, 3),
+                 satellite_zipf=0.0, task_zipf=0.0, payoff='uniform', seed=42):
+        self.satellite_universe = ResourceUniverse(n_resources, satellite_zipf)
+        self.task_universe = ResourceUniverse(n_resources, task_zipf)
+        self.satellite_resources = satellite_resources
+        self.task_resources = task_resources
+        self.payoff = PAYOFFS[payoff]
+        self.rnd = random.Random(seed)
+        self.created_tasks = 0
+
+    def satellites(self, amount):
+        """Return a list of (name, resources) satellites."""
+        return [('s%d' % idx, self.satellite_universe.sample(self.rnd, self.satellite_resources))
+                for idx in range(amount)]
+
+    def tasks(self, amount):
+        """Return `amount` new tasks, named in order of creation."""
+        tasks = []
+        for idx in range(self.created_tasks, self.created_tasks + amount):
+            count = self.rnd.randint(*self.task_resources)
+            tasks.append(FakeTask('t%d' % idx, self.payoff(self.rnd),
+                                  ','.join(self.task_universe.sample(self.rnd, count))))
+        self.created_tasks += amount
+        return tasks
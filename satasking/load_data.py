@@ -5,7 +5,7 @@ os.environ['DJANGO_SETTINGS_MODULE'] = 'satasking.settings'
 import django
 django.setup()
 
-from simulator.models import GroundStation, Satellite, Task
+from simulator.models import GroundStation, Satellite, Task, link_resources
 
 
 gs = GroundStation.objects.create()
@@ -37,5 +37,7 @@ satellites = [
     Satellite(name='s10', resources='1,2,7'),
 ]
 ss = Satellite.objects.bulk_create(satellites)
+link_resources(Task.objects.all())
+link_resources(Satellite.objects.all())
 
 print("Succesfully created instances")
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'simulator',
     'rest_framework',
+    'django_filters',
 ]
 
 MIDDLEWARE = [
@@ -159,3 +160,21 @@ DEFAULT_SERVER_PORT = 65265
 SERVER = None
 SERVER_TH = None
 SATELLITES = {}
+FLEET = None
+DISPATCH_SOLVER = 'greedy'  # One of `simulator.solvers.SOLVERS`
+DISPATCH_WINDOW = 0.0  # Seconds that queued tasks wait to be dispatched together, 0 to not wait
+FRAMED_PROTOCOL = True  # Satellites offer the framed protocol to the GroundStation
+TASK_DURATION = (1.0, 5.0)  # Range of seconds that takes to execute a task by satellites
+FLEET_PROCESSES = None  # Processes running the satellites of a fleet, None for one by CPU
+METRICS_ENABLED = True  # Record the counters and histograms of `simulator.metrics`
+LOG_MESSAGES_SAMPLE = 1  # Log at DEBUG level one of every this amount of messages
+TRACE_FILE = None  # File to record every message exchanged, see `simulator.tracing`
+TRACE_FORMAT = 'jsonl'  # Format of the TRACE_FILE records, 'jsonl' or 'binary'
+EXECUTIONS_CACHE_TIMEOUT = 300  # Seconds that the TaskExecution API pages are cached
+STATE_DIR = None  # Folder where the GroundStation journals its state to restore it, None to not
+STATE_SNAPSHOT_EVERY = 10000  # Journal records between snapshots of the GroundStation state
+RESUME_TIMEOUT = 60.0  # Seconds that tasks of disconnected satellites wait them to reconnect
+GROUND_STATION_NODES = 1  # Processes of the GroundStation, satellites are sharded between them
+GROUND_STATION_SOCKET = None  # Unix socket of the run_ground_station daemon, None to run in-process
+DISPATCH_JOB_CHUNK = 10000  # Tasks dispatched at once by the dispatch jobs of the API
+INGEST_CHUNK = 5000  # Tasks inserted by transaction when they're created in bulk
@@ -18,14 +18,20 @@ from django.contrib import admin
 from django.urls import path
 from rest_framework import routers
 
-from simulator import viewsets
+from simulator import views, viewsets
 
 
 router = routers.DefaultRouter()
 router.register(r'taskexecution', viewsets.TaskExecutionViewSet)
+router.register(r'dispatch', viewsets.DispatchJobViewSet, basename='dispatch')
+router.register(r'ingest', viewsets.TaskIngestViewSet, basename='ingest')
+router.register(r'analytics', viewsets.AnalyticsViewSet, basename='analytics')
+router.register(r'groundstation', viewsets.GroundStationViewSet, basename='groundstation')
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include(router.urls))
+    path('api/', include(router.urls)),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('export/executions.<str:format>', views.export_view, name='export-executions'),
 ]
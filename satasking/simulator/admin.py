@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from simulator.models import GroundStation, Satellite, Task
+from simulator.models import GroundStation, Resource, Satellite, Task
 
 
 def run_ground_station(modeladmin, request, queryset):
@@ -27,6 +27,16 @@ def stop_satellite(modeladmin, request, queryset):
 stop_satellite.short_description = "Stop selected satellites"
 
 
+def run_satellite_fleet(modeladmin, request, queryset):
+    Satellite.run_fleet(queryset)
+run_satellite_fleet.short_description = "Run selected satellites in a fleet of processes"
+
+
+def stop_satellite_fleet(modeladmin, request, queryset):
+    Satellite.stop_fleet()
+stop_satellite_fleet.short_description = "Stop the fleet of satellites"
+
+
 def dispatch_tasks(modeladmin, request, queryset):
     tasks = list(queryset)
     gs = GroundStation.objects.first()
@@ -34,21 +44,36 @@ def dispatch_tasks(modeladmin, request, queryset):
 dispatch_tasks.short_description = "Dispatch selected tasks to satellites"
 
 
+def dispatch_tasks_local_search(modeladmin, request, queryset):
+    tasks = list(queryset)
+    gs = GroundStation.objects.first()
+    gs.dispatch_tasks(tasks, solver='local')
+dispatch_tasks_local_search.short_description = "Dispatch selected tasks optimizing payoff"
+
+
 class GroundStationAdmin(admin.ModelAdmin):
     actions = [run_ground_station, stop_ground_station]
-    list_display = ['hostname', 'port', 'running']
+    list_display = ['hostname', 'port', 'server_mode', 'running']
 
 
 class SatelliteAdmin(admin.ModelAdmin):
-    actions = [run_satellite, stop_satellite]
+    actions = [run_satellite, stop_satellite, run_satellite_fleet, stop_satellite_fleet]
     list_display = ['name', 'hostname', 'port', 'resources', 'running']
+    list_filter = ['resource_set']
 
 
 class TaskAdmin(admin.ModelAdmin):
-    actions = [dispatch_tasks]
+    actions = [dispatch_tasks, dispatch_tasks_local_search]
     list_display = ['name', 'payoff', 'resources']
+    list_filter = ['resource_set']
+
+
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
 
 
 admin.site.register(GroundStation, GroundStationAdmin)
 admin.site.register(Satellite, SatelliteAdmin)
 admin.site.register(Task, TaskAdmin)
+admin.site.register(Resource, ResourceAdmin)
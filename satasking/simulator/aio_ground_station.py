@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import threading
+
+from simulator import tracing
+from simulator.ground_station import GroundStationHandlerMixin, GroundStationMixin
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class AsyncGroundStationHandler(GroundStationHandlerMixin):
+    """Handle the connection with a client as a task in the server event loop.
+
+    It speaks the same protocol than `GroundStationHandler`, without needing a thread per client.
+    """
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.client_address = writer.get_extra_info('peername')[:2]
+        self.setup()
+
+    async def handle(self):
+        logger.debug("Accepted new client: %s", self.client_address)
+        try:
+            while self.client_connected:
+                self.data_received(await self._read())
+        except ConnectionError:
+            pass
+        finally:
+            if self.client_connected:
+                self.disconnect_client()
+            self.writer.close()
+
+    def _write(self, data):
+        """Write to socket peer the specified `data`.
+
+        It can be called from any thread, the write is scheduled in the server event loop.
+        """
+        if threading.get_ident() == self.server.loop_thread_id:
+            self.writer.write(data)
+        else:
+            self.server.loop.call_soon_threadsafe(self.writer.write, data)
+
+    async def _read(self, count=4096):
+        """Read and return `count` amount (max) from socket peer."""
+        return await self.reader.read(count)
+
+
+class AsyncGroundStationServer(GroundStationMixin):
+    """GroundStation socket server that handles all the clients in a single asyncio event loop.
+
+    It has the same interface than `GroundStationServer`: `serve_forever` runs the event loop
+    until `shutdown` is called from other thread, and `dispatch_tasks` can be called from any
+    thread.
+    """
+
+    server_running = False
+
+    def __init__(self, host, port):
+        """Bind the server socket, clients are accepted once `serve_forever` is running."""
+        self.init_dispatcher()
+        tracing.setup_logging()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread_id = None
+        self._stopped = threading.Event()
+        self.handlers = set()  # Handlers of the connected clients
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle_client, host, port))
+        self.server_address = self.server.sockets[0].getsockname()[:2]
+
+    async def handle_client(self, reader, writer):
+        handler = AsyncGroundStationHandler(self, reader, writer)
+        self.handlers.add(handler)
+        try:
+            await handler.handle()
+        finally:
+            self.handlers.discard(handler)
+
+    def serve_forever(self):
+        """Run the event loop until `shutdown` is called."""
+        self.loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        asyncio.set_event_loop(self.loop)
+        self.server_running = True
+        logger.debug("Server up and running!")
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server_running = False
+            self.loop_thread_id = None
+            self._stopped.set()
+
+    def shutdown(self):
+        """Stop the `serve_forever` loop and wait until it's stopped."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._stopped.wait()
+
+    def server_close(self):
+        """Close the server socket and all the clients connections."""
+        if self.loop.is_closed():
+            return
+        self.close_dispatcher()
+        self.server.close()
+        # Handlers see an EOF from their clients and finish as if they were disconnected
+        for handler in list(self.handlers):
+            handler.reader.feed_eof()
+        tasks = asyncio.all_tasks(self.loop)
+        if tasks:
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
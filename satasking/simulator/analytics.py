@@ -0,0 +1,68 @@
+"""Aggregates of the executions: payoff by satellite and hour, and resources utilization.
+
+They are computed from the `SatelliteHour` rollups, that are kept updated as the executions are
+saved. The `scan_*` functions compute the same from the executions table, to rebuild the
+rollups and to compare with them.
+"""
+from django.db.models import (Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum,
+                              Value)
+from django.db.models.functions import Coalesce, TruncHour
+
+from simulator.models import SatelliteResource, TaskResource
+
+
+def capacity():
+    """Total resources of the satellites."""
+    return SatelliteResource.objects.count()
+
+
+def _utilization(total):
+    # Fraction of the `total` resources used, 0 if there aren't resources
+    return ExpressionWrapper(F('resources') / Value(float(total or 'inf')),
+                             output_field=FloatField())
+
+
+def payoff_by_hour(rollups):
+    """Values of the executions and payoff of each satellite by hour, from the `rollups`."""
+    return rollups.values('hour', 'satellite__name', 'executions', 'payoff').order_by(
+        'hour', 'satellite__name')
+
+
+def utilization(rollups, total=None):
+    """Values of the executions, payoff and resources used of all the satellites by hour, from
+    the `rollups`, with the fraction of the `total` resources (`capacity()` by default) used.
+    """
+    total = capacity() if total is None else total
+    return rollups.values('hour').annotate(
+        executions=Sum('executions'), payoff=Sum('payoff'), resources=Sum('resources')).annotate(
+        utilization=_utilization(total)).order_by('hour')
+
+
+def _with_resources(executions):
+    # The executions with the hour and the amount of resources required by their task
+    required = TaskResource.objects.filter(task=OuterRef('task')).values('task').annotate(
+        count=Count('pk')).values('count')
+    return executions.annotate(hour=TruncHour('date_time'),
+                               task_resources=Coalesce(Subquery(required), 0))
+
+
+def scan_satellite_hours(executions):
+    """Values of the rollups of the `executions`, computed from the executions table."""
+    return _with_resources(executions).values('satellite', 'hour').annotate(
+        executions=Count('id'), payoff=Sum('task__payoff'),
+        resources=Sum('task_resources')).order_by('hour', 'satellite')
+
+
+def scan_payoff_by_hour(executions):
+    """`payoff_by_hour` from the executions table."""
+    return executions.annotate(hour=TruncHour('date_time')).values(
+        'hour', 'satellite__name').annotate(
+        executions=Count('id'), payoff=Sum('task__payoff')).order_by('hour', 'satellite__name')
+
+
+def scan_utilization(executions, total=None):
+    """`utilization` from the executions table."""
+    total = capacity() if total is None else total
+    return _with_resources(executions).values('hour').annotate(
+        executions=Count('id'), payoff=Sum('task__payoff'),
+        resources=Sum('task_resources')).annotate(utilization=_utilization(total)).order_by('hour')
@@ -0,0 +1,267 @@
+import bisect
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+from simulator.aio_ground_station import AsyncGroundStationServer
+from simulator.ground_station import GroundStationServer
+from simulator.journal import TaskRecord, task_record
+from simulator.solvers import task_resources
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a node process to start listening
+NODE_START_TIMEOUT = 10.0
+
+
+class HashRing:
+    """Consistent hashing of keys (satellite names) to `nodes` indexes.
+
+    Each node owns `replicas` points of the ring, and a key belongs to the node of the first
+    point after its hash. Changing the amount of nodes only moves the keys of the points that
+    change owner, about 1/nodes of them.
+    """
+
+    def __init__(self, nodes, replicas=64):
+        points = sorted((self._hash('{}-{}'.format(node, replica)), node)
+                        for node in range(nodes) for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def node_for(self, key):
+        """Return the index of the node that owns `key`."""
+        pos = bisect.bisect(self.hashes, self._hash(key))
+        return self.nodes[pos % len(self.nodes)]
+
+
+@functools.lru_cache()
+def hash_ring(nodes):
+    """Return the `HashRing` of `nodes`, shared by its callers."""
+    return HashRing(nodes)
+
+
+class StationNode:
+    """Ground station server run by a node process, with the commands of the coordinator."""
+
+    def __init__(self, server):
+        self.server = server
+
+    def dispatch(self, tasks, solver=None):
+        """Dispatch the `tasks` records to the clients of this node.
+
+        Return the list of (position of the task, satellite) assignments, and the clients with
+        each resource available after them.
+        """
+        tasks = [TaskRecord._make(task) for task in tasks]
+        assignments, _ = self.server._dispatch(tasks, solver)
+        positions = {id(task): pos for pos, task in enumerate(tasks)}
+        return [(positions[id(task)], name) for task, name in assignments], self.available()
+
+    def available(self):
+        """Return a `{resource: clients}` dict with the clients that have each one available."""
+        with self.server.clients.lock:
+            return self.server.index.available_counts()
+
+    def call(self, method, *args):
+        """Call `method` of the server, used by benchmarks and tests to prepare the node."""
+        return getattr(self.server, method)(*args)
+
+
+def run_node(index, host, port, server_mode, conn, on_dispatch=None):
+    """Run the ground station node `index`, serving the (command, args) received in `conn` until
+    a None or its end. The address of the server is sent first, and then the result of each
+    command (or the exception raised by it). Each node keeps its state in its own folder of
+    `STATE_DIR`, and gives the assignments of its scheduler to `on_dispatch`.
+    """
+    if settings.STATE_DIR:
+        settings.STATE_DIR = os.path.join(settings.STATE_DIR, 'node-{}'.format(index))
+    server_class = AsyncGroundStationServer if server_mode == 'asyncio' else GroundStationServer
+    server = server_class(host, port)
+    server.scheduler.on_dispatch = on_dispatch
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    node = StationNode(server)
+    conn.send(server.server_address[:2])
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            command, args = message
+            try:
+                result = getattr(node, command)(*args)
+            except Exception as err:
+                logger.exception("Command {} failed in node {}".format(command, port))
+                result = err
+            conn.send(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class Coordinator:
+    """Ground station made of `nodes` processes, each one serving a shard of the satellites.
+
+    Node `i` listens in `port + i` (or any free port if `port` is 0), and satellites are
+    sharded between the nodes by consistent hashing of their name: `address_for` returns the
+    address where each satellite must connect. Dispatches are partitioned: tasks are dealt round
+    robin to the nodes, that solve their part in parallel with their own satellites. The tasks
+    that a node couldn't assign are offered to the other nodes that have all their resources
+    available (resource affinity), and the assignments of every node are merged.
+
+    It has the interface of the servers used by the `GroundStation` model: `serve_forever`,
+    `shutdown`, `server_close` and `dispatch_assignments`. The assignments of the scheduler of
+    each node are given to `on_dispatch` in the node process.
+    """
+
+    def __init__(self, host, port, nodes, server_mode='threaded', on_dispatch=None):
+        self.host = host
+        self.ring = hash_ring(nodes)
+        self.lock = threading.Lock()  # A dispatch at once, they share the pipes
+        self._stopped = threading.Event()
+        self.processes, self.conns, self.addresses = [], [], []
+        if on_dispatch is not None:
+            connections.close_all()  # Nodes open their own, they can't share the forked ones
+        for index in range(nodes):
+            conn, node_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_node,
+                args=(index, host, port + index if port else 0, server_mode, node_conn,
+                      on_dispatch),
+                daemon=True)
+            process.start()
+            node_conn.close()
+            self.processes.append(process)
+            self.conns.append(conn)
+        for index, conn in enumerate(self.conns):
+            if not conn.poll(NODE_START_TIMEOUT):
+                self.server_close()
+                raise RuntimeError("Ground station node {} didn't start".format(index))
+            self.addresses.append(conn.recv())
+        logger.info("Ground station nodes listening in %s", self.addresses)
+
+    def __len__(self):
+        return len(self.conns)
+
+    def address_for(self, name):
+        """Return the (host, port) of the node where the satellite `name` must connect."""
+        return self.addresses[self.ring.node_for(name)]
+
+    def _run(self, commands):
+        """Send each node its (command, args) of `commands` (None to skip it), and return the
+        results once all the nodes answer.
+        """
+        for conn, command in zip(self.conns, commands):
+            if command is not None:
+                conn.send(command)
+        results = [conn.recv() if command is not None else None
+                   for conn, command in zip(self.conns, commands)]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def call(self, node, method, *args):
+        """Call `method` of the server of `node` with `args`, and return its result."""
+        with self.lock:
+            commands = [None] * len(self)
+            commands[node] = ('call', (method,) + args)
+            return self._run(commands)[node]
+
+    def dispatch_tasks(self, tasks, solver=None):
+        """Same as `GroundStationServer.dispatch_tasks`."""
+        return {task.name: name for task, name in self.dispatch_assignments(tasks, solver)}
+
+    def dispatch_assignments(self, tasks, solver=None):
+        """Dispatch `tasks` between the nodes, return a list of (task, satellite name) pairs."""
+        tasks = list(tasks)
+        records = [task_record(task) for task in tasks]
+        # Positions of the tasks given to each node, and nodes that tried each task
+        partitions = [list(range(node, len(tasks), len(self))) for node in range(len(self))]
+        tried = [{pos % len(self)} for pos in range(len(tasks))]
+        assignments, available = [], {}  # node -> clients with each resource available
+        with self.lock:
+            while any(partitions):
+                commands = [('dispatch', ([records[pos] for pos in partition], solver))
+                            if partition else None for partition in partitions]
+                results = self._run(commands)
+                unassigned = []
+                for node, (partition, result) in enumerate(zip(partitions, results)):
+                    if result is None:
+                        continue
+                    assigned, available[node] = result
+                    for pos, name in assigned:
+                        assignments.append((tasks[partition[pos]], name))
+                    done = {pos for pos, _ in assigned}
+                    unassigned.extend(partition[pos] for pos in range(len(partition))
+                                      if pos not in done)
+                if unassigned and len(available) < len(self):
+                    results = self._run([None if node in available else ('available', ())
+                                         for node in range(len(self))])
+                    available.update((node, result) for node, result in enumerate(results)
+                                     if result is not None)
+                partitions = self._reroute(tasks, unassigned, tried, available)
+        return assignments
+
+    def _reroute(self, tasks, positions, tried, available):
+        """Return the partitions with the unassigned tasks of `positions` for another round.
+
+        Each task goes to a node that didn't try it yet and has clients with all its resources
+        available, the one with the most of them. Tasks that no node can execute are left out,
+        so there are as many rounds as nodes at most.
+        """
+        partitions = [[] for _ in range(len(self))]
+        for pos in positions:
+            resources = task_resources(tasks[pos])
+            best, best_count = None, 0
+            for node, counts in available.items():
+                if node in tried[pos]:
+                    continue
+                count = min(counts.get(res, 0) for res in resources)
+                if count > best_count:
+                    best, best_count = node, count
+            if best is None:
+                logger.error("There's no available client to process this task: {}".format(
+                    tasks[pos].name))
+                continue
+            for res in resources:
+                available[best][res] -= 1  # Estimate, until the node answers
+            tried[pos].add(best)
+            partitions[best].append(pos)
+        return partitions
+
+    def serve_forever(self):
+        """Wait until `shutdown` is called, the nodes serve the satellites meanwhile."""
+        self._stopped.wait()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def server_close(self):
+        """Stop the node processes."""
+        for conn in self.conns:
+            try:
+                conn.send(None)  # Other nodes inherited the pipe, so it wouldn't see an EOF
+            except OSError:
+                pass
+            conn.close()
+        for process in self.processes:
+            process.join(NODE_START_TIMEOUT)
+            if process.is_alive():
+                logger.error("Ground station node {} didn't stop, terminating it".format(
+                    process.pid))
+                process.terminate()
+        self.conns, self.processes = [], []
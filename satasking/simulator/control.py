@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+from simulator import metrics
+from simulator.cluster import Coordinator
+from simulator.journal import TaskRecord, task_record
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+def authkey():
+    """Key that clients of the control channel must know, derived from the `SECRET_KEY`."""
+    return hashlib.sha256(('simulator.control:' + settings.SECRET_KEY).encode()).digest()
+
+
+class ControlServer:
+    """Control channel of a ground station daemon, a Unix socket in `address`.
+
+    It serves the commands of `ControlClient`, each connection in its own thread, until `stop`
+    is received or `shutdown` is called. Messages are pickled, so connections must authenticate
+    with the `authkey` and the socket is only accessible by its owner.
+    """
+
+    def __init__(self, server, address):
+        self.server = server
+        self.address = address
+        if os.path.exists(address):
+            os.unlink(address)  # Left by a daemon that died
+        self.listener = Listener(address, family='AF_UNIX', authkey=authkey())
+        os.chmod(address, 0o600)
+        self._stopped = threading.Event()
+        self.closed = False
+
+    def serve_forever(self):
+        """Accept connections until the daemon is stopped."""
+        threading.Thread(target=self._accept, daemon=True).start()
+        self._stopped.wait()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def server_close(self):
+        self.closed = True
+        try:
+            Client(self.address, family='AF_UNIX', authkey=authkey()).close()  # Wake `accept`
+        except (OSError, EOFError, AuthenticationError):
+            pass
+        self.listener.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError as err:
+                logger.warning("Control connection rejected: %s", err)
+                continue
+            except OSError:  # Closed
+                break
+            if self.closed:
+                conn.close()
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    command, args = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    result = getattr(self, 'do_' + command)(*args)
+                except Exception as err:
+                    logger.exception("Control command {} failed".format(command))
+                    result = err
+                conn.send(result)
+
+    def do_ping(self):
+        return True
+
+    def do_status(self):
+        """Return the clients connected (by node with a `Coordinator`) and the server stats."""
+        if isinstance(self.server, Coordinator):
+            return {'nodes': self.server.addresses}
+        with self.server.stats_lock:
+            stats = dict(self.server.stats)
+        return {'clients': len(self.server.clients), 'queued': len(self.server.scheduler),
+                'stats': stats}
+
+    def do_metrics(self):
+        """Return the metrics of the daemon in the Prometheus text format."""
+        server = None if isinstance(self.server, Coordinator) else self.server
+        return metrics.render(server)
+
+    def do_dispatch(self, tasks, solver=None):
+        """Dispatch the `tasks` records, return the (position of the task, satellite) list."""
+        tasks = [TaskRecord._make(task) for task in tasks]
+        positions = {id(task): pos for pos, task in enumerate(tasks)}
+        assignments = self.server.dispatch_assignments(tasks, solver)
+        return [(positions[id(task)], name) for task, name in assignments]
+
+    def do_stop(self):
+        self.shutdown()
+        return True
+
+
+class ControlClient:
+    """Connection to the control channel of the ground station daemon in the socket `address`.
+
+    It has the `dispatch_assignments` and `dispatch_tasks` methods of the servers, so the
+    `GroundStation` model uses it in their place. Raise `OSError` if the daemon isn't running.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def call(self, command, *args):
+        """Send `command` with `args` to the daemon, and return its result."""
+        with self.lock:
+            if self.conn is None:
+                try:
+                    self.conn = Client(self.address, family='AF_UNIX', authkey=authkey())
+                except (EOFError, AuthenticationError) as err:
+                    raise ConnectionError("Control channel failed: {!r}".format(err)) from err
+            try:
+                self.conn.send((command, args))
+                result = self.conn.recv()
+            except (EOFError, OSError) as err:
+                self.close()
+                raise ConnectionError("Ground station daemon closed the control channel") \
+                    from err
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def ping(self):
+        """Return whether the daemon is running."""
+        try:
+            return self.call('ping')
+        except OSError:
+            return False
+
+    def status(self):
+        return self.call('status')
+
+    def metrics(self):
+        return self.call('metrics')
+
+    def stop(self):
+        return self.call('stop')
+
+    def dispatch_tasks(self, tasks, solver=None):
+        """Same as `GroundStationServer.dispatch_tasks`."""
+        return {task.name: name for task, name in self.dispatch_assignments(tasks, solver)}
+
+    def dispatch_assignments(self, tasks, solver=None):
+        """Same as `GroundStationServer.dispatch_assignments`, dispatched by the daemon."""
+        tasks = list(tasks)
+        assignments = self.call('dispatch', [task_record(task) for task in tasks], solver)
+        return [(tasks[pos], name) for pos, name in assignments]
@@ -0,0 +1,200 @@
+"""Streaming export of the `TaskExecution` history.
+
+Executions are read with `.iterator()`, in chunks, and each chunk of rows is encoded and
+yielded as bytes, so the memory used doesn't grow with the amount of executions. Formats:
+
+* `ndjson`: a JSON object per line.
+* `csv`: with a header line.
+* `parquet`: columnar, a row group per chunk, only if `pyarrow` is installed.
+* `binary`: columnar too, a block per chunk (see `read_binary`), without dependencies.
+"""
+import csv
+import io
+import json
+import struct
+import sys
+from array import array
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ('id', 'date_time', 'task', 'payoff', 'satellite')
+CHUNK_SIZE = 2000  # Rows fetched and encoded at once
+
+# Binary format: MAGIC, then blocks of a BLOCK header (amount of rows) followed by the columns.
+# Each column is a LENGTH and its data: ids and payoffs as int64, times as float64 seconds since
+# the epoch, and task and satellite names dictionary encoded (see `_pack_strings`). Numbers are
+# little endian.
+MAGIC = b'SATEXEC1'
+BLOCK = struct.Struct('<I')
+LENGTH = struct.Struct('<I')
+
+
+def rows(queryset, chunk_size=CHUNK_SIZE):
+    """Iterate over the `COLUMNS` values of the executions of `queryset`, ordered by id."""
+    return queryset.order_by('id').values_list(
+        'id', 'date_time', 'task__name', 'task__payoff', 'satellite__name').iterator(chunk_size)
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ndjson_export(rows, chunk_size=CHUNK_SIZE):
+    for chunk in chunks(rows, chunk_size):
+        yield ''.join(
+            json.dumps({'id': pk, 'date_time': date_time.isoformat(), 'task': task,
+                        'payoff': payoff, 'satellite': satellite}) + '\n'
+            for pk, date_time, task, payoff, satellite in chunk).encode()
+
+
+def csv_export(rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in chunks(rows, chunk_size):
+        writer.writerows((pk, date_time.isoformat(), task, payoff, satellite)
+                         for pk, date_time, task, payoff, satellite in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # Only the header, there weren't executions
+        yield buffer.getvalue().encode()
+
+
+def _pack_numbers(typecode, values):
+    numbers = array(typecode, values)
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+def _unpack_numbers(typecode, data):
+    numbers = array(typecode)
+    numbers.frombytes(data)
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    return numbers
+
+
+def _pack_strings(values):
+    """Pack `values` as the amount of distinct values, their lengths, the values and the code
+    (position among the distinct values) of each one.
+    """
+    codes = {}
+    for value in values:
+        codes.setdefault(value, len(codes))
+    encoded = [value.encode() for value in codes]
+    return b''.join([LENGTH.pack(len(encoded)), _pack_numbers('I', map(len, encoded)),
+                     b''.join(encoded), _pack_numbers('I', (codes[value] for value in values))])
+
+
+def _unpack_strings(data):
+    count, = LENGTH.unpack_from(data)
+    offset = LENGTH.size + count * 4
+    lengths = _unpack_numbers('I', data[LENGTH.size:offset])
+    distinct = []
+    for length in lengths:
+        distinct.append(data[offset:offset + length].decode())
+        offset += length
+    return [distinct[code] for code in _unpack_numbers('I', data[offset:])]
+
+
+def binary_export(rows, chunk_size=CHUNK_SIZE):
+    yield MAGIC
+    for chunk in chunks(rows, chunk_size):
+        pks, date_times, tasks, payoffs, satellites = zip(*chunk)
+        columns = [_pack_numbers('q', pks),
+                   _pack_numbers('d', (date_time.timestamp() for date_time in date_times)),
+                   _pack_strings(tasks), _pack_numbers('q', payoffs), _pack_strings(satellites)]
+        yield b''.join([BLOCK.pack(len(chunk))] +
+                       [LENGTH.pack(len(column)) + column for column in columns])
+
+
+def read_binary(stream):
+    """Iterate over the rows (tuples of `COLUMNS`, with the time as a timestamp) of a binary
+    export read from the file object `stream`.
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a binary export of executions")
+    while True:
+        header = stream.read(BLOCK.size)
+        if not header:
+            return
+        columns = []
+        for _ in COLUMNS:
+            length, = LENGTH.unpack(stream.read(LENGTH.size))
+            columns.append(stream.read(length))
+        yield from zip(_unpack_numbers('q', columns[0]), _unpack_numbers('d', columns[1]),
+                       _unpack_strings(columns[2]), _unpack_numbers('q', columns[3]),
+                       _unpack_strings(columns[4]))
+
+
+class _Drain:
+    """Write only file object that keeps what's written until it's taken."""
+    closed = False
+
+    def __init__(self):
+        self.data = []
+        self.position = 0
+
+    def write(self, data):
+        self.data.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.data)
+        self.data = []
+        return data
+
+
+def parquet_export(rows, chunk_size=CHUNK_SIZE):
+    schema = pyarrow.schema([('id', pyarrow.int64()),
+                             ('date_time', pyarrow.timestamp('us', tz='UTC')),
+                             ('task', pyarrow.string()), ('payoff', pyarrow.int64()),
+                             ('satellite', pyarrow.string())])
+    drain = _Drain()
+    writer = pyarrow.parquet.ParquetWriter(drain, schema)
+    for chunk in chunks(rows, chunk_size):
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)],
+            schema=schema))
+        yield drain.take()
+    writer.close()
+    yield drain.take()
+
+
+# Format: (function, content type, file extension)
+FORMATS = {
+    'ndjson': (ndjson_export, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_export, 'text/csv', 'csv'),
+    'binary': (binary_export, 'application/octet-stream', 'bin'),
+}
+if pyarrow is not None:
+    FORMATS['parquet'] = (parquet_export, 'application/vnd.apache.parquet', 'parquet')
+
+
+def export(queryset, format, chunk_size=CHUNK_SIZE):
+    """Iterate over the chunks of bytes of the executions of `queryset` in `format`."""
+    function = FORMATS[format][0]
+    return function(rows(queryset, chunk_size), chunk_size)
@@ -0,0 +1,41 @@
+from django_filters import rest_framework as filters
+
+from simulator.models import SatelliteHour, Task, TaskExecution
+
+
+class TaskExecutionFilter(filters.FilterSet):
+    """Filters of the executions by satellite and task names, and by time range."""
+    satellite = filters.CharFilter(field_name='satellite__name')
+    task = filters.CharFilter(field_name='task__name')
+    since = filters.IsoDateTimeFilter(field_name='date_time', lookup_expr='gte')
+    until = filters.IsoDateTimeFilter(field_name='date_time', lookup_expr='lt')
+
+    class Meta:
+        model = TaskExecution
+        fields = ('satellite', 'task', 'since', 'until')
+
+
+class SatelliteHourFilter(filters.FilterSet):
+    """Filters of the executions rollups by satellite name, and by range of hours."""
+    satellite = filters.CharFilter(field_name='satellite__name')
+    since = filters.IsoDateTimeFilter(field_name='hour', lookup_expr='gte')
+    until = filters.IsoDateTimeFilter(field_name='hour', lookup_expr='lt')
+
+    class Meta:
+        model = SatelliteHour
+        fields = ('satellite', 'since', 'until')
+
+
+class TaskFilter(filters.FilterSet):
+    """Filters of the tasks by name, a resource that they require, and range of payoff."""
+    name = filters.CharFilter()
+    resource = filters.CharFilter(method='filter_resource')
+    min_payoff = filters.NumberFilter(field_name='payoff', lookup_expr='gte')
+    max_payoff = filters.NumberFilter(field_name='payoff', lookup_expr='lte')
+
+    class Meta:
+        model = Task
+        fields = ('name', 'resource', 'min_payoff', 'max_payoff')
+
+    def filter_resource(self, queryset, name, value):
+        return queryset.filter(resource_set__name=value)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+from simulator.messages import (MSG_BATCH, MSG_FRAMED, TYPE_DISCONNECT, TYPE_PING, TYPE_PONG,
+                                TYPE_RESOURCES)
+from simulator.protocol import FramedProtocol
+from simulator.satellite import SatelliteClient
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class FleetSatellite(SatelliteClient):
+    """SatelliteClient that runs in an asyncio loop, together with many other ones.
+
+    It handles the messages and tasks as `SatelliteClient`, but reads from an asyncio stream
+    instead of blocking a thread on its socket. Writes are buffered by the stream.
+    """
+
+    async def connect(self):
+        """Connect to the server, ping it and send the resources."""
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        if await self.ping_async():
+            self.write(TYPE_RESOURCES, self.resources, self.name)
+            response = await self.read_async()
+            self.connected = response is not None
+        else:
+            logger.error("[{}] Can't connect to server, try again later.".format(self.name))
+
+    async def ping_async(self):
+        """Same handshake than `SatelliteClient.ping`."""
+        response = None
+        if self.framed:
+            self.write(TYPE_PING, [MSG_FRAMED, MSG_BATCH])
+            try:
+                response = await asyncio.wait_for(self.read_async(), self.handshake_timeout)
+            except asyncio.TimeoutError:
+                self.write(TYPE_PING, [])
+        else:
+            self.write(TYPE_PING, [])
+        if response is None:
+            response = await self.read_async()
+        if response is None or response[0] != TYPE_PONG:
+            return False
+        if MSG_FRAMED in response[1][0]:
+            self.protocol = FramedProtocol()
+        return True
+
+    def write(self, kind, *fields):
+        self.writer.write(self.protocol.encode(kind, *fields))
+
+    async def read_async(self, count=4096):
+        """Return the next (kind, fields) message, or None if the connection was closed."""
+        while not self.pending:
+            data = await self.reader.read(count)
+            if not data:
+                return None
+            self.pending.extend(self.protocol.feed(data))
+        return self.pending.popleft()
+
+    async def serve_async(self):
+        """Process the messages of the server, and finish the tasks, until disconnected."""
+        try:
+            while self.connected:
+                self.finish_tasks()
+                timeout = None
+                if self.completions:
+                    timeout = max(0, self.completions[0][0] - time.monotonic())
+                try:
+                    message = await asyncio.wait_for(self.read_async(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+                if message is None:
+                    self.connected = False
+                else:
+                    self.process_message(*message)
+        except OSError as err:
+            logger.error("[{}] Connection lost: {}".format(self.name, err))
+            self.connected = False
+        finally:
+            self.writer.close()
+
+    def stop(self):
+        """Ask the server to disconnect, `serve_async` returns when it closes the connection."""
+        if self.connected:
+            self.write(TYPE_DISCONNECT)
+
+
+def run_worker(satellites, stop_event, connected, concurrency):
+    """Run the `satellites` in an asyncio loop, until `stop_event` is set.
+
+    `satellites` are (host, port, resources, name) tuples, at most `concurrency` of them connect
+    at the same time. `connected` is a shared counter of the satellites connected.
+    """
+
+    async def run_satellite(client, semaphore, stopping):
+        async with semaphore:
+            if stopping.is_set():
+                return
+            try:
+                await client.connect()
+            except OSError as err:
+                logger.error("[{}] Can't connect to server: {}".format(client.name, err))
+                return
+        if client.connected:
+            if stopping.is_set():
+                client.stop()  # Connected after the stop, disconnect it now
+            with connected.get_lock():
+                connected.value += 1
+            await client.serve_async()
+            with connected.get_lock():
+                connected.value -= 1
+
+    async def main():
+        semaphore, stopping = asyncio.Semaphore(concurrency), asyncio.Event()
+        clients = [FleetSatellite(*satellite) for satellite in satellites]
+        running = [asyncio.ensure_future(run_satellite(client, semaphore, stopping))
+                   for client in clients]
+        await asyncio.get_running_loop().run_in_executor(None, stop_event.wait)
+        stopping.set()
+        for client in clients:
+            client.stop()
+        await asyncio.wait(running)
+
+    asyncio.run(main())
+
+
+class Fleet:
+    """Many satellites running in a pool of `processes`, each one with an asyncio loop.
+
+    `satellites` are (host, port, resources, name) tuples, as the `SatelliteClient` arguments.
+    They are sharded round robin between the processes (as many as CPUs by default), so the
+    simulation scales with the cores instead of sharing the GIL with the GroundStation.
+    """
+
+    def __init__(self, satellites, processes=None, concurrency=100):
+        self.satellites = list(satellites)
+        self.processes = max(1, min(processes or os.cpu_count(), len(self.satellites)))
+        self.concurrency = concurrency  # Handshakes in progress by process
+        self.stop_event = multiprocessing.Event()
+        self.connected = multiprocessing.Value('i', 0)
+        self.workers = []
+
+    def __len__(self):
+        return len(self.satellites)
+
+    @property
+    def names(self):
+        return [satellite[3] for satellite in self.satellites]
+
+    def shards(self):
+        """Return the list of satellites to run by each process."""
+        return [self.satellites[idx::self.processes] for idx in range(self.processes)]
+
+    def start(self):
+        for shard in self.shards():
+            worker = multiprocessing.Process(
+                target=run_worker, args=(shard, self.stop_event, self.connected,
+                                         self.concurrency), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        logger.info("Fleet of {} satellites started in {} processes".format(
+            len(self.satellites), self.processes))
+
+    def wait_connected(self, timeout=None):
+        """Wait until all the satellites are connected. Return whether they are."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.connected.value < len(self.satellites):
+            if not self.is_alive() or (deadline is not None and time.monotonic() > deadline):
+                return False
+            time.sleep(0.05)
+        return True
+
+    def is_alive(self):
+        return any(worker.is_alive() for worker in self.workers)
+
+    def stop(self, timeout=None):
+        """Disconnect the satellites and wait for the processes."""
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                logger.error("Fleet process {} didn't stop, terminating it".format(worker.pid))
+                worker.terminate()
+        self.workers = []
+        logger.info("Fleet of {} satellites stopped".format(len(self.satellites)))
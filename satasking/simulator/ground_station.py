@@ -1,158 +1,505 @@
 import logging
-from collections import defaultdict
+import socket
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
 from socketserver import BaseRequestHandler, TCPServer, ThreadingMixIn
 
 from django.conf import settings
 
-from simulator.messages import (MSG_ENCODING, MSG_NULL, MSG_OK, MSG_PING, MSG_PONG,
-                                MSG_RESOURCES_PREFIX, MSG_SEPARATOR, MSG_TASK_PREFIX)
+from simulator.messages import (MSG_BATCH, MSG_FRAMED, MSG_HEARTBEAT, MSG_RESUME, TYPE_ACK,
+                                TYPE_DISCONNECT, TYPE_DONE, TYPE_HEARTBEAT, TYPE_NACK, TYPE_OK,
+                                TYPE_PING, TYPE_PONG, TYPE_RESOURCES, TYPE_RESUME, TYPE_TASK,
+                                TYPE_TASK_BATCH)
+from simulator import metrics, tracing
+from simulator.journal import (ASSIGNED, FINISHED, QUEUED, REGISTERED, StateStore,
+                               restored_tasks, task_record)
+from simulator.protocol import FramedProtocol, TextProtocol
+from simulator.registry import ClientRegistry
+from simulator.scheduler import DispatchScheduler
+from simulator.solvers import get_solver, task_resources
 
 # Logger
 logger = logging.getLogger(__name__)
-logging.config.dictConfig(settings.LOGGING)
+message_log = tracing.MessageLog(logger)
 
+# Features that the server can enable in the ping handshake
+SERVER_FEATURES = (MSG_FRAMED, MSG_BATCH, MSG_HEARTBEAT, MSG_RESUME)
 
-class GroundStationServer(ThreadingMixIn, TCPServer):
-    """Define the async behavior for our GroundStation socket server."""
 
-    server_running = False
-    tasks = []
-    resources_by_clients = defaultdict(set)  # Indicates the resources that have available a client
-    clients = defaultdict(dict)
+class GroundStationMixin:
+    """Clients information and tasks dispatch, shared by all the GroundStation servers.
 
-    def __init__(self, host, port):
-        """Init a SocketServer with `GroundStationHandler`."""
-        super().__init__((host, port), GroundStationHandler)
-        if settings.DEBUG:
-            logger.setLevel(logging.DEBUG)
-            handler = logging.StreamHandler()
-            logger.addHandler(handler)
-            logger.debug("Server up and running!")
+    Servers must call `init_dispatcher` at init.
+    Clients that report the tasks feedback get their resources back when they finish a task, and
+    the tasks they couldn't execute are dispatched again, so the server can run continuously.
+    Besides the one-shot `dispatch_tasks`, tasks can be queued with `submit_tasks` to be
+    dispatched by the `scheduler` as resources are available.
+    The tasks of a client that disconnects are kept by its satellite name for
+    `settings.RESUME_TIMEOUT` seconds: when it connects again they're attached to it (if it
+    kept executing them, see `MSG_RESUME`), and otherwise they're dispatched again. With
+    `settings.STATE_DIR` the assignments, queued tasks and resources are journaled (see
+    `simulator.journal`), and a restarted server restores them as if every satellite had just
+    disconnected.
+    """
 
-    def service_actions(self):
-        """Set the inner variable `server_running` to True."""
-        self.server_running = True
-        super().service_actions()
+    last_solution = None  # `SolverResult` of the last dispatch
+    store = None  # `StateStore` where the state is journaled, if any
+
+    def init_dispatcher(self):
+        """Init the structures used to dispatch tasks."""
+        self.clients = ClientRegistry()  # Connected clients, their resources and tasks
+        self.stats_lock = threading.Lock()
+        # Amount of tasks dispatched, started, failed and completed, and payoff achieved
+        self.stats = Counter()
+        # Tasks waiting for resources, failed ones included. It gets a proxy, so it doesn't keep
+        # the server (and its socket) alive
+        self.scheduler = DispatchScheduler(weakref.proxy(self), window=settings.DISPATCH_WINDOW)
+        # Tasks of disconnected clients, waiting for them to connect again:
+        # satellite name -> (list of tasks, timer that dispatches them again)
+        self.detached = {}
+        self.detached_lock = threading.Lock()
+        self.closed = False
+        if settings.STATE_DIR:
+            self.restore_state(StateStore(settings.STATE_DIR, settings.STATE_SNAPSHOT_EVERY))
+
+    def restore_state(self, store):
+        """Restore the state kept in `store`, and journal the changes there from now on."""
+        start = time.monotonic()
+        state = store.restore()
+        self.store = store
+        self._detach({name: list(tasks) for name, tasks in state.assigned.items()})
+        queued = restored_tasks(state.queued.elements())
+        if queued:
+            self.scheduler.submit(queued)
+        logger.info("Restored %d assignments of %d satellites and %d queued tasks in %.3fs",
+                    len(state), len(state.assigned), len(queued), time.monotonic() - start)
+
+    def close_dispatcher(self):
+        """Stop the scheduler and the timers of the detached tasks, and close the store."""
+        self.scheduler.stop()
+        with self.detached_lock:
+            self.closed = True  # Tasks of clients disconnected from now on are kept as they are
+            for _, timer in self.detached.values():
+                timer.cancel()
+            self.detached.clear()
+        if self.store is not None:
+            self.store.close()
+
+    def journal(self, *record):
+        """Append `record` to the journal of the state, if it's kept."""
+        if self.store is not None:
+            self.store.append(record)
+
+    @property
+    def index(self):
+        """The `ResourceIndex` with the resources available by client."""
+        return self.clients.index
+
+    @property
+    def resources_by_clients(self):
+        """Return a `{resource: set(clients)}` dict with the resources available by client."""
+        return self.index.resources_by_clients()
 
     def update_resources(self, client, resources, name):
-        """Update inner `resources_by_clients` dict."""
-        for res in resources:
-            self.resources_by_clients[res].add(client)
-        self.clients[client]['resources'] = resources
-        self.clients[client]['tasks'] = []
-        self.clients[client]['name'] = name
-        logger.debug("Updated resources information: {}".format(self.resources_by_clients))
-        logger.debug("Updated clients information: {}".format(self.clients[client]))
-
-    def dispatch_tasks(self, tasks):
+        """Update inner resources index with the `resources` of `client`."""
+        info = self.clients.register(client, resources, name)
+        self.journal(REGISTERED, name, resources)
+        self._reattach(client, name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Updated resources information: %s", self.resources_by_clients)
+            logger.debug("Updated clients information: %s", info)
+        self.scheduler.trigger(resources)
+
+    def remove_client(self, client):
+        """Remove `client` and its resources from inner structures, keeping its tasks."""
+        info = self.clients.remove(client)
+        if info and info.get('tasks'):
+            self._detach({info['name']: info['tasks']})
+
+    def resume_tasks(self, client, names):
+        """Called when a reconnected `client` tells the `names` of the tasks it's executing.
+
+        The attached tasks that it isn't executing anymore are dispatched again.
+        """
+        self._requeue(self.clients.get(client, {}).get('name'), self.clients.keep(client, names))
+
+    def _detach(self, tasks_by_name):
+        """Keep the tasks of each satellite name until it connects again, or they time out.
+
+        A single timer expires all of them, the ones restored at once included.
+        """
+        if not tasks_by_name:
+            return
+        timer = threading.Timer(settings.RESUME_TIMEOUT, self._expire, [list(tasks_by_name)])
+        timer.daemon = True
+        with self.detached_lock:
+            if self.closed:
+                return
+            for name, tasks in tasks_by_name.items():
+                previous = self.detached.get(name)
+                if previous is not None:
+                    tasks = previous[0] + tasks
+                self.detached[name] = (tasks, timer)
+        timer.start()
+
+    def _reattach(self, client, name):
+        """Attach to `client` the tasks detached from its satellite `name`.
+
+        Clients that don't resume their tasks abandoned them when they disconnected, so the tasks
+        are dispatched again, as the ones whose resources the client doesn't have anymore.
+        """
+        with self.detached_lock:
+            detached = self.detached.pop(name, None)
+        if detached is None:
+            return
+        tasks = restored_tasks(detached[0])
+        if MSG_RESUME in getattr(client, 'features', ()):
+            tasks = self.clients.attach(client, tasks)
+        self._requeue(name, tasks)
+
+    def _expire(self, names):
+        """Dispatch again the detached tasks of the satellites `names` that didn't come back.
+
+        It runs in the thread of their timer, the tasks detached again since then have other.
+        """
+        timer = threading.current_thread()
+        with self.detached_lock:
+            expired = {name: self.detached.pop(name)[0] for name in names
+                       if self.detached.get(name, (None, None))[1] is timer}
+        for name, tasks in expired.items():
+            self._requeue(name, restored_tasks(tasks))
+
+    def _requeue(self, name, tasks):
+        """Queue again the `tasks` that the satellite `name` won't finish."""
+        if not tasks:
+            return
+        self.journal(FINISHED, name, [task.name for task in tasks])
+        logger.warning("%d tasks of %s were lost, dispatching them again", len(tasks), name)
+        self.submit_tasks(tasks)
+
+    def dispatch_tasks(self, tasks, solver=None):
         """Dispatch all registered tasks to be executed by the available clients.
 
-        Use a kind of greedy choice to dispatch tasks to the clients with corresponding
-        resources available.
+        The choice of which client executes each task is delegated to a `Solver` (see
+        `simulator.solvers`), that can be given by name or instance in `solver`. By default
+        `settings.DISPATCH_SOLVER` is used, the original greedy choice:
         `payoff_by_resources` is a sorted list where the order is defined by `payoff/n_resources`
         where `n_resources` is the amount of required resources by the task and `payoff` is the
         payoff of the task.
         First we choose to deliver the tasks with highest `payoff/n_resources` to lower ones.
-        Then we look for all clients with the required resources available, and choose the first
-        one as `candidate` to execute the task.
+        Then we look for all clients with the required resources available in the resources
+        index, and choose the first one (in registration order) as `candidate` to execute the
+        task.
         Then we must disassociate required resources with the candidate client.
         As final step, we send a message to all clients with tasks that must execute addressed
-        tasks.
+        tasks, with all the tasks of each client in a single batch.
+        The `SolverResult` with the achieved payoff and the time spent is kept in `last_solution`.
+        Return a dict with pairs of 'task_name': 'satellite', see `dispatch_assignments` to get
+        the dispatched task objects instead.
+        """
+        return {task.name: name for task, name in self.dispatch_assignments(tasks, solver)}
+
+    def dispatch_assignments(self, tasks, solver=None):
+        """Same as `dispatch_tasks`, but return a list of (task, satellite name) pairs.
+
+        Tasks are the same objects given in `tasks`, so callers can keep using their ids (task
+        names aren't unique).
+        """
+        assignments, unassigned = self._dispatch(tasks, solver)
+        for task in unassigned:
+            logger.error("There's no available client to process this task: {}"
+                         .format(task.name))
+        return assignments
+
+    def _dispatch(self, tasks, solver=None):
+        """Assign `tasks` to clients and send them, return the assigned and unassigned tasks.
+
+        The solver works over a snapshot of the clients resources, so clients can join and leave
+        meanwhile. Assignments whose client left or lost its resources before they were
+        committed are left unassigned.
+        """
+        batches = OrderedDict()  # dict with pair of client: list of tasks to send
+        with metrics.DISPATCH_SECONDS.time('snapshot'):
+            index = self.clients.snapshot()
+        with metrics.DISPATCH_SECONDS.time('solve'):
+            solution = get_solver(solver or settings.DISPATCH_SOLVER).solve(tasks, index)
+        assignments = []  # list of pairs (task, 'satellite')
+        with metrics.DISPATCH_SECONDS.time('commit'):
+            for task, candidate, name in self.clients.commit(solution.assignments):
+                assignments.append((task, name))
+                batches.setdefault(candidate, []).append(task)
+            if assignments and self.store is not None:
+                self.journal(ASSIGNED, [(name, task_record(task)) for task, name in assignments])
+        self.last_solution = solution
+        with metrics.DISPATCH_SECONDS.time('send'):
+            failed = self._send_batches(batches)
+        if failed:
+            assignments = [(task, name) for task, name in assignments if id(task) not in failed]
+        with self.stats_lock:
+            self.stats['dispatched'] += len(assignments)
+            self.stats['dispatched_payoff'] += sum(task.payoff for task, _ in assignments)
+        dispatched = {id(task) for task, _ in assignments}
+        unassigned = [task for task in tasks if id(task) not in dispatched]
+        metrics.TASKS_ASSIGNED.inc(len(assignments))
+        metrics.TASKS_UNASSIGNED.inc(len(unassigned))
+        if len(assignments) < len(solution.assignments):
+            logger.warning("{} assignments discarded, their clients changed while solving"
+                           .format(len(solution.assignments) - len(assignments)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Results: %s", [(task.name, name) for task, name in assignments])
+            logger.debug("Resources available: %s", self.resources_by_clients)
+        logger.info("Solver '%s' dispatched %d tasks with total payoff %d in %.3fs",
+                    solution.solver, len(assignments), solution.total_payoff, solution.elapsed)
+        return assignments, unassigned
+
+    def _send_batches(self, batches):
+        """Send each client of `batches` its list of tasks, return the ids of the tasks that
+        couldn't be sent.
+
+        A client whose connection fails is disconnected, after releasing its batch, so the
+        tasks are left unassigned and the rest of the clients still get theirs.
         """
-        total_payoff = 0  # Total payoff to be executed
-        results = dict()  # dict with pair of 'task_name': 'satellite'
-
-        # Sort tasks to be processed to maximize payoff
-        payoff_by_resources = [
-            # Keep idx of task in original list
-            (idx, float(t.payoff) / len(t.resources)) for idx, t in enumerate(tasks)
-        ]
-        payoff_by_resources.sort(key=lambda x: x[1], reverse=True)
-
-        # Algorithm
-        for idx, _ in payoff_by_resources:
-            task_resources = tasks[idx].resources.split(',')  # task resources
-            clients_available = set([handler for handler in self.clients])  # TODO: Can be improved
-            for tr in task_resources:
-                clients_available &= self.resources_by_clients[tr]
+        failed = set()
+        for candidate, batch in batches.items():
             try:
-                candidate = clients_available.pop()  # TODO: Choose client by resources available
-            except KeyError:
-                logger.error("There's no available client to process this task: {}"
-                             .format(tasks[idx].name))
-            else:
-                # Remove resource available from client
-                for r in task_resources:
-                    self.resources_by_clients[r].remove(candidate)
-                # Delegate task to client
-                results[tasks[idx].name] = self.clients[candidate]['name']
-                total_payoff += tasks[idx].payoff
-                self.clients[candidate]['tasks'].append(tasks[idx])
-                candidate.new_task_available(tasks[idx])
-        logger.debug("Results: {}".format(results))
-        logger.debug("Resources available: {}".format(self.resources_by_clients))
-        logger.debug("Total payoff: {}".format(total_payoff))
-        return results
-
-
-class GroundStationHandler(BaseRequestHandler):
-    """
-    The request handler class for our server.
+                candidate.new_tasks_available(batch)
+            except OSError as err:
+                name = self.clients.get(candidate, {}).get('name')
+                logger.warning("Couldn't send %d tasks to %s: %s", len(batch), name, err)
+                self.clients.release(candidate, batch)
+                self.journal(FINISHED, name, [task.name for task in batch])
+                candidate.disconnect_client()
+                failed.update(id(task) for task in batch)
+        return failed
 
-    It is instantiated once per connection to the server.
-    Current thread: threading.current_thread()
+    def submit_tasks(self, tasks):
+        """Queue `tasks` to be dispatched by the `scheduler` once clients can execute them."""
+        if self.store is not None:
+            self.journal(QUEUED, [task_record(task) for task in tasks])
+        self.scheduler.submit(tasks)
+
+    def task_started(self, client, name):
+        """Called when `client` acknowledges that it's executing the task `name`."""
+        with self.stats_lock:
+            self.stats['started'] += 1
+
+    def task_failed(self, client, name):
+        """Called when `client` couldn't execute the task `name`.
+
+        Its resources are available again and the task is queued to be dispatched again.
+        """
+        task = self._finish_task(client, name)
+        if task is None:
+            return
+        with self.stats_lock:
+            self.stats['failed'] += 1
+        satellite = self.clients.get(client, {}).get('name')
+        logger.warning("Task {} failed in {}, dispatching it again".format(name, satellite))
+        if self.store is not None:
+            self.journal(FINISHED, satellite, [name])
+            self.journal(QUEUED, [task_record(task)])
+        self.scheduler.submit([task], released=task_resources(task))
+
+    def task_completed(self, client, name):
+        """Called when `client` finished the task `name`, so its resources are available."""
+        task = self._finish_task(client, name)
+        if task is None:
+            return
+        with self.stats_lock:
+            self.stats['completed'] += 1
+            self.stats['completed_payoff'] += task.payoff
+        self.journal(FINISHED, self.clients.get(client, {}).get('name'), [name])
+        self.scheduler.trigger(task_resources(task))
+
+    def _finish_task(self, client, name):
+        """Release the task `name` of `client`, return it or None if it's unknown."""
+        task = self.clients.finish(client, name)
+        if task is None:
+            logger.warning("Unknown task {} finished by client {}".format(
+                name, self.clients.get(client, {}).get('name')))
+        return task
+
+
+class GroundStationServer(GroundStationMixin, ThreadingMixIn, TCPServer):
+    """Define the async behavior for our GroundStation socket server."""
+
+    server_running = False
+
+    def __init__(self, host, port):
+        """Init a SocketServer with `GroundStationHandler`."""
+        self.init_dispatcher()
+        self.handlers = set()  # Handlers of the connected clients
+        super().__init__((host, port), GroundStationHandler)
+        tracing.setup_logging()
+        logger.debug("Server up and running!")
+
+    def service_actions(self):
+        """Set the inner variable `server_running` to True."""
+        self.server_running = True
+        super().service_actions()
+
+    def server_close(self):
+        """Stop the scheduler and close the server socket and all the clients connections."""
+        self.close_dispatcher()
+        # Handlers read an EOF from their clients and finish as if they were disconnected, so the
+        # threads that `ThreadingMixIn` waits for don't stay blocked reading
+        for handler in list(self.handlers):
+            try:
+                handler.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # Already disconnected
+        super().server_close()
+
+
+class GroundStationHandlerMixin:
+    """Messages exchange with a client, shared by all the GroundStation handlers.
+
+    Handlers must set the `server` and `client_address` attributes and implement `_write`.
     """
 
     def setup(self):
         """Append the connected client address to inner clients list."""
-        self.server.clients[self]['address'] = (self.client_address[0], self.client_address[1])
+        self.server.clients.connect(self, (self.client_address[0], self.client_address[1]))
         self.client_connected = True
-        logger.info("New client {}".format(self.client_address))
-        logger.debug("Updated clients list: {}".format(self.server.clients))
-
-    def handle(self):
-        logger.debug("Accepted new client: {}".format(self.client_address))
-        while(self.client_connected):
-            message = self._read()
-            self.process_message(message)
+        self.protocol = TextProtocol()  # Until the client asks for the framed one in the ping
+        self.features = []  # Features accepted in the ping handshake
+        self.bytes_received = self.bytes_sent = 0
+        self.messages_received = self.messages_sent = 0
+        self.peer = '{}:{}'.format(*self.client_address)  # Its name once it's registered
+        metrics.SERVER_CONNECTIONS.open(self)
+        logger.info("New client %s", self.client_address)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Updated clients list: %s", self.server.clients)
 
     def disconnect_client(self):
         """Perform needed actions when a client is disconnected."""
-        del self.server.clients[self]
+        self.server.remove_client(self)
         self.client_connected = False
-        logger.debug("Disconnected client: {}".format(self.client_address))
-        logger.debug("Updated clients list: {}".format(self.server.clients))
+        metrics.SERVER_CONNECTIONS.close(self)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Disconnected client: %s", self.client_address)
+            logger.debug("Updated clients list: %s", self.server.clients)
 
     def new_task_available(self, task):
         """Called from the server when a new task is available for this client."""
-        message = "{n}{sep}{p}{sep}{r}".format(n=task.name, sep=MSG_SEPARATOR,
-                                               p=task.payoff, r=task.resources)
-        self._write("%s%s" % (MSG_TASK_PREFIX, message))
+        self.new_tasks_available([task])
 
-    def process_message(self, message):
-        """Read received message and make an appropriate response."""
-        if message == MSG_NULL:
+    def new_tasks_available(self, tasks):
+        """Called from the server with all the tasks dispatched to this client.
+
+        Clients that support it receive all the tasks in a single batch message, and otherwise
+        with the framed protocol all the messages are written at once. The text protocol can't
+        tell apart messages read together (nor split a long batch), so each task is written on
+        its own.
+        """
+        tasks = [(task.name, task.payoff, task_resources(task)) for task in tasks]
+        if not isinstance(self.protocol, FramedProtocol):
+            for task in tasks:
+                self.send(TYPE_TASK, *task)
+        elif MSG_BATCH in self.features:
+            self.send(TYPE_TASK_BATCH, tasks)
+        else:
+            if message_log.active:
+                for task in tasks:
+                    self.log_message(tracing.SENT, TYPE_TASK, task)
+            self.send_data(b''.join(self.protocol.encode(TYPE_TASK, *task) for task in tasks),
+                           len(tasks))
+
+    def send(self, kind, *fields):
+        """Send a message of type `kind` with `fields` to the client."""
+        if message_log.active:
+            self.log_message(tracing.SENT, kind, fields)
+        self.send_data(self.protocol.encode(kind, *fields))
+
+    def log_message(self, direction, kind, fields):
+        message_log.log(direction, 'ground-station', self.peer, kind, fields)
+
+    def send_data(self, data, messages=1):
+        """Write the encoded `messages` in `data`, counting them."""
+        self.bytes_sent += len(data)
+        self.messages_sent += messages
+        self._write(data)
+
+    def data_received(self, data):
+        """Process all the messages received in `data`, or disconnect if it's empty."""
+        if not data:
             # Empty message, remove client from list
             self.disconnect_client()
-        elif message == MSG_PING:
-            # Simple handshake
-            self._write(MSG_PONG)
-        elif MSG_RESOURCES_PREFIX in message:
-            msg_payload = message.split(MSG_RESOURCES_PREFIX)[1]
-            resources_list, name = msg_payload.split(MSG_SEPARATOR)
-            resources_list = resources_list.split(',')
-            logger.debug("delegate message with: {}".format(resources_list))
+            return
+        messages = self.protocol.feed(data)
+        self.bytes_received += len(data)
+        self.messages_received += len(messages)
+        for kind, fields in messages:
+            if message_log.active:
+                self.log_message(tracing.RECEIVED, kind, fields)
+            self.process_message(kind, fields)
+
+    def process_message(self, kind, fields):
+        """Read received message and make an appropriate response."""
+        if kind == TYPE_DISCONNECT:
+            self.disconnect_client()
+        elif kind == TYPE_PING:
+            # Simple handshake, enabling the features that both sides support
+            self.features = [feature for feature in fields[0] if feature in SERVER_FEATURES]
+            self.send(TYPE_PONG, self.features)
+            if MSG_FRAMED in self.features:
+                self.protocol = FramedProtocol()
+        elif kind == TYPE_RESOURCES:
+            resources_list, name = fields
+            self.peer = name
             self.server.update_resources(self, resources_list, name)
-            self._write(MSG_OK)
+            self.send(TYPE_OK)
+        elif kind == TYPE_ACK:
+            self.server.task_started(self, fields[0])
+        elif kind == TYPE_NACK:
+            self.server.task_failed(self, fields[0])
+        elif kind == TYPE_DONE:
+            self.server.task_completed(self, fields[0])
+        elif kind == TYPE_RESUME:
+            self.server.resume_tasks(self, fields[0])
+        elif kind == TYPE_HEARTBEAT:
+            self.send(TYPE_HEARTBEAT)
         return
 
-    def _write(self, message):
-        """Write to socket peer (socket server) the specified `message`."""
-        self.request.sendall(bytes(message, MSG_ENCODING))
-        logger.debug("Sent message: {} to peer: {}".format(message, self.client_address))
 
-    def _read(self, count=1024):
+class GroundStationHandler(GroundStationHandlerMixin, BaseRequestHandler):
+    """
+    The request handler class for our server.
+
+    It is instantiated once per connection to the server.
+    Current thread: threading.current_thread()
+    """
+
+    def setup(self):
+        # Tasks are sent from the dispatching threads while the handler thread answers messages
+        self.write_lock = threading.Lock()
+        super().setup()
+        self.server.handlers.add(self)
+
+    def finish(self):
+        self.server.handlers.discard(self)
+
+    def handle(self):
+        logger.debug("Accepted new client: %s", self.client_address)
+        try:
+            while self.client_connected:
+                self.data_received(self._read())
+        except OSError:
+            pass
+        finally:
+            if self.client_connected:
+                self.disconnect_client()
+
+    def _write(self, data):
+        """Write to socket peer (socket server) the specified `data`.
+
+        It can be called from any thread, writes are serialized so messages don't interleave.
+        """
+        with self.write_lock:
+            self.request.sendall(data)
+
+    def _read(self, count=4096):
         """Read and return `count` amount (max) from socket peer (server)."""
-        response = str(self.request.recv(count), MSG_ENCODING)
-        logger.debug("Received message: {} from peer: {}".format(response, self.client_address))
-        return response
+        return self.request.recv(count)
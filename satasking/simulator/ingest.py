@@ -0,0 +1,188 @@
+import bisect
+import csv
+import json
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from simulator.models import LINK_BATCH_SIZE, Resource, Task, link_resources, parse_resources
+
+FORMATS = ('ndjson', 'csv')
+MAX_ERRORS = 100  # Errors kept in the report, the rest are only counted
+MAX_PAYOFF = 2147483647  # Largest value of `Task.payoff` in every database
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+class IngestReport:
+    """Counters of an ingestion, and the first `MAX_ERRORS` invalid rows."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []  # list of (line, message)
+        self.start = time.monotonic()
+        self.seconds = 0.0
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created, 'duplicates': self.duplicates,
+                'invalid': self.invalid, 'errors': [{'line': line, 'error': message}
+                                                    for line, message in self.errors],
+                'seconds': round(self.seconds, 3),
+                'rows_per_second': round(self.rows_per_second, 1)}
+
+
+def read_rows(lines, format):
+    """Yield the (line number, dict) rows of an iterable of bytes `lines` in `format`.
+
+    Rows that can't be read are yielded as an `InvalidRow` instead of a dict.
+    """
+    if format == 'csv':
+        undecoded = []  # Lines that aren't UTF-8, in order
+
+        def decode(lines):
+            for number, line in enumerate(lines, 1):
+                try:
+                    yield line.decode('utf-8')
+                except UnicodeDecodeError:
+                    undecoded.append(number)
+                    yield line.decode('utf-8', 'surrogateescape')
+
+        reader = csv.DictReader(decode(lines))
+        for row in reader:
+            if undecoded and undecoded[0] <= reader.line_num:
+                del undecoded[:bisect.bisect_right(undecoded, reader.line_num)]
+                row = InvalidRow("Invalid UTF-8")
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError as err:
+                row = InvalidRow("Invalid JSON: {}".format(err))
+            yield number, row
+
+
+def validate(row):
+    """Return the `Task` of a row, a dict with its `name`, `payoff` and `resources` (a comma
+    separated string, or a list in NDJSON). Raise `InvalidRow` if any of them isn't valid.
+    """
+    if isinstance(row, InvalidRow):
+        raise row
+    if not isinstance(row, dict):
+        raise InvalidRow("Expected an object")
+    name = row.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise InvalidRow("Missing name")
+    name = name.strip()
+    if len(name) > settings.MAX_CHAR_LENGTH:
+        raise InvalidRow("Name longer than {} characters".format(settings.MAX_CHAR_LENGTH))
+    payoff = row.get('payoff')
+    if isinstance(payoff, str):
+        try:
+            payoff = int(payoff.strip())
+        except ValueError:
+            raise InvalidRow("Payoff isn't an integer: {!r}".format(payoff)) from None
+    if type(payoff) is not int or not 0 <= payoff <= MAX_PAYOFF:
+        raise InvalidRow("Payoff must be an integer from 0 to {}".format(MAX_PAYOFF))
+    resources = row.get('resources')
+    if isinstance(resources, list):
+        if not all(isinstance(res, str) and ',' not in res for res in resources):
+            raise InvalidRow("Resources must be ids without commas")
+        resources = ','.join(resources)
+    if not isinstance(resources, str):
+        raise InvalidRow("Missing resources")
+    resources = ','.join(parse_resources(resources))
+    if not resources:
+        raise InvalidRow("Missing resources")
+    if len(resources) > settings.MAX_CHAR_LENGTH:
+        raise InvalidRow("Resources longer than {} characters".format(settings.MAX_CHAR_LENGTH))
+    return Task(name=name, payoff=payoff, resources=resources)
+
+
+def batches(items, size=LINK_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def ingest(lines, format, chunk_size=None, known_resources=False, progress=None):
+    """Create the tasks of the rows in `lines`, bytes in one of the `FORMATS`, and return the
+    `IngestReport`.
+
+    Rows are validated as they're read, and every `chunk_size` valid rows (`INGEST_CHUNK` by
+    default) are inserted with `bulk_create` and linked to their resources in a transaction.
+    Tasks whose name already exists (in the database, or earlier in the stream) are skipped.
+    They're looked up by chunk, so memory doesn't grow with the size of the stream. With
+    `known_resources`, tasks can only require resources that already exist. `progress(report)`
+    is called after each chunk.
+    """
+    chunk_size = chunk_size or settings.INGEST_CHUNK
+    report = IngestReport()
+    chunk = {}  # name -> (line, task)
+    for line, row in read_rows(lines, format):
+        report.rows += 1
+        try:
+            task = validate(row)
+        except InvalidRow as err:
+            report.error(line, str(err))
+            continue
+        if task.name in chunk:
+            report.duplicates += 1
+            continue
+        chunk[task.name] = (line, task)
+        if len(chunk) >= chunk_size:
+            _insert(chunk, known_resources, report)
+            chunk = {}
+            if progress is not None:
+                progress(report)
+    if chunk:
+        _insert(chunk, known_resources, report)
+    report.seconds = time.monotonic() - report.start
+    if progress is not None:
+        progress(report)
+    return report
+
+
+def _insert(chunk, known_resources, report):
+    """Insert the tasks of `chunk` that don't exist yet, in a transaction."""
+    for names in batches(chunk):
+        for name in Task.objects.filter(name__in=names).values_list('name', flat=True):
+            if chunk.pop(name, None) is not None:
+                report.duplicates += 1
+    if known_resources:
+        required = {res for _, task in chunk.values() for res in task.resources.split(',')}
+        known = set()
+        for names in batches(required):
+            known.update(Resource.objects.filter(name__in=names).values_list('name', flat=True))
+        for name, (line, task) in list(chunk.items()):
+            unknown = set(task.resources.split(',')) - known
+            if unknown:
+                report.error(line, "Unknown resources: {}".format(', '.join(sorted(unknown))))
+                del chunk[name]
+    tasks = [task for _, task in chunk.values()]
+    if not tasks:
+        return
+    with transaction.atomic():
+        tasks = Task.objects.bulk_create(tasks)
+        if not connection.features.can_return_ids_from_bulk_insert:
+            tasks = [task for names in batches(chunk)
+                     for task in Task.objects.filter(name__in=names)]
+        link_resources(tasks)
+    report.created += len(tasks)
+    report.seconds = time.monotonic() - report.start
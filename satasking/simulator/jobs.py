@@ -0,0 +1,98 @@
+import json
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from simulator.filters import TaskFilter
+from simulator.models import DispatchJob, GroundStation, Task
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+def task_chunks(job, size):
+    """Yield the tasks of `job` in lists of `size` tasks, after setting its `total`."""
+    query = json.loads(job.query)
+    if 'tasks' in query:
+        ids = query['tasks']
+        job.total = len(ids)
+        job.save(update_fields=['total'])
+        for start in range(0, len(ids), size):
+            tasks = Task.objects.in_bulk(ids[start:start + size])
+            yield [tasks[pk] for pk in ids[start:start + size] if pk in tasks]
+    else:
+        queryset = TaskFilter(query['filter'], Task.objects.all()).qs.order_by('pk')
+        job.total = queryset.count()
+        job.save(update_fields=['total'])
+        chunk = []
+        for task in queryset.iterator(chunk_size=size):
+            chunk.append(task)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def run_job(pk):
+    """Dispatch the tasks of the `DispatchJob` `pk` by chunks of `DISPATCH_JOB_CHUNK`, saving
+    its progress after each one.
+    """
+    job = DispatchJob.objects.get(pk=pk)
+    job.status, job.started = DispatchJob.RUNNING, timezone.now()
+    job.save(update_fields=['status', 'started'])
+    try:
+        station = GroundStation.load()
+        if not station.alive:
+            raise RuntimeError("The GroundStation isn't running")
+        for chunk in task_chunks(job, settings.DISPATCH_JOB_CHUNK):
+            executions = station.dispatch_tasks(chunk, solver=job.solver or None)
+            payoffs = {task.pk: task.payoff for task in chunk}
+            job.processed += len(chunk)
+            job.dispatched += len(executions)
+            job.payoff += sum(payoffs[execution.task_id] for execution in executions)
+            job.save(update_fields=['processed', 'dispatched', 'payoff'])
+        job.status = DispatchJob.DONE
+    except Exception as err:
+        logger.exception("Dispatch job {} failed".format(pk))
+        job.status, job.error = DispatchJob.FAILED, str(err)
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished'])
+    return job
+
+
+class JobWorker:
+    """Thread of the process that runs the queued jobs, one at a time in their order."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def enqueue(self, job):
+        """Queue `job` once the transaction that created it is committed."""
+        transaction.on_commit(lambda: self._put(job.pk))
+
+    def _put(self, pk):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        self.queue.put(pk)
+
+    def _run(self):
+        while True:
+            pk = self.queue.get()
+            try:
+                run_job(pk)
+            except Exception:
+                logger.exception("Dispatch job {} couldn't run".format(pk))
+            finally:
+                close_old_connections()
+
+
+worker = JobWorker()
@@ -0,0 +1,210 @@
+import gc
+import logging
+import os
+import pickle
+import threading
+from collections import Counter, namedtuple
+
+from simulator.solvers import task_resources
+
+# Logger
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'snapshot'
+JOURNAL_FILE = 'journal'
+
+# Journal records are tuples of the record type and its fields
+GENERATION = 'generation'  # (number,): first record, the snapshot that the journal follows
+REGISTERED = 'registered'  # (satellite, resources): a satellite sent its resources
+QUEUED = 'queued'  # (tasks,): tasks waiting to be dispatched
+ASSIGNED = 'assigned'  # (assignments,): list of (satellite, task) dispatched
+FINISHED = 'finished'  # (satellite, names): tasks completed, failed or lost by the satellite
+
+# Restored tasks, with the id of their `Task` if they had one
+TaskRecord = namedtuple('TaskRecord', ['pk', 'name', 'payoff', 'resources'])
+
+
+def task_record(task):
+    """Return the record of `task` kept in the state, a plain (pk, name, payoff, resources)
+    tuple (it's faster to pickle than a `TaskRecord`).
+    """
+    if isinstance(task, TaskRecord):
+        return tuple(task)
+    return (getattr(task, 'pk', None), task.name, task.payoff, ','.join(task_resources(task)))
+
+
+def restored_tasks(tasks):
+    """Return `tasks` with their records, as restored, made `TaskRecord`."""
+    return [TaskRecord._make(task) if type(task) is tuple else task for task in tasks]
+
+
+class GroundStationState:
+    """Outstanding work of a ground station, by satellite name.
+
+    It keeps the resources registered by each satellite, the tasks assigned to each one that
+    haven't finished yet, and the queued tasks. Clients themselves aren't kept, they're
+    connections that don't survive a restart.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.satellites = {}  # satellite -> resources
+        self.assigned = {}  # satellite -> list of task records
+        self.queued = Counter()  # task record -> times it's queued
+
+    def __len__(self):
+        """Return the amount of outstanding assignments."""
+        return sum(len(tasks) for tasks in self.assigned.values())
+
+    def apply(self, record):
+        """Change the state with a journal `record`."""
+        kind = record[0]
+        if kind == ASSIGNED:
+            for satellite, task in record[1]:
+                self.assigned.setdefault(satellite, []).append(task)
+                count = self.queued.get(task)
+                if count == 1:
+                    del self.queued[task]
+                elif count:
+                    self.queued[task] = count - 1
+        elif kind == FINISHED:
+            satellite, names = record[1:]
+            tasks = self.assigned.get(satellite, [])
+            for name in names:
+                for pos, task in enumerate(tasks):
+                    if task[1] == name:
+                        del tasks[pos]
+                        break
+            if not tasks:
+                self.assigned.pop(satellite, None)
+        elif kind == QUEUED:
+            self.queued.update(record[1])
+        elif kind == REGISTERED:
+            self.satellites[record[1]] = record[2]
+
+    def dump(self, file):
+        pickle.dump((self.generation, self.satellites, self.assigned, self.queued), file,
+                    pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file):
+        state = cls()
+        state.generation, state.satellites, state.assigned, state.queued = pickle.load(file)
+        return state
+
+
+class StateStore:
+    """Keep the `GroundStationState` of a ground station in `directory`, to restore it later.
+
+    Every change is appended to a journal, and every `snapshot_every` records the whole state is
+    written to a snapshot and the journal starts again. Restoring loads the snapshot and replays
+    the journal records that follow it, a record cut by a crash ends the journal. The files are
+    pickled, so only the ground station should be able to write the directory.
+    """
+
+    def __init__(self, directory, snapshot_every=10000):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.lock = threading.Lock()
+        self.state = None
+        self.journal = None
+        self.records = 0  # Records appended since the last snapshot
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.directory, JOURNAL_FILE)
+
+    def restore(self):
+        """Load and return the state kept in the directory, it must be called before `append`."""
+        os.makedirs(self.directory, exist_ok=True)
+        state = GroundStationState()
+        gc.disable()  # Collections would only walk the objects being loaded
+        try:
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, 'rb') as snapshot:
+                    state = GroundStationState.load(snapshot)
+            self.records = 0
+            if os.path.exists(self.journal_path):
+                self.records = self._replay(state)
+        finally:
+            gc.enable()
+        self.state = state
+        if self.records:
+            self.journal = open(self.journal_path, 'ab')
+        else:
+            self._start_journal()
+        return state
+
+    def _replay(self, state):
+        """Apply the journal records that follow the snapshot to `state`, return their amount."""
+        with open(self.journal_path, 'rb') as journal:
+            records, end = 0, 0
+            while True:
+                try:
+                    record = pickle.load(journal)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError, AttributeError) as err:
+                    logger.warning("Journal cut after %d records: %r", records, err)
+                    break
+                if records == 0 and record != (GENERATION, state.generation):
+                    logger.warning("Journal doesn't follow the snapshot, it's ignored")
+                    return 0
+                if records:
+                    state.apply(record)
+                records += 1
+                end = journal.tell()
+        # Drop the cut record, so the next ones are appended after the last complete one
+        if os.path.getsize(self.journal_path) > end:
+            os.truncate(self.journal_path, end)
+        return records
+
+    def _start_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, 'wb')
+        self.records = 0
+        self._write((GENERATION, self.state.generation))
+
+    def _write(self, record):
+        pickle.dump(record, self.journal, pickle.HIGHEST_PROTOCOL)
+        self.journal.flush()
+        self.records += 1
+
+    def append(self, record):
+        """Apply `record` to the state and append it to the journal, unless it's closed."""
+        with self.lock:
+            if self.journal is None:
+                return
+            self.state.apply(record)
+            self._write(record)
+            if self.records >= self.snapshot_every:
+                self._snapshot()
+
+    def snapshot(self):
+        """Write the whole state to the snapshot, and start the journal again."""
+        with self.lock:
+            self._snapshot()
+
+    def _snapshot(self):
+        self.state.generation += 1
+        path = self.snapshot_path + '.tmp'
+        with open(path, 'wb') as snapshot:
+            self.state.dump(snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(path, self.snapshot_path)
+        self._start_journal()
+
+    def close(self):
+        """Write a snapshot, so the next restore doesn't replay the journal, and close it."""
+        with self.lock:
+            if self.journal is None:
+                return
+            self._snapshot()
+            self.journal.close()
+            self.journal = None
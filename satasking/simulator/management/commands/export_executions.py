@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import export
+from simulator.filters import TaskExecutionFilter
+from simulator.models import TaskExecution
+
+
+class Command(BaseCommand):
+    help = "Export the task executions history, streaming it to a file or the standard output."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='ndjson', choices=sorted(export.FORMATS))
+        parser.add_argument('--output', '-o',
+                            help="File to write, the standard output if it isn't given.")
+        parser.add_argument('--satellite', help="Only the executions of this satellite.")
+        parser.add_argument('--task', help="Only the executions of the tasks with this name.")
+        parser.add_argument('--since', help="Only the executions since this ISO 8601 time.")
+        parser.add_argument('--until', help="Only the executions before this ISO 8601 time.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        data = {name: options[name] for name in TaskExecutionFilter.Meta.fields if options[name]}
+        filterset = TaskExecutionFilter(data, TaskExecution.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        start, size = time.monotonic(), 0
+        try:
+            for chunk in export.export(filterset.qs, options['format'], options['chunk_size']):
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        self.stderr.write("{:.1f} MB exported in {:.1f}s".format(
+            size / 1e6, time.monotonic() - start))
@@ -0,0 +1,45 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator import ingest
+
+
+class Command(BaseCommand):
+    help = ("Create tasks in bulk from NDJSON or CSV files (or the standard input), validating "
+            "and inserting them by chunks as they're read.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', default=['-'],
+                            help="Files to read, the standard input if none is given or '-'.")
+        parser.add_argument('--format', choices=ingest.FORMATS,
+                            help="Format of the rows, by the file extension by default (NDJSON "
+                                 "unless it's .csv).")
+        parser.add_argument('--chunk-size', type=int, default=settings.INGEST_CHUNK)
+        parser.add_argument('--known-resources', action='store_true',
+                            help="Reject the tasks that require resources that don't exist.")
+
+    def handle(self, *args, **options):
+        for path in options['files']:
+            format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+            try:
+                stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+            except OSError as err:
+                raise CommandError(err)
+            try:
+                report = ingest.ingest(stream, format, options['chunk_size'],
+                                       options['known_resources'], self.progress)
+            finally:
+                if stream is not sys.stdin.buffer:
+                    stream.close()
+            for line, message in report.errors:
+                self.stderr.write("{}:{}: {}".format(path, line, message))
+            self.stdout.write("{}: {} rows, {} tasks created, {} duplicates, {} invalid in {:.1f}s "
+                              "({:.0f} rows/s)".format(
+                                  path, report.rows, report.created, report.duplicates,
+                                  report.invalid, report.seconds, report.rows_per_second))
+
+    def progress(self, report):
+        self.stderr.write("{} rows, {} tasks created ({:.0f} rows/s)".format(
+            report.rows, report.created, report.rows_per_second))
@@ -0,0 +1,73 @@
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.cluster import hash_ring
+from simulator.fleet import Fleet
+from simulator.models import Satellite
+
+
+class Command(BaseCommand):
+    help = ("Run satellites in a fleet of processes, each one multiplexing its satellites in an "
+            "asyncio loop, until it's interrupted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*',
+                            help="Names of the satellites to run, all of them if none is given.")
+        parser.add_argument('--processes', type=int, default=settings.FLEET_PROCESSES,
+                            help="Processes running the satellites, one by CPU by default.")
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help="Run this amount of generated satellites instead of the saved "
+                                 "ones.")
+        parser.add_argument('--resources', type=int, nargs=2, default=[100, 10],
+                            metavar=('UNIVERSE', 'BY_SATELLITE'),
+                            help="Resources of the generated satellites.")
+        parser.add_argument('--hostname', default=settings.DEFAULT_SERVER_HOSTNAME)
+        parser.add_argument('--port', type=int, default=settings.DEFAULT_SERVER_PORT)
+        parser.add_argument('--nodes', type=int, default=settings.GROUND_STATION_NODES,
+                            help="Nodes of the ground station, listening from --port on, the "
+                                 "generated satellites connect to the node of their shard. Saved "
+                                 "satellites use GROUND_STATION_NODES, as Satellite.address.")
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            universe, by_satellite = options['resources']
+            resources = [str(res) for res in range(universe)]
+            ring = hash_ring(options['nodes'])
+            satellites = [(options['hostname'], options['port'] + ring.node_for('fleet-%d' % idx),
+                           ','.join(random.sample(resources, min(by_satellite, universe))),
+                           'fleet-%d' % idx)
+                          for idx in range(options['synthetic'])]
+            saved = []
+        else:
+            saved = Satellite.objects.all()
+            if options['names']:
+                saved = saved.filter(name__in=options['names'])
+            # Skip the satellites running in other processes, but not the ones left running
+            saved = [sat for sat in saved if not (sat.running and sat.alive)]
+            satellites = [sat.address + (sat.resources, sat.name) for sat in saved]
+        if not satellites:
+            raise CommandError("There aren't satellites to run.")
+
+        fleet = Fleet(satellites, options['processes'])
+        Satellite.objects.filter(pk__in=[sat.pk for sat in saved]).update(running=True,
+                                                                          pid=os.getpid())
+        start = time.monotonic()
+        fleet.start()
+        try:
+            if fleet.wait_connected():
+                self.stdout.write("{} satellites connected in {} processes in {:.1f}s".format(
+                    len(fleet), fleet.processes, time.monotonic() - start))
+            else:
+                self.stderr.write("Only {} of {} satellites connected".format(
+                    fleet.connected.value, len(fleet)))
+            while fleet.is_alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fleet.stop()
+            Satellite.objects.filter(name__in=fleet.names).update(running=False, pid=None)
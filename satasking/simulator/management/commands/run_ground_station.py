@@ -0,0 +1,39 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.control import ControlServer
+from simulator.models import GroundStation
+
+
+class Command(BaseCommand):
+    help = ("Run the GroundStation as a daemon, controlled through the Unix socket of "
+            "GROUND_STATION_SOCKET by the web processes, until it's stopped or interrupted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.GROUND_STATION_SOCKET,
+                            help="Unix socket of the control channel, GROUND_STATION_SOCKET by "
+                                 "default.")
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError("There isn't a control socket, set GROUND_STATION_SOCKET.")
+        station = GroundStation.load()
+        server = station.create_server()
+        control = ControlServer(server, options['socket'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        GroundStation.objects.update(running=True)
+        signal.signal(signal.SIGTERM, lambda signum, frame: control.shutdown())
+        self.stdout.write("Ground station listening in {}:{}, controlled through {}".format(
+            station.hostname, station.port, options['socket']))
+        try:
+            control.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            control.server_close()
+            server.shutdown()
+            server.server_close()
+            GroundStation.objects.update(running=False)
@@ -0,0 +1,200 @@
+class ResourceIndex:
+    """Bitset index of the resources that every connected client has available.
+
+    Resource ids and clients are interned into integer slots, so each client availability is a
+    bitmask over resource slots and each resource keeps a bitmask over client slots. Looking for
+    the clients that have all the resources of a task free is then a handful of bitwise ANDs
+    instead of set intersections over the whole clients list.
+    """
+
+    def __init__(self):
+        self.resource_slots = {}  # resource id -> resource slot
+        self.clients_by_resource = []  # resource slot -> bitmask of client slots
+        self.client_slots = {}  # client -> client slot
+        self.slot_clients = []  # client slot -> client (None when the slot is free)
+        self.free_slots = []  # Client slots released by disconnected clients
+        self.owned = {}  # client -> bitmask of all the resources of the client
+        self.available = {}  # client -> bitmask of the resources available in the client
+        self.all_clients = 0  # bitmask with every used client slot
+
+    def copy(self):
+        """Return an independent copy of the index, to try assignments without commiting them."""
+        index = ResourceIndex.__new__(ResourceIndex)
+        index.resource_slots = dict(self.resource_slots)
+        index.clients_by_resource = list(self.clients_by_resource)
+        index.client_slots = dict(self.client_slots)
+        index.slot_clients = list(self.slot_clients)
+        index.free_slots = list(self.free_slots)
+        index.owned = dict(self.owned)
+        index.available = dict(self.available)
+        index.all_clients = self.all_clients
+        return index
+
+    def __len__(self):
+        return len(self.client_slots)
+
+    def __contains__(self, client):
+        return client in self.client_slots
+
+    def _resource_slot(self, resource):
+        """Return the slot of `resource`, interning it if it's a new one."""
+        try:
+            return self.resource_slots[resource]
+        except KeyError:
+            slot = self.resource_slots[resource] = len(self.clients_by_resource)
+            self.clients_by_resource.append(0)
+            return slot
+
+    def resource_mask(self, resources):
+        """Return the bitmask for `resources`, or None if any of them is unknown."""
+        mask = 0
+        for res in resources:
+            try:
+                mask |= 1 << self.resource_slots[res]
+            except KeyError:
+                return None
+        return mask
+
+    def _known_mask(self, resources):
+        mask = 0
+        for res in resources:
+            slot = self.resource_slots.get(res)
+            if slot is not None:
+                mask |= 1 << slot
+        return mask
+
+    def _iter_bits(self, mask):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def add_client(self, client, resources):
+        """Register `client` with all of its `resources` available."""
+        if client in self.client_slots:
+            self.remove_client(client)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.slot_clients[slot] = client
+        else:
+            slot = len(self.slot_clients)
+            self.slot_clients.append(client)
+        self.client_slots[client] = slot
+        self.all_clients |= 1 << slot
+        mask = 0
+        for res in resources:
+            mask |= 1 << self._resource_slot(res)
+        self.owned[client] = mask
+        self.available[client] = 0
+        self._set_available(client, mask)
+
+    def remove_client(self, client):
+        """Forget `client` and all of its resources."""
+        if client not in self.client_slots:
+            return
+        self._clear_available(client, self.available[client])
+        slot = self.client_slots.pop(client)
+        del self.owned[client]
+        del self.available[client]
+        self.slot_clients[slot] = None
+        self.free_slots.append(slot)
+        self.all_clients &= ~(1 << slot)
+
+    def _set_available(self, client, mask):
+        bit = 1 << self.client_slots[client]
+        mask &= self.owned[client] & ~self.available[client]
+        for res_slot in self._iter_bits(mask):
+            self.clients_by_resource[res_slot] |= bit
+        self.available[client] |= mask
+
+    def _clear_available(self, client, mask):
+        bit = ~(1 << self.client_slots[client])
+        mask &= self.available[client]
+        for res_slot in self._iter_bits(mask):
+            self.clients_by_resource[res_slot] &= bit
+        self.available[client] &= ~mask
+
+    def candidates(self, resources):
+        """Return the bitmask of client slots with all of `resources` available."""
+        mask = self.all_clients
+        for res in resources:
+            try:
+                mask &= self.clients_by_resource[self.resource_slots[res]]
+            except KeyError:
+                return 0
+            if not mask:
+                break
+        return mask
+
+    def first_candidate(self, resources):
+        """Return the client in the lowest slot with all of `resources` available, if any."""
+        mask = self.candidates(resources)
+        if not mask:
+            return None
+        return self.slot_clients[(mask & -mask).bit_length() - 1]
+
+    def iter_candidates(self, resources):
+        """Yield every client with all of `resources` available, in slot order."""
+        for slot in self._iter_bits(self.candidates(resources)):
+            yield self.slot_clients[slot]
+
+    def has_available(self, client, resources):
+        """Return whether `client` is in the index and has all of `resources` available."""
+        mask = self.resource_mask(resources)
+        return mask is not None and self.available.get(client, 0) & mask == mask
+
+    def allocate(self, client, resources):
+        """Mark `resources` as busy in `client`."""
+        self._clear_available(client, self._known_mask(resources))
+
+    def allocate_all(self, client, resources_lists):
+        """Mark as busy in `client` each list of `resources_lists` whose resources are all
+        available, in order. Return the list of whether each one was allocated.
+        """
+        free = self.available.get(client, 0)
+        allocated = []
+        for resources in resources_lists:
+            mask = self.resource_mask(resources)
+            allocated.append(mask is not None and free & mask == mask)
+            if allocated[-1]:
+                free &= ~mask
+        if client in self.client_slots:
+            self._clear_available(client, self.available[client] & ~free)
+        return allocated
+
+    def release(self, client, resources):
+        """Mark `resources` as available again in `client`.
+
+        Resources that the client doesn't own are ignored.
+        """
+        if client in self.client_slots:
+            self._set_available(client, self._known_mask(resources))
+
+    def available_resources(self, client):
+        """Return the list of resources currently available in `client`."""
+        mask = self.available.get(client, 0)
+        return [res for res, slot in self.resource_slots.items() if mask >> slot & 1]
+
+    def clients_with(self, resource):
+        """Return the set of clients that have `resource` available."""
+        try:
+            mask = self.clients_by_resource[self.resource_slots[resource]]
+        except KeyError:
+            return set()
+        return {self.slot_clients[slot] for slot in self._iter_bits(mask)}
+
+    def resource_counts(self):
+        """Return the amount of resources of all the clients, and the amount available."""
+        return (sum(bin(mask).count('1') for mask in self.owned.values()),
+                sum(bin(mask).count('1') for mask in self.available.values()))
+
+    def available_counts(self):
+        """Return a `{resource: clients}` dict with the amount of clients that have each resource
+        available, without the resources that nobody has.
+        """
+        return {res: bin(self.clients_by_resource[slot]).count('1')
+                for res, slot in self.resource_slots.items() if self.clients_by_resource[slot]}
+
+    def resources_by_clients(self):
+        """Return a `{resource: set(clients)}` view of the index, mostly useful for debugging."""
+        return {res: self.clients_with(res) for res in self.resource_slots}
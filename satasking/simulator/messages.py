@@ -8,6 +8,32 @@ MSG_NULL = ''
 MSG_OK = "ok"
 MSG_PING = "hello"
 MSG_PONG = "world"
+MSG_BEAT = "beat"
 MSG_RESOURCES_PREFIX = "::r::"
 MSG_TASK_PREFIX = "::t::"
-MSG_SEPARATOR = "::"
\ No newline at end of file
+MSG_BATCH_PREFIX = "::b::"
+MSG_ACK_PREFIX = "::a::"
+MSG_NACK_PREFIX = "::n::"
+MSG_DONE_PREFIX = "::d::"
+MSG_SEPARATOR = "::"
+MSG_BATCH_SEPARATOR = ";;"  # Between the tasks of a batch
+
+# Message types, shared by the text and the framed protocols
+TYPE_PING = 1
+TYPE_PONG = 2
+TYPE_OK = 3
+TYPE_DISCONNECT = 4
+TYPE_RESOURCES = 5
+TYPE_TASK = 6
+TYPE_TASK_BATCH = 7
+TYPE_ACK = 8  # The satellite started a task
+TYPE_NACK = 9  # The satellite couldn't execute a task
+TYPE_DONE = 10  # The satellite finished a task, its resources are available again
+TYPE_HEARTBEAT = 11  # Sent by idle satellites, and echoed by the server
+TYPE_RESUME = 12  # Tasks that a reconnected satellite is still executing
+
+# Features offered in the ping handshake
+MSG_FRAMED = "framed"  # Switch to the framed protocol
+MSG_BATCH = "batch"  # Receive all the tasks of a dispatch in a single message
+MSG_HEARTBEAT = "heartbeat"  # The server answers heartbeats, so dead connections are detected
+MSG_RESUME = "resume"  # Tasks in execution are kept when the connection is lost, and resumed
@@ -0,0 +1,302 @@
+"""Counters and histograms of the hot paths of the GroundStation and the satellites.
+
+Metrics are kept in process memory by `REGISTRY`, and read with `snapshot` (a dict) or
+`render` (the Prometheus text format, served at `/metrics`). Gauges are computed from the
+running server when they are read. Recording a value is a lock and an addition, and nothing at
+all if `METRICS_ENABLED` is False. Connections count their bytes and messages in their own
+attributes, without a lock, and those counts are added up when the metrics are read.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from django.conf import settings
+
+# Seconds, from 100us to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    """Metrics of the process, by name."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        metric.registry = self
+        return metric
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry(settings.METRICS_ENABLED)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = labels  # Names of the labels, values are given in the same order
+        self.lock = threading.Lock()
+        self.reset()
+        registry.register(self)
+
+    def reset(self):
+        with self.lock:
+            self.values = {}  # label values -> value
+
+    def label_str(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, value) for name, value in pairs) + '}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self.values.get(labels, 0)
+
+    def snapshot(self):
+        with self.lock:
+            if not self.labels:
+                return self.values.get((), 0)
+            return {','.join(labels): value for labels, value in self.values.items()}
+
+    def samples(self):
+        with self.lock:
+            if not self.labels:
+                return [(self.name, self.values.get((), 0))]
+            return [(self.name + self.label_str(labels), value)
+                    for labels, value in sorted(self.values.items())]
+
+
+class Timer:
+    """Context manager that observes the seconds spent in its block."""
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+
+class Histogram(Metric):
+    """Amount of observations by bucket (upper bound), with their count and sum."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value, labels=()):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            try:
+                counts = self.values[labels]
+            except KeyError:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value  # Sum of the observations
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def _summary(self, counts):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {'count': cumulative, 'sum': counts[-1], 'buckets': buckets}
+
+    def snapshot(self):
+        with self.lock:
+            summaries = {labels: self._summary(counts) for labels, counts in self.values.items()}
+        if not self.labels:
+            return summaries.get((), self._summary([0] * (len(self.buckets) + 1) + [0.0]))
+        return {','.join(labels): summary for labels, summary in summaries.items()}
+
+    def samples(self):
+        with self.lock:
+            summaries = [(labels, self._summary(counts))
+                         for labels, counts in sorted(self.values.items())]
+        samples = []
+        for labels, summary in summaries:
+            for bound, count in summary['buckets'].items():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((self.name + '_bucket' + self.label_str(labels, [('le', le)]),
+                                count))
+            samples.append((self.name + '_sum' + self.label_str(labels), summary['sum']))
+            samples.append((self.name + '_count' + self.label_str(labels), summary['count']))
+        return samples
+
+
+class Gauge(Metric):
+    """Value computed by `function(server)` when it's read, None if there isn't a server."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, function, registry=REGISTRY):
+        self.function = function
+        super().__init__(name, help, (), registry)
+
+    def snapshot(self, server=None):
+        return None if server is None else self.function(server)
+
+    def samples(self, server=None):
+        value = self.snapshot(server)
+        return [] if value is None else [(self.name, value)]
+
+
+class ConnectionCounter(Metric):
+    """Counter of an `attribute` of the live `connections`, plus the one of the closed ones."""
+    kind = 'counter'
+
+    def __init__(self, name, help, attribute, connections, registry=REGISTRY):
+        self.attribute = attribute
+        self.connections = connections
+        super().__init__(name, help, (), registry)
+
+    def closed(self, connection):
+        with self.lock:
+            self.values[()] = self.values.get((), 0) + getattr(connection, self.attribute)
+
+    def value(self):
+        live = sum(getattr(connection, self.attribute) for connection in list(self.connections))
+        return self.values.get((), 0) + live
+
+    def snapshot(self):
+        return self.value()
+
+    def samples(self):
+        return [(self.name, self.value())]
+
+
+class Connections(weakref.WeakSet):
+    """Live connections, with counters of the bytes and messages they received and sent.
+
+    Connections must have `bytes_received`, `bytes_sent`, `messages_received` and
+    `messages_sent` attributes, and call `open` and `close`.
+    """
+
+    def __init__(self, prefix, peer):
+        super().__init__()
+        self.counters = [
+            ConnectionCounter('{}_{}_total'.format(prefix, attribute),
+                              "{} {} {}.".format(kind.capitalize(), direction, peer),
+                              attribute, self)
+            for kind in ('bytes', 'messages')
+            for direction, attribute in (('received from', kind + '_received'),
+                                         ('sent to', kind + '_sent'))
+        ]
+
+    def open(self, connection):
+        if REGISTRY.enabled:
+            self.add(connection)
+
+    def close(self, connection):
+        """Move the counts of `connection` to the closed ones, it's not live anymore."""
+        if connection in self:
+            self.discard(connection)
+            for counter in self.counters:
+                counter.closed(connection)
+                setattr(connection, counter.attribute, 0)
+
+
+# GroundStation
+DISPATCH_SECONDS = Histogram('satasking_dispatch_phase_seconds',
+                             "Seconds spent by each phase of a dispatch.", labels=('phase',))
+TASKS_ASSIGNED = Counter('satasking_tasks_assigned_total', "Tasks assigned to a client.")
+TASKS_UNASSIGNED = Counter('satasking_tasks_unassigned_total',
+                           "Tasks that no client could execute in a dispatch.")
+SERVER_CONNECTIONS = Connections('satasking', "the clients")
+
+
+def _resources(server):
+    with server.clients.lock:
+        return server.index.resource_counts()
+
+
+def _utilization(server):
+    total, available = _resources(server)
+    return 1.0 - available / total if total else 0.0
+
+
+CLIENTS_CONNECTED = Gauge('satasking_clients_connected', "Clients connected to the server.",
+                          lambda server: len(server.clients))
+CLIENTS_REGISTERED = Gauge('satasking_clients_registered', "Clients that sent their resources.",
+                           lambda server: len(server.index))
+RESOURCES_TOTAL = Gauge('satasking_resources_total', "Resources of the registered clients.",
+                        lambda server: _resources(server)[0])
+RESOURCES_AVAILABLE = Gauge('satasking_resources_available',
+                            "Resources not used by the tasks in execution.",
+                            lambda server: _resources(server)[1])
+RESOURCE_UTILIZATION = Gauge('satasking_resource_utilization',
+                             "Fraction of the resources used by the tasks in execution.",
+                             _utilization)
+TASKS_QUEUED = Gauge('satasking_tasks_queued', "Tasks waiting in the dispatch scheduler.",
+                     lambda server: len(server.scheduler))
+
+# Satellites running in this process
+SATELLITE_CONNECTIONS = Connections('satasking_satellite', "the server by the satellites")
+
+
+def connections(server):
+    """Return the bytes and messages exchanged with each connected client of `server`."""
+    stats = {}
+    for client in server.clients:
+        info = server.clients.get(client)
+        if info is None or not hasattr(client, 'bytes_received'):
+            continue
+        key = info.get('name') or '{}:{}'.format(*info['address'])
+        stats[key] = {
+            'bytes_received': client.bytes_received,
+            'bytes_sent': client.bytes_sent,
+            'messages_received': client.messages_received,
+            'messages_sent': client.messages_sent,
+        }
+    return stats
+
+
+def snapshot(server=None, registry=REGISTRY):
+    """Return a dict with the value of every metric, and the connections stats of `server`."""
+    metrics = {}
+    for name, metric in registry.metrics.items():
+        metrics[name] = metric.snapshot(server) if metric.kind == 'gauge' else metric.snapshot()
+    if server is not None:
+        metrics['connections'] = connections(server)
+    return metrics
+
+
+def render(server=None, registry=REGISTRY):
+    """Return the metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, metric in sorted(registry.metrics.items()):
+        samples = metric.samples(server) if metric.kind == 'gauge' else metric.samples()
+        if not samples:
+            continue
+        lines.append('# HELP {} {}'.format(name, metric.help))
+        lines.append('# TYPE {} {}'.format(name, metric.kind))
+        lines.extend('{} {}'.format(sample, value) for sample, value in samples)
+    return '\n'.join(lines) + '\n'
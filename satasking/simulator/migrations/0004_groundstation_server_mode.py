@@ -0,0 +1,18 @@
+# Generated by Django 2.1.2 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0003_auto_20181010_0225'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groundstation',
+            name='server_mode',
+            field=models.CharField(choices=[('threaded', 'Threaded (one thread per satellite)'), ('asyncio', 'Asyncio (single event loop)')], default='threaded', help_text='How the server handles satellite connections.', max_length=16),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.28 on 2026-10-17 18:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0004_groundstation_server_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Resource id.', max_length=255, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskResource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_links', to='simulator.Resource')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='simulator.Task')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SatelliteResource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='satellite_links', to='simulator.Resource')),
+                ('satellite', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='simulator.Satellite')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='satellite',
+            name='resource_set',
+            field=models.ManyToManyField(editable=False, related_name='satellites', through='simulator.SatelliteResource', to='simulator.Resource'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='resource_set',
+            field=models.ManyToManyField(editable=False, related_name='tasks', through='simulator.TaskResource', to='simulator.Resource'),
+        ),
+        migrations.AddIndex(
+            model_name='taskresource',
+            index=models.Index(fields=['resource', 'task'], name='simulator_t_resourc_ba0c1e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskresource',
+            unique_together={('task', 'resource')},
+        ),
+        migrations.AddIndex(
+            model_name='satelliteresource',
+            index=models.Index(fields=['resource', 'satellite'], name='simulator_s_resourc_a43497_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='satelliteresource',
+            unique_together={('satellite', 'resource')},
+        ),
+    ]
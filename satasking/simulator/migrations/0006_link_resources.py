@@ -0,0 +1,39 @@
+from django.db import migrations
+
+BATCH_SIZE = 400
+
+
+def parse_resources(resources):
+    return list(dict.fromkeys(res.strip() for res in resources.split(',') if res.strip()))
+
+
+def link_resources(apps, schema_editor):
+    """Create the `Resource` rows and links of the comma separated `resources` fields."""
+    Resource = apps.get_model('simulator', 'Resource')
+    ids = {}
+    for model_name, through_name, column in (('Satellite', 'SatelliteResource', 'satellite_id'),
+                                             ('Task', 'TaskResource', 'task_id')):
+        model = apps.get_model('simulator', model_name)
+        through = apps.get_model('simulator', through_name)
+        rows = model.objects.order_by('pk').values_list('pk', 'resources').iterator()
+        links = []
+        for pk, resources in rows:
+            for name in parse_resources(resources):
+                if name not in ids:
+                    ids[name] = Resource.objects.create(name=name).pk
+                links.append(through(**{column: pk, 'resource_id': ids[name]}))
+            if len(links) >= BATCH_SIZE:
+                through.objects.bulk_create(links)
+                links = []
+        through.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0005_resources'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_resources, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-17 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0006_link_resources'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='name',
+            field=models.CharField(db_index=True, help_text='Task name', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='taskexecution',
+            name='date_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
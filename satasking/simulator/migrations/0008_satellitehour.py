@@ -0,0 +1,49 @@
+# Generated by Django 2.2.28 on 2026-10-17 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncHour
+import django.db.models.deletion
+
+
+def build_rollups(apps, schema_editor):
+    """Compute the rollups of the existing executions."""
+    SatelliteHour = apps.get_model('simulator', 'SatelliteHour')
+    TaskExecution = apps.get_model('simulator', 'TaskExecution')
+    TaskResource = apps.get_model('simulator', 'TaskResource')
+    required = TaskResource.objects.filter(task=OuterRef('task')).values('task').annotate(
+        count=Count('pk')).values('count')
+    rows = TaskExecution.objects.annotate(
+        hour=TruncHour('date_time'), task_resources=Coalesce(Subquery(required), 0)).values(
+        'satellite', 'hour').annotate(executions=Count('id'), payoff=Sum('task__payoff'),
+                                      resources=Sum('task_resources')).order_by()
+    SatelliteHour.objects.bulk_create(
+        [SatelliteHour(satellite_id=row['satellite'], hour=row['hour'],
+                       executions=row['executions'], payoff=row['payoff'],
+                       resources=row['resources']) for row in rows],
+        batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0007_taskexecution_date_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SatelliteHour',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('executions', models.PositiveIntegerField(default=0)),
+                ('payoff', models.BigIntegerField(default=0)),
+                ('resources', models.PositiveIntegerField(default=0)),
+                ('satellite', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='simulator.Satellite')),
+            ],
+            options={
+                'unique_together': {('satellite', 'hour')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
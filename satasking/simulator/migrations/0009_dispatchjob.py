@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0008_satellitehour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispatchJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('query', models.TextField(help_text='JSON with the tasks ids or filter to dispatch.')),
+                ('solver', models.CharField(blank=True, help_text="Solver to use, DISPATCH_SOLVER if it's empty.", max_length=16)),
+                ('total', models.PositiveIntegerField(help_text='Tasks to dispatch.', null=True)),
+                ('processed', models.PositiveIntegerField(default=0, help_text='Tasks dispatched so far.')),
+                ('dispatched', models.PositiveIntegerField(default=0, help_text='Tasks assigned so far.')),
+                ('payoff', models.BigIntegerField(default=0, help_text='Payoff of the assigned tasks.')),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(null=True)),
+                ('finished', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0009_dispatchjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='satellite',
+            name='pid',
+            field=models.PositiveIntegerField(editable=False, help_text='Process running this satellite.', null=True),
+        ),
+    ]
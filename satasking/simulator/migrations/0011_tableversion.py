@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-17 20:05
+
+import time
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    """Create the version of the executions, so changing it is a single update."""
+    TableVersion = apps.get_model('simulator', 'TableVersion')
+    TableVersion.objects.create(name='simulator.taskexecution', version=int(time.time() * 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0010_satellite_pid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
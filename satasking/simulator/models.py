@@ -1,14 +1,131 @@
 import logging
+import os
+import socket
+import subprocess
+import sys
 import threading
+import time
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
+from simulator import metrics
+from simulator.aio_ground_station import AsyncGroundStationServer
+from simulator.cluster import Coordinator, hash_ring
+from simulator.control import ControlClient
+from simulator.fleet import Fleet
 from simulator.ground_station import GroundStationServer
 from simulator.satellite import SatelliteClient
 
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for the ground station daemon to answer after starting it
+DAEMON_START_TIMEOUT = 10.0
+
+# Seconds to wait for a server of another process to accept a connection
+ALIVE_TIMEOUT = 1.0
+
+# Rows by query when linking resources, below the SQLite limit of 999 variables by query
+LINK_BATCH_SIZE = 400
+
+
+def parse_resources(resources):
+    """Return the resources names of a comma separated `resources` string, without repeats."""
+    return list(dict.fromkeys(res.strip() for res in resources.split(',') if res.strip()))
+
+
+def process_alive(pid):
+    """Whether there is a process with `pid` running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # It runs as another user
+    return True
+
+
+def link_resources(objects):
+    """Link the saved `objects` (satellites or tasks) to the `Resource` of their `resources`.
+
+    Missing resources are created, and the previous links of the objects are replaced. It makes
+    a few queries for any amount of objects, so objects inserted with `bulk_create` can be
+    linked after it (note that with SQLite they must be fetched again, to get their ids).
+    """
+    objects = list(objects)
+    if not objects:
+        return
+    model = type(objects[0])
+    through = model.resource_set.through
+    column = model._meta.model_name + '_id'
+    names = {obj.pk: parse_resources(obj.resources) for obj in objects}
+    ids = Resource.ids({name for obj_names in names.values() for name in obj_names})
+    pks = list(names)
+    with transaction.atomic():
+        for start in range(0, len(pks), LINK_BATCH_SIZE):
+            through.objects.filter(**{column + '__in': pks[start:start + LINK_BATCH_SIZE]}).delete()
+        through.objects.bulk_create(
+            [through(**{column: pk, 'resource_id': ids[name]})
+             for pk, obj_names in names.items() for name in obj_names],
+            batch_size=LINK_BATCH_SIZE)
+
+
+class ResourcesModel(models.Model):
+    """Model with a comma separated `resources` field, kept linked to the `Resource` table.
+
+    The field is still used by the ground station protocol and the solvers, the links are
+    used to query by resource. They are updated when the model is saved with other resources.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._linked_resources = instance.__dict__.get('resources')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.resources != getattr(self, '_linked_resources', None):
+            link_resources([self])
+            self._linked_resources = self.resources
+
+
+def save_executions(assignments):
+    """Save the `TaskExecution` of the (task, satellite name) `assignments` and return them.
+
+    They're saved with a single query to get the satellites ids and a bulk insert, in one
+    transaction, with the update of their `SatelliteHour` rollups. Tasks that aren't saved
+    (without `pk`) are skipped.
+    """
+    satellites = dict(Satellite.objects.filter(
+        name__in={name for _, name in assignments}).values_list('name', 'id'))
+    executions, executed = [], []
+    for task, sat in assignments:
+        if task.pk is None:
+            continue
+        if sat not in satellites:
+            logger.error("Satellite {} isn't registered, execution of task {} not saved"
+                         .format(sat, task.name))
+            continue
+        executions.append(TaskExecution(task_id=task.pk, satellite_id=satellites[sat]))
+        executed.append(task)
+    with metrics.DISPATCH_SECONDS.time('persist'), transaction.atomic():
+        executions = TaskExecution.objects.bulk_create(executions)
+        SatelliteHour.add(
+            (execution.satellite_id, execution.date_time, task.payoff,
+             len(parse_resources(task.resources)))
+            for execution, task in zip(executions, executed))
+    if executions:
+        TaskExecution.changed()  # bulk_create doesn't send the post_save signals
+    return executions
+
 
 class SingletonModel(models.Model):
     """This abstract class prevents that you can create more than one GroundStation instance."""
@@ -30,18 +147,83 @@ class SingletonModel(models.Model):
 
 
 class GroundStation(SingletonModel):
+    THREADED = 'threaded'
+    ASYNCIO = 'asyncio'
+    SERVER_MODES = (
+        (THREADED, "Threaded (one thread per satellite)"),
+        (ASYNCIO, "Asyncio (single event loop)"),
+    )
+
     hostname = models.CharField(max_length=64, default=settings.DEFAULT_SERVER_HOSTNAME,
                                 help_text="Server hostname where will be listening.")
     port = models.PositiveIntegerField(default=settings.DEFAULT_SERVER_PORT,
                                        help_text="Server port where will be listening.")
+    server_mode = models.CharField(max_length=16, choices=SERVER_MODES, default=THREADED,
+                                   help_text="How the server handles satellite connections.")
     running = models.BooleanField(default=False, editable=False)
 
+    @property
+    def server(self):
+        """The running server, a `ControlClient` of the daemon with
+        `settings.GROUND_STATION_SOCKET`.
+        """
+        if settings.GROUND_STATION_SOCKET:
+            return ControlClient(settings.GROUND_STATION_SOCKET)
+        return settings.SERVER
+
+    @property
+    def alive(self):
+        """Whether the server runs in this process (or the daemon answers), or another process
+        is listening in its address. `running` stays set if its process died.
+        """
+        if settings.GROUND_STATION_SOCKET:
+            return self.server.ping()
+        if settings.SERVER is not None:
+            return True
+        try:
+            socket.create_connection((self.hostname, self.port), timeout=ALIVE_TIMEOUT).close()
+        except OSError:
+            return False
+        return True
+
+    def create_server(self):
+        """Return the SocketServer of this GroundStation, ready to `serve_forever`.
+
+        With `settings.STATE_DIR` the server restores the state of the previous one. With
+        `settings.GROUND_STATION_NODES` above 1 it runs as a `Coordinator` of that amount of node
+        processes, listening from `port` on. The executions of the tasks dispatched by the
+        scheduler (as they arrive or resources are released) are saved as they're dispatched.
+        """
+        if settings.GROUND_STATION_NODES > 1:
+            return Coordinator(self.hostname, self.port, settings.GROUND_STATION_NODES,
+                               self.server_mode, on_dispatch=save_executions)
+        if self.server_mode == self.ASYNCIO:
+            server = AsyncGroundStationServer(self.hostname, self.port)
+        else:
+            server = GroundStationServer(self.hostname, self.port)
+        server.scheduler.on_dispatch = save_executions
+        return server
+
     def run(self):
-        """Execute the SocketServer for GroundStation."""
-        if self.running:
+        """Execute the SocketServer for GroundStation.
+
+        With `settings.GROUND_STATION_SOCKET` it's run by the `run_ground_station` daemon,
+        started here if it isn't running, instead of a thread of this process.
+        """
+        if self.running and self.alive:
             logger.error("Currently Server seems to be already running, if not, please stop it.")
             return
-        server = GroundStationServer(self.hostname, self.port)
+        if self.running:
+            logger.warning("Server was left running by a process that died, running it again.")
+        if settings.GROUND_STATION_SOCKET:
+            self.start_daemon()
+            return
+        try:
+            server = self.create_server()
+        except OSError as err:
+            logger.error("Server couldn't listen in {}:{}: {}".format(self.hostname, self.port,
+                                                                      err))
+            return
         th_server = threading.Thread(target=server.serve_forever)
         settings.SERVER = server  # Save the running server instance reference
         settings.SERVER_TH = th_server  # Save the running thread instance reference
@@ -49,13 +231,37 @@ class GroundStation(SingletonModel):
         self.save()
         th_server.start()
 
+    def start_daemon(self):
+        """Start the `run_ground_station` daemon in its own session, and wait for it to answer
+        in the control channel.
+        """
+        subprocess.Popen([sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+                          'run_ground_station'],
+                         stdin=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        while not self.alive:
+            if time.monotonic() > deadline:
+                logger.error("The ground station daemon didn't start, see its log.")
+                return
+            time.sleep(0.1)
+        self.refresh_from_db()  # The daemon sets it running
+
     def stop(self):
         """Stop the running SocketServer."""
         if not self.running:
             logger.error("Currently Server seems to be already stopped.")
             return
+        if settings.GROUND_STATION_SOCKET:
+            try:
+                self.server.stop()  # The daemon clears `running` when it exits
+            except OSError:
+                logger.error("Seems that currently the ground station daemon has been lost")
+            self.running = False
+            self.save()
+            return
         try:
             settings.SERVER.shutdown()
+            settings.SERVER.server_close()
         except AttributeError:
             logger.error("Seems that currently server has been lost")
         else:
@@ -65,18 +271,55 @@ class GroundStation(SingletonModel):
         self.running = False
         self.save()
 
-    def dispatch_tasks(self, tasks):
+    def dispatch_tasks(self, tasks, solver=None):
         """Call the dispatch _tasks method from SocketServer with desired tasks to dispatch to
-        clients."""
-        dispatched = settings.SERVER.dispatch_tasks(tasks)
-        for task, sat in dispatched.items():
-            TaskExecution.objects.create(
-                task_id=Task.objects.get(name=task).id,
-                satellite_id=Satellite.objects.get(name=sat).id
-            )
+        clients, optionally choosing the `solver` to use.
+
+        Return the list of created `TaskExecution`, see `save_executions`.
+        """
+        return save_executions(self.server.dispatch_assignments(tasks, solver=solver))
+
 
+class Resource(models.Model):
+    """A resource that satellites have and tasks require."""
+    name = models.CharField(max_length=settings.MAX_CHAR_LENGTH, unique=True,
+                            help_text="Resource id.")
 
-class Satellite(models.Model):
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def ids(cls, names):
+        """Return a `{name: id}` dict of the resources `names`, creating the missing ones."""
+        names = list(names)
+        ids = {}
+        for start in range(0, len(names), LINK_BATCH_SIZE):
+            batch = names[start:start + LINK_BATCH_SIZE]
+            ids.update(cls.objects.filter(name__in=batch).values_list('name', 'id'))
+            missing = [cls(name=name) for name in batch if name not in ids]
+            if missing:
+                cls.objects.bulk_create(missing, ignore_conflicts=True)
+                ids.update(cls.objects.filter(name__in=[res.name for res in missing])
+                           .values_list('name', 'id'))
+        return ids
+
+
+class SatelliteQuerySet(models.QuerySet):
+    def with_resources(self, *names):
+        """Satellites that have all the resources `names`."""
+        names = set(names)
+        return self.filter(resource_set__name__in=names).annotate(
+            matched=Count('resource_set')).filter(matched=len(names))
+
+    def able_to_run(self, task):
+        """Satellites that have all the resources required by `task` (a `Task` or its id)."""
+        required = TaskResource.objects.filter(task=task).values('task').annotate(
+            count=Count('pk')).values('count')
+        return self.filter(resource_set__task_links__task=task).annotate(
+            matched=Count('resource_set')).filter(matched=Subquery(required))
+
+
+class Satellite(ResourcesModel):
     hostname = models.CharField(max_length=64, default=settings.DEFAULT_SERVER_HOSTNAME,
                                 help_text="Server hostname where this client will connect.")
     port = models.PositiveIntegerField(default=settings.DEFAULT_SERVER_PORT,
@@ -86,17 +329,44 @@ class Satellite(models.Model):
     name = models.CharField(max_length=settings.MAX_CHAR_LENGTH, unique=True, default='',
                             help_text="Name for this satellite. It must be unique.")
     running = models.BooleanField(default=False, editable=False)
+    pid = models.PositiveIntegerField(null=True, editable=False,
+                                      help_text="Process running this satellite.")
+    resource_set = models.ManyToManyField(Resource, through='SatelliteResource',
+                                          related_name='satellites', editable=False)
+
+    objects = SatelliteQuerySet.as_manager()
+
+    @property
+    def address(self):
+        """The (hostname, port) where it connects, the port of the node of its shard with
+        `settings.GROUND_STATION_NODES`.
+        """
+        if settings.GROUND_STATION_NODES > 1:
+            return self.hostname, self.port + hash_ring(settings.GROUND_STATION_NODES).node_for(
+                self.name)
+        return self.hostname, self.port
+
+    @property
+    def alive(self):
+        """Whether the satellite runs in this process, or its `pid` in another one (like
+        `run_fleet`). `running` stays set if its process died.
+        """
+        fleet = settings.FLEET
+        if self.name in settings.SATELLITES or (fleet is not None and self.name in fleet.names):
+            return True
+        return self.pid is not None and self.pid != os.getpid() and process_alive(self.pid)
 
     def run(self):
         """Run current Satellite instance."""
-        if self.running:
+        if self.running and self.alive:
             logger.error("Currently Satellite seems to be already running."\
                          "If not, please try to stop it.")
             return
-        sate = SatelliteClient(self.hostname, self.port, self.resources, self.name)
+        sate = SatelliteClient(*self.address, self.resources, self.name)
         th_satellite = threading.Thread(target=sate.run)
         settings.SATELLITES[self.name] = (sate, th_satellite)
         self.running = True
+        self.pid = os.getpid()
         self.save()
         th_satellite.start()
 
@@ -110,16 +380,75 @@ class Satellite(models.Model):
         else:
             del settings.SATELLITES[self.name]  # Remove reference and let gc to wipe memory
         self.running = False
+        self.pid = None
         self.save()
 
+    @classmethod
+    def run_fleet(cls, satellites, processes=None):
+        """Run the `satellites` in a `Fleet` of processes, instead of a thread for each one."""
+        if settings.FLEET is not None:
+            logger.error("Currently a fleet of satellites seems to be already running, "
+                         "please stop it first.")
+            return
+        satellites = [sat for sat in satellites if not (sat.running and sat.alive)]
+        if not satellites:
+            return
+        fleet = Fleet([sat.address + (sat.resources, sat.name) for sat in satellites],
+                      processes or settings.FLEET_PROCESSES)
+        settings.FLEET = fleet
+        cls.objects.filter(pk__in=[sat.pk for sat in satellites]).update(running=True,
+                                                                         pid=os.getpid())
+        fleet.start()
+
+    @classmethod
+    def stop_fleet(cls):
+        """Stop all the satellites of the running fleet."""
+        if settings.FLEET is None:
+            logger.error("Seems that there isn't a fleet of satellites running.")
+            return
+        fleet, settings.FLEET = settings.FLEET, None
+        fleet.stop()
+        cls.objects.filter(name__in=fleet.names).update(running=False, pid=None)
+
+
+class TaskQuerySet(models.QuerySet):
+    def requiring(self, *names):
+        """Tasks that require all the resources `names`."""
+        names = set(names)
+        return self.filter(resource_set__name__in=names).annotate(
+            matched=Count('resource_set')).filter(matched=len(names))
+
+    def runnable_by(self, satellite):
+        """Tasks whose required resources are all resources of `satellite`."""
+        held = SatelliteResource.objects.filter(satellite=satellite).values('resource')
+        return self.exclude(pk__in=TaskResource.objects.exclude(resource__in=held).values('task'))
 
-class Task(models.Model):
+    def candidates(self):
+        """Return a `{task id: set(satellite names)}` dict with the satellites able to run each
+        task, with two queries for all the tasks.
+        """
+        required = dict(self.annotate(count=Count('resource_set')).values_list('pk', 'count'))
+        matches = TaskResource.objects.filter(task__in=self.values('pk')).values_list(
+            'task', 'resource__satellite_links__satellite__name').annotate(matched=Count('pk'))
+        candidates = {pk: set() for pk in required}
+        for pk, name, matched in matches:
+            if name is not None and matched == required[pk]:
+                candidates[pk].add(name)
+        return candidates
+
+
+class Task(ResourcesModel):
     """Represent a task in the system."""
-    name = models.CharField(max_length=settings.MAX_CHAR_LENGTH, help_text="Task name")
+    name = models.CharField(max_length=settings.MAX_CHAR_LENGTH, db_index=True,
+                            help_text="Task name")
     payoff = models.PositiveIntegerField(help_text="Task payoff")
     resources = models.CharField(max_length=settings.MAX_CHAR_LENGTH,
                                  help_text="Comma separated resources ids.")
     runner = models.ManyToManyField(Satellite, through='TaskExecution')
+    resource_set = models.ManyToManyField(Resource, through='TaskResource',
+                                          related_name='tasks', editable=False)
+
+    objects = TaskQuerySet.as_manager()
 
     def __repr__(self):
         args = {
@@ -131,8 +460,186 @@ class Task(models.Model):
                .format(**args)
 
 
+class TableVersion(models.Model):
+    """Version of a table, changed whenever the table is modified.
+
+    It's kept in the database, so every process (web workers, the ground station daemon)
+    sees the changes made by the others.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField()
+
+    @classmethod
+    def get(cls, name):
+        """Return the version of the table `name`, 0 until it's changed."""
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def change(cls, name):
+        """Change the version of the table `name`.
+
+        The first version starts from the current time, so a table whose versions were deleted
+        doesn't repeat a previous one.
+        """
+        if not cls.objects.filter(name=name).update(version=F('version') + 1):
+            cls.objects.get_or_create(name=name, defaults={'version': int(time.time() * 1000)})
+
+
 class TaskExecution(models.Model):
     """Intermediate table, represents the execution of a task by a client."""
+    VERSION_KEY = 'simulator.taskexecution'
+
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     satellite = models.ForeignKey(Satellite, on_delete=models.CASCADE)
-    date_time = models.DateTimeField(auto_now_add=True)
+    date_time = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @classmethod
+    def version(cls):
+        """Return the version of the executions table, that changes whenever it's modified."""
+        return TableVersion.get(cls.VERSION_KEY)
+
+    @classmethod
+    def changed(cls):
+        """Change the version of the executions, invalidating what was cached with the previous
+        one. It must be called after the executions are inserted or updated in bulk.
+        """
+        TableVersion.change(cls.VERSION_KEY)
+
+
+class SatelliteHour(models.Model):
+    """Rollup of the executions of a satellite in an hour, updated as they are saved.
+
+    `resources` is the sum of the resources required by the executed tasks. Deleted executions
+    are only taken out of the rollups by `rebuild`.
+    """
+    satellite = models.ForeignKey(Satellite, on_delete=models.CASCADE)
+    hour = models.DateTimeField(db_index=True)
+    executions = models.PositiveIntegerField(default=0)
+    payoff = models.BigIntegerField(default=0)
+    resources = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('satellite', 'hour')
+
+    @staticmethod
+    def truncate(date_time):
+        return date_time.replace(minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def add(cls, executions):
+        """Add the `executions`, `(satellite id, date_time, payoff, resources)` tuples, to
+        their rollups, with a query to get the existing ones, a bulk update and a bulk insert.
+        """
+        totals = {}
+        for satellite_id, date_time, payoff, resources in executions:
+            total = totals.setdefault((satellite_id, cls.truncate(date_time)), [0, 0, 0])
+            total[0] += 1
+            total[1] += payoff
+            total[2] += resources
+        if not totals:
+            return
+        with transaction.atomic(savepoint=False):
+            existing = cls.objects.select_for_update().filter(
+                satellite_id__in={satellite_id for satellite_id, _ in totals},
+                hour__in={hour for _, hour in totals})
+            updated = []
+            for rollup in existing:
+                total = totals.pop((rollup.satellite_id, rollup.hour), None)
+                if total is not None:
+                    rollup.executions += total[0]
+                    rollup.payoff += total[1]
+                    rollup.resources += total[2]
+                    updated.append(rollup)
+            cls.objects.bulk_update(updated, ['executions', 'payoff', 'resources'],
+                                    batch_size=LINK_BATCH_SIZE // 4)
+            cls.objects.bulk_create(
+                [cls(satellite_id=satellite_id, hour=hour, executions=total[0], payoff=total[1],
+                     resources=total[2]) for (satellite_id, hour), total in totals.items()],
+                batch_size=LINK_BATCH_SIZE // 4)
+
+    @classmethod
+    def rebuild(cls):
+        """Compute again all the rollups from the executions table."""
+        from simulator import analytics
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(satellite_id=row['satellite'], hour=row['hour'],
+                     executions=row['executions'], payoff=row['payoff'],
+                     resources=row['resources'])
+                 for row in analytics.scan_satellite_hours(TaskExecution.objects.all())],
+                batch_size=LINK_BATCH_SIZE // 4)
+
+
+class DispatchJob(models.Model):
+    """Dispatch of tasks requested by the API, run by the worker of `simulator.jobs`.
+
+    `query` is a JSON object with the `tasks` ids, or the `filter` of `TaskFilter`, of the tasks
+    to dispatch. The progress and results are updated as each chunk of tasks is dispatched.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED)
+    query = models.TextField(help_text="JSON with the tasks ids or filter to dispatch.")
+    solver = models.CharField(max_length=16, blank=True,
+                              help_text="Solver to use, DISPATCH_SOLVER if it's empty.")
+    total = models.PositiveIntegerField(null=True, help_text="Tasks to dispatch.")
+    processed = models.PositiveIntegerField(default=0, help_text="Tasks dispatched so far.")
+    dispatched = models.PositiveIntegerField(default=0, help_text="Tasks assigned so far.")
+    payoff = models.BigIntegerField(default=0, help_text="Payoff of the assigned tasks.")
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+
+    @property
+    def progress(self):
+        """Fraction of the tasks already dispatched, None until they're counted."""
+        if self.total is None:
+            return None
+        return self.processed / self.total if self.total else 1.0
+
+
+@receiver(post_save, sender=TaskExecution)
+def execution_saved(sender, instance, created, **kwargs):
+    if created:
+        task = instance.task
+        SatelliteHour.add([(instance.satellite_id, instance.date_time, task.payoff,
+                            len(parse_resources(task.resources)))])
+    TaskExecution.changed()
+
+
+@receiver(post_delete, sender=TaskExecution)
+def execution_deleted(sender, **kwargs):
+    TaskExecution.changed()
+
+
+class SatelliteResource(models.Model):
+    """Intermediate table, a resource of a satellite."""
+    satellite = models.ForeignKey(Satellite, on_delete=models.CASCADE)
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE,
+                                 related_name='satellite_links')
+
+    class Meta:
+        unique_together = ('satellite', 'resource')
+        indexes = [models.Index(fields=['resource', 'satellite'])]
+
+
+class TaskResource(models.Model):
+    """Intermediate table, a resource required by a task."""
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='task_links')
+
+    class Meta:
+        unique_together = ('task', 'resource')
+        indexes = [models.Index(fields=['resource', 'task'])]
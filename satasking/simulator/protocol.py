@@ -0,0 +1,256 @@
+import logging
+
+from simulator.messages import (MSG_ACK_PREFIX, MSG_BATCH_PREFIX, MSG_BATCH_SEPARATOR, MSG_BEAT,
+                                MSG_DISCONNECT, MSG_DONE_PREFIX, MSG_ENCODING, MSG_NACK_PREFIX,
+                                MSG_OK, MSG_PING, MSG_PONG, MSG_RESOURCES_PREFIX, MSG_SEPARATOR,
+                                MSG_TASK_PREFIX, TYPE_ACK, TYPE_DISCONNECT, TYPE_DONE,
+                                TYPE_HEARTBEAT, TYPE_NACK, TYPE_OK, TYPE_PING, TYPE_PONG,
+                                TYPE_RESOURCES, TYPE_RESUME, TYPE_TASK, TYPE_TASK_BATCH)
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# Fields of each message type:
+# PING, PONG: (features,) where features is a list of str
+# OK, DISCONNECT, HEARTBEAT: ()
+# RESOURCES: (resources, name) where resources is a list of str
+# TASK: (name, payoff, resources)
+# TASK_BATCH: (tasks,) where tasks is a list of (name, payoff, resources)
+# ACK, NACK, DONE: (name,) with the name of the task
+# RESUME: (names,) with the names of the tasks in execution (only in the framed protocol)
+
+
+# Prefixes of the text messages about a task
+TASK_FEEDBACK_PREFIXES = {
+    TYPE_ACK: MSG_ACK_PREFIX,
+    TYPE_NACK: MSG_NACK_PREFIX,
+    TYPE_DONE: MSG_DONE_PREFIX,
+}
+
+
+class TextProtocol:
+    """The original protocol, plain strings with prefixes and separators.
+
+    It has no message boundaries: each chunk read from the socket is handled as one message.
+    """
+    name = 'text'
+
+    def encode(self, kind, *fields):
+        """Return the bytes to send a message of type `kind` with `fields`."""
+        if kind == TYPE_PING or kind == TYPE_PONG:
+            message = (MSG_PING if kind == TYPE_PING else MSG_PONG) + ''.join(
+                MSG_SEPARATOR + feature for feature in fields[0])
+        elif kind == TYPE_OK:
+            message = MSG_OK
+        elif kind == TYPE_DISCONNECT:
+            message = MSG_DISCONNECT
+        elif kind == TYPE_HEARTBEAT:
+            message = MSG_BEAT
+        elif kind == TYPE_RESOURCES:
+            resources, name = fields
+            message = "{}{}{}{}".format(MSG_RESOURCES_PREFIX, ','.join(resources),
+                                        MSG_SEPARATOR, name)
+        elif kind == TYPE_TASK:
+            message = MSG_TASK_PREFIX + self._encode_task(*fields)
+        elif kind == TYPE_TASK_BATCH:
+            message = MSG_BATCH_PREFIX + MSG_BATCH_SEPARATOR.join(
+                self._encode_task(*task) for task in fields[0])
+        elif kind in TASK_FEEDBACK_PREFIXES:
+            message = TASK_FEEDBACK_PREFIXES[kind] + fields[0]
+        else:
+            raise ValueError("Unknown message type: {}".format(kind))
+        return bytes(message, MSG_ENCODING)
+
+    def _encode_task(self, name, payoff, resources):
+        return "{n}{sep}{p}{sep}{r}".format(n=name, sep=MSG_SEPARATOR, p=payoff,
+                                            r=','.join(resources))
+
+    def _decode_task(self, message):
+        name, payoff, resources = message.split(MSG_SEPARATOR)
+        return name, int(payoff), resources.split(',')
+
+    def feed(self, data):
+        """Return the list of (kind, fields) messages received in `data`."""
+        message = str(data, MSG_ENCODING)
+        for kind, prefix in TASK_FEEDBACK_PREFIXES.items():
+            if message.startswith(prefix):
+                return [(kind, (message[len(prefix):],))]
+        if MSG_RESOURCES_PREFIX in message:
+            resources, name = message.split(MSG_RESOURCES_PREFIX)[1].split(MSG_SEPARATOR)
+            return [(TYPE_RESOURCES, (resources.split(','), name))]
+        if MSG_TASK_PREFIX in message:
+            return [(TYPE_TASK, self._decode_task(message.split(MSG_TASK_PREFIX)[1]))]
+        if MSG_BATCH_PREFIX in message:
+            tasks = message.split(MSG_BATCH_PREFIX)[1].split(MSG_BATCH_SEPARATOR)
+            return [(TYPE_TASK_BATCH, ([self._decode_task(task) for task in tasks],))]
+        if message == MSG_OK:
+            return [(TYPE_OK, ())]
+        if message == MSG_DISCONNECT:
+            return [(TYPE_DISCONNECT, ())]
+        if message == MSG_BEAT:
+            return [(TYPE_HEARTBEAT, ())]
+        word, *features = message.split(MSG_SEPARATOR)
+        if word == MSG_PING:
+            return [(TYPE_PING, (features,))]
+        if word == MSG_PONG:
+            return [(TYPE_PONG, (features,))]
+        logger.warning("Unknown message: {}".format(message))
+        return []
+
+
+LIST_SEPARATOR = '\x1f'  # ASCII unit separator, between the items of a list of str
+# Varints of the values that take a single byte, the usual lengths and payoffs
+SMALL_VARINTS = [bytes((value,)) for value in range(0x80)]
+
+
+def pack_varint(value):
+    """Return the bytes of the unsigned int `value` as a varint: 7 bits by byte from the lowest
+    ones, with the high bit set in every byte but the last (LEB128).
+    """
+    if value < 0x80:
+        return SMALL_VARINTS[value]
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def unpack_varint(view, offset):
+    """Return the varint packed in `view` from `offset`, and the offset after it.
+
+    Raise IndexError if `view` ends before it.
+    """
+    byte = view[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value, shift = byte & 0x7f, 7
+    while True:
+        offset += 1
+        byte = view[offset]
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
+
+
+# Payload fields of each message type: `s` str, `I` unsigned int, `L` list of str (packed as a
+# single str, so it can't have items with `LIST_SEPARATOR`), `T` list of tasks (the amount of
+# tasks followed by the `TASK_SCHEMA` fields of each one). Ints, amounts and the lengths of the
+# str are varints
+TASK_SCHEMA = 'sIL'
+SCHEMAS = {
+    TYPE_PING: 'L',
+    TYPE_PONG: 'L',
+    TYPE_OK: '',
+    TYPE_DISCONNECT: '',
+    TYPE_HEARTBEAT: '',
+    TYPE_RESOURCES: 'Ls',
+    TYPE_TASK: TASK_SCHEMA,
+    TYPE_TASK_BATCH: 'T',
+    TYPE_ACK: 's',
+    TYPE_NACK: 's',
+    TYPE_DONE: 's',
+    TYPE_RESUME: 'L',
+}
+
+
+class FramedProtocol:
+    """Length prefixed binary protocol.
+
+    Each message is a frame with a header (the payload length as a varint and the message type
+    byte) followed by the fields of the message, packed as described by `SCHEMAS`. Short
+    messages take less bytes than in the text protocol, a single byte for each length. Frames
+    can be split or coalesced by TCP, incomplete frames are kept in a buffer until the rest of
+    the data is fed.
+    """
+    name = 'framed'
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def encode(self, kind, *fields):
+        """Return the bytes to send a message of type `kind` with `fields`."""
+        chunks = []
+        self._encode_fields(SCHEMAS[kind], fields, chunks)
+        payload = b''.join(chunks)
+        return pack_varint(len(payload)) + SMALL_VARINTS[kind] + payload
+
+    def _encode_fields(self, schema, fields, chunks):
+        for code, value in zip(schema, fields):
+            if code == 'I':
+                chunks.append(pack_varint(int(value)))
+                continue
+            if code == 'T':
+                chunks.append(pack_varint(len(value)))
+                for task in value:
+                    self._encode_fields(TASK_SCHEMA, task, chunks)
+                continue
+            if code == 'L':
+                value = LIST_SEPARATOR.join(value)
+            data = value.encode(MSG_ENCODING)
+            chunks.append(pack_varint(len(data)))
+            chunks.append(data)
+
+    def decode_fields(self, schema, view, offset):
+        """Return the `schema` fields packed in `view` from `offset`, and the offset after them."""
+        fields = []
+        for code in schema:
+            if code == 'I':
+                value, offset = unpack_varint(view, offset)
+                fields.append(value)
+                continue
+            if code == 'T':
+                count, offset = unpack_varint(view, offset)
+                tasks = []
+                for _ in range(count):
+                    task, offset = self.decode_fields(TASK_SCHEMA, view, offset)
+                    tasks.append(task)
+                fields.append(tasks)
+                continue
+            length = view[offset]
+            if length < 0x80:  # Inlined single byte varint, the usual length
+                offset += 1
+            else:
+                length, offset = unpack_varint(view, offset)
+            value = str(view[offset:offset + length], MSG_ENCODING)
+            offset += length
+            if code == 'L':
+                value = value.split(LIST_SEPARATOR) if value else []
+            fields.append(value)
+        return tuple(fields), offset
+
+    def feed(self, data):
+        """Return the list of (kind, fields) messages completed with `data`.
+
+        Frames are decoded from a memoryview of `data`, only incomplete frames are copied to
+        the inner buffer, to be completed with the next data fed.
+        """
+        if self.buffer:
+            self.buffer += data
+            data = self.buffer
+        messages = []
+        offset = 0
+        with memoryview(data) as view:
+            size = len(view)
+            while offset < size:
+                try:
+                    length, start = unpack_varint(view, offset)
+                except IndexError:
+                    break  # Incomplete length
+                end = start + 1 + length
+                if end > size:
+                    break  # Incomplete frame
+                kind = view[start]
+                if kind in SCHEMAS:
+                    fields, _ = self.decode_fields(SCHEMAS[kind], view, start + 1)
+                    messages.append((kind, fields))
+                else:
+                    logger.warning("Unknown message type: {}".format(kind))
+                offset = end
+            if data is not self.buffer and offset < size:
+                self.buffer = bytearray(view[offset:])
+        if data is self.buffer:
+            del data[:offset]
+        return messages
@@ -0,0 +1,151 @@
+import threading
+
+from simulator.matching import ResourceIndex
+from simulator.solvers import task_resources
+
+
+class ClientRegistry:
+    """Clients connected to a GroundStation server, with their resources and assigned tasks.
+
+    Handlers (from their own threads or the event loop) and dispatches change it at the same
+    time, so every change is made holding `lock`. Critical sections are short: dispatches solve
+    the assignments over a `snapshot` of the resources index without the lock, and `commit` them
+    afterwards, skipping the ones whose client left or lost the resources meanwhile. So clients
+    can join and leave while a dispatch is being solved.
+
+    Reading a client gives its info dict: 'address', and once it sent its resources 'name',
+    'resources' and 'tasks' (the list of tasks assigned to it).
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.index = ResourceIndex()  # Indicates the resources that have available each client
+        self._clients = {}  # client -> info dict
+
+    def __getitem__(self, client):
+        return self._clients[client]
+
+    def __contains__(self, client):
+        return client in self._clients
+
+    def __iter__(self):
+        """Iterate over a snapshot of the clients, so it can be changed meanwhile."""
+        with self.lock:
+            return iter(list(self._clients))
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __repr__(self):
+        with self.lock:
+            return repr(self._clients)
+
+    def get(self, client, default=None):
+        return self._clients.get(client, default)
+
+    def connect(self, client, address):
+        """Add a new `client`, without resources until it calls `register`."""
+        with self.lock:
+            self._clients[client] = {'address': address}
+
+    def register(self, client, resources, name):
+        """Set the `resources` and `name` of `client`, all of its resources available.
+
+        If it was already registered it keeps its tasks, and their resources stay allocated.
+        """
+        with self.lock:
+            self.index.add_client(client, resources)
+            info = self._clients.setdefault(client, {})
+            info.setdefault('tasks', [])
+            for task in info['tasks']:
+                self.index.allocate(client, task_resources(task))
+            info['resources'] = resources
+            info['name'] = name
+            return dict(info)
+
+    def remove(self, client):
+        """Forget `client` and its resources, return its info dict (None if it's unknown)."""
+        with self.lock:
+            info = self._clients.pop(client, None)
+            self.index.remove_client(client)
+            return info
+
+    def snapshot(self):
+        """Return a copy of the resources index, consistent with the registered clients."""
+        with self.lock:
+            return self.index.copy()
+
+    def commit(self, assignments):
+        """Assign the (task, client) `assignments` solved over a `snapshot`.
+
+        Return the list of (task, client, name) assignments made. The ones whose client isn't
+        registered anymore, or doesn't have the resources available, are skipped.
+        """
+        committed = []
+        with self.lock:
+            for task, client in assignments:
+                resources = task_resources(task)
+                if not self.index.has_available(client, resources):
+                    continue
+                self.index.allocate(client, resources)
+                info = self._clients[client]
+                info['tasks'].append(task)
+                committed.append((task, client, info['name']))
+        return committed
+
+    def release(self, client, tasks):
+        """Unassign the `tasks` (the same objects) of `client` and release their resources."""
+        with self.lock:
+            info = self._clients.get(client)
+            if info is None:
+                return
+            released = {id(task) for task in tasks}
+            info['tasks'] = [task for task in info['tasks'] if id(task) not in released]
+            for task in tasks:
+                self.index.release(client, task_resources(task))
+
+    def attach(self, client, tasks):
+        """Assign to `client` the `tasks` that it was executing before it reconnected, allocating
+        their resources, until it tells which ones it's still executing (see `keep`).
+
+        Return the list of tasks that couldn't be attached, because the client doesn't have
+        their resources available.
+        """
+        attached, missing = [], []
+        with self.lock:
+            info = self._clients[client]
+            allocated = self.index.allocate_all(client, [task_resources(task) for task in tasks])
+            for task, allocated in zip(tasks, allocated):
+                (attached if allocated else missing).append(task)
+            info['tasks'].extend(attached)
+            info['attached'] = attached
+        return missing
+
+    def keep(self, client, names):
+        """Release the attached tasks of `client` whose name isn't in `names`, and return them.
+
+        Tasks assigned since it reconnected aren't affected.
+        """
+        released = []
+        with self.lock:
+            info = self._clients.get(client, {})
+            for task in info.pop('attached', []):
+                if task.name not in names:
+                    info['tasks'].remove(task)
+                    self.index.release(client, task_resources(task))
+                    released.append(task)
+        return released
+
+    def finish(self, client, name):
+        """Remove the task `name` from the ones assigned to `client` and release its resources.
+
+        Return the task, or None if `client` hasn't a task with that name.
+        """
+        with self.lock:
+            tasks = self._clients.get(client, {}).get('tasks', [])
+            for pos, task in enumerate(tasks):
+                if task.name == name:
+                    del tasks[pos]
+                    self.index.release(client, task_resources(task))
+                    return task
+        return None
@@ -1,16 +1,25 @@
-import ast
+import heapq
+import itertools
 import logging
 import random
+import selectors
 import socket
+import threading
+import time
+from collections import deque
 
 from django.conf import settings
 
-from simulator.messages import (MSG_ENCODING, MSG_DISCONNECT, MSG_OK, MSG_PING, MSG_PONG,
-                                MSG_RESOURCES_PREFIX, MSG_SEPARATOR, MSG_TASK_PREFIX)
+from simulator.messages import (MSG_BATCH, MSG_FRAMED, MSG_HEARTBEAT, MSG_RESUME, TYPE_ACK,
+                                TYPE_DISCONNECT, TYPE_DONE, TYPE_HEARTBEAT, TYPE_NACK, TYPE_OK,
+                                TYPE_PING, TYPE_PONG, TYPE_RESOURCES, TYPE_RESUME, TYPE_TASK,
+                                TYPE_TASK_BATCH)
+from simulator import metrics, tracing
+from simulator.protocol import FramedProtocol, TextProtocol
 
 # Logger
 logger = logging.getLogger(__name__)
-logging.config.dictConfig(settings.LOGGING)
+message_log = tracing.MessageLog(logger)
 
 random.seed(42)
 
@@ -24,25 +33,67 @@ def random_dice_execution():
 
 
 class SatelliteClient:
-    def __init__(self, host, port, resources, name):
+    """Satellite that connects to a GroundStation server and executes the tasks it sends.
+
+    `run` is an event loop over a non blocking socket: a selector waits for the server messages,
+    the end of the tasks in execution, the heartbeats and the `stop` signal. If the connection is
+    lost, or the server doesn't answer the heartbeats, it connects again with exponential backoff
+    and registers its resources again.
+    """
+    # Seconds to wait the answer to a framed protocol ping, before falling back to the text one
+    handshake_timeout = 1.0
+    connect_timeout = 5.0
+    # Seconds without writing before sending a heartbeat, and without receiving anything before
+    # the connection is considered dead (only if the server accepted the heartbeats feature)
+    heartbeat_interval = 5.0
+    heartbeat_timeout = 15.0
+    # Whether to connect again when the connection is lost, and the range of seconds to wait
+    reconnect = True
+    reconnect_delay = 0.5
+    max_reconnect_delay = 30.0
+
+    def __init__(self, host, port, resources, name, framed=None, task_duration=None):
         self.name = name
         self.host = host
         self.port = port
         self.resources = resources.split(',')  # Total resources
+        self.socket = None
         self.connected = False
-        self.encoding = 'utf-8'
+        self.connections = 0  # Times that it connected to the server
+        self.features = []  # Features accepted by the server in the ping handshake
+        self.framed = settings.FRAMED_PROTOCOL if framed is None else framed
+        self.protocol = TextProtocol()
+        self.pending = deque()  # Messages received but not processed yet
+        self.outgoing = bytearray()  # Data not sent yet, while the socket isn't writable
+        self.bytes_received = self.bytes_sent = 0
+        self.messages_received = self.messages_sent = 0
+        self.last_sent = self.last_received = time.monotonic()
+        self.running = False
+        self.stopping = threading.Event()
+        self.wakeup = None  # Pair of sockets to wake up the `run` loop from `stop`
         self.available = [r for r in self.resources]  # Resources available
-        self.tasks = {}
-        if settings.DEBUG:
-            logger.setLevel(logging.DEBUG)
-            handler = logging.StreamHandler()
-            logger.addHandler(handler)
+        self.tasks = {}  # Task id (names aren't unique) -> (name, payoff, resources)
+        self.task_ids = itertools.count()
+        # Range of seconds that takes to execute a task
+        self.task_duration = task_duration or settings.TASK_DURATION
+        self.completions = []  # Heap of (finish time, task id) of the tasks in execution
+        self.peer = None  # Server address, kept to not ask for it in each message logged
+        tracing.setup_logging()
 
     def init_client(self):
-        """Init instance and connect to specified server."""
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((self.host, self.port))
-        logger.info('[{}] Connected to {}'.format(self.name, (self.host, self.port)))
+        """Init instance and connect to specified server.
+
+        Raise OSError if the server can't be reached in `connect_timeout` seconds.
+        """
+        self.socket = socket.create_connection((self.host, self.port), self.connect_timeout)
+        self.socket.settimeout(None)
+        metrics.SATELLITE_CONNECTIONS.open(self)
+        self.peer = '{}:{}'.format(*self.socket.getpeername()[:2])
+        self.protocol = TextProtocol()
+        self.pending.clear()
+        self.outgoing.clear()
+        self.features = []
+        logger.info("[%s] Connected to %s", self.name, self.peer)
         self.init_connection()
 
     def init_connection(self):
@@ -53,7 +104,12 @@ class SatelliteClient:
         """
         if self.ping():
             self.connected = True
+            self.connections += 1
+            if self.tasks and MSG_RESUME not in self.features:
+                self.abandon_tasks()  # The server doesn't know them
             self.send_resources()
+            if MSG_RESUME in self.features:
+                self.write(TYPE_RESUME, [name for name, _, _ in self.tasks.values()])
         else:
             logger.error("Can't connect to server, try again later.")
         return
@@ -62,79 +118,314 @@ class SatelliteClient:
         """Send a ping to server and check response.
 
         If response is OK return True, otherwise return False.
+        If `framed` is set, the ping offers the framed protocol (and the batch messages and the
+        heartbeats, that need it), and it's used from now on if the server accepts it. Servers
+        that don't know it won't answer, so after `handshake_timeout` seconds a plain ping is
+        sent.
         """
-        self.write(MSG_PING)
-        response = self.read()
-        return response == MSG_PONG
+        if self.framed:
+            self.write(TYPE_PING, [MSG_FRAMED, MSG_BATCH, MSG_HEARTBEAT, MSG_RESUME])
+            self.socket.settimeout(self.handshake_timeout)
+            try:
+                response = self.read()
+            except socket.timeout:
+                self.write(TYPE_PING, [])
+                response = None
+            finally:
+                self.socket.settimeout(None)
+        else:
+            self.write(TYPE_PING, [])
+            response = None
+        if response is None:
+            response = self.read()
+        if response is None or response[0] != TYPE_PONG:
+            return False
+        self.features = response[1][0]
+        if MSG_FRAMED in self.features:
+            self.protocol = FramedProtocol()
+        return True
 
     def send_resources(self):
         """Communicate self resources and name to the server."""
-        self.write("{}{}{}{}".format(
-            MSG_RESOURCES_PREFIX, ','.join(self.resources),
-            MSG_SEPARATOR, self.name))
+        self.write(TYPE_RESOURCES, self.resources, self.name)
         response = self.read()
-        if response != MSG_OK:
+        if response is None or response[0] != TYPE_OK:
             logger.error("Can't send resources to server, exiting")
         return
 
-    def write(self, message):
-        """Write to socket peer (socket server) the specified `message`."""
-        self.socket.sendall(bytes(message, self.encoding))
-        logger.info("[{}] Sent message: {} to peer: {}".format(
-            self.name, message, self.socket.getpeername()))
+    def write(self, kind, *fields):
+        """Write to socket peer (socket server) a message of type `kind` with `fields`.
 
-    def read(self, count=1024):
-        """Read and return `count` amount (max) from socket peer (server)."""
-        response = str(self.socket.recv(count), self.encoding)
-        logger.info("[{}] Received message: {} from peer: {}".format(
-            self.name, response, self.socket.getpeername()))
-        return response
+        In the `run` loop the socket is non blocking, and the data that can't be sent now is sent
+        when the socket is writable again.
+        """
+        data = self.protocol.encode(kind, *fields)
+        self.bytes_sent += len(data)
+        self.messages_sent += 1
+        self.outgoing += data
+        self.flush()
+        self.last_sent = time.monotonic()
+        if message_log.active:
+            message_log.log(tracing.SENT, self.name, self.peer, kind, fields)
+
+    def flush(self):
+        """Send as much `outgoing` data as the socket accepts."""
+        while self.outgoing:
+            try:
+                sent = self.socket.send(self.outgoing)
+            except BlockingIOError:
+                return
+            del self.outgoing[:sent]
+
+    def read(self, count=4096):
+        """Return the next (kind, fields) message from socket peer (server).
+
+        Return None if the connection was closed.
+        """
+        while not self.pending:
+            data = self.socket.recv(count)
+            if not data:
+                return None
+            self.received(data)
+        return self.pending.popleft()
+
+    @property
+    def feedback(self):
+        """Whether the server is told about the tasks execution (it needs the framed protocol)."""
+        return isinstance(self.protocol, FramedProtocol)
 
     def wait_for_command(self):
-        """Wait until receives a new message from peer and process it as a command."""
-        message = self.read()
-        self.process_message(message)
+        """Wait until receives a new message from peer and process it as a command.
 
-    def process_message(self, message):
+        Tasks are finished while waiting, when their execution time is over.
+        """
+        self.finish_tasks()
+        if self.completions:
+            self.socket.settimeout(max(0, self.completions[0][0] - time.monotonic()))
+        try:
+            message = self.read()
+        except socket.timeout:
+            self.finish_tasks()
+            return
+        finally:
+            self.socket.settimeout(None)
+        if message is None:
+            logger.error("[{}] Connection closed by the server".format(self.name))
+            self.connected = False
+            return
+        self.process_message(*message)
+
+    def process_message(self, kind, fields):
         """Process incoming message from peer, and call the proper action."""
-        if MSG_TASK_PREFIX in message:
-            task_message = message.split(MSG_TASK_PREFIX)[1]
-            task_name, task_payoff, task_resources = task_message.split(MSG_SEPARATOR)
-            try:
-                task_resources = [str(x) for x in ast.literal_eval(task_resources)]
-            except TypeError:
-                # task_resources is only one resource, so use as is
-                task_resources = [task_resources]
-            if random_dice_execution():
-                self.execute_task(task_name, task_payoff, task_resources)
-            else:
-                logger.error("Couldn't execute task %s, unrecognized error" % task_name)
-                # TODO: Notice the server that the task couldn't be executed
+        if kind == TYPE_TASK:
+            self.process_task(*fields)
+        elif kind == TYPE_TASK_BATCH:
+            for task in fields[0]:
+                self.process_task(*task)
         return
 
+    def process_task(self, task_name, task_payoff, task_resources):
+        """Try to execute a task received from the server."""
+        if not all(res in self.available for res in task_resources):
+            logger.error("[{}] Resources of task {} aren't available".format(
+                self.name, task_name))
+            if self.feedback:
+                self.write(TYPE_NACK, task_name)
+        elif random_dice_execution():
+            self.execute_task(task_name, task_payoff, task_resources)
+            if self.feedback:
+                self.write(TYPE_ACK, task_name)
+        else:
+            logger.error("Couldn't execute task %s, unrecognized error", task_name)
+            if self.feedback:
+                self.write(TYPE_NACK, task_name)
+
     def execute_task(self, name, payoff, resources):
         """Simulates that the satellite will execute the addressed task.
 
         This function also 'saves' the required resources, by removing from inner list of
-        available resources.
+        available resources, until the task is finished after a random time in `task_duration`.
         """
-        self.tasks[name] = (payoff, resources)
+        task_id = next(self.task_ids)
+        self.tasks[task_id] = (name, payoff, resources)
         for res in resources:
             self.available.remove(res)
-        # TODO: Notice server with available resources
-        logger.debug("[{}] Executing task '{}' with payoff '{}'".format(self.name, name, payoff))
-        logger.debug("[{}] Available resources: {}".format(self.name, self.available))
+        heapq.heappush(self.completions, (time.monotonic() + random.uniform(*self.task_duration),
+                                          task_id))
+        logger.debug("[%s] Executing task '%s' with payoff '%s'", self.name, name, payoff)
+        logger.debug("[%s] Available resources: %s", self.name, self.available)
+
+    def finish_tasks(self):
+        """Finish the tasks whose execution time is over, and notice the server."""
+        now = time.monotonic()
+        while self.completions and self.completions[0][0] <= now:
+            _, task_id = heapq.heappop(self.completions)
+            name, _, resources = self.tasks.pop(task_id)
+            self.available.extend(resources)
+            if self.feedback:
+                self.write(TYPE_DONE, name)
+            logger.debug("[%s] Finished task '%s'", self.name, name)
 
     def run(self):
-        if not self.connected:
-            self.init_client()
+        """Process the messages of the server until `stop` is called.
+
+        If the client can't connect, or the connection is lost, it connects again (if `reconnect`
+        is set) after a delay that doubles with each failed attempt. The tasks in execution are
+        kept meanwhile, and resumed if the server accepts `MSG_RESUME` (it keeps the tasks of
+        disconnected clients for a while, even if it's restarted with `settings.STATE_DIR`).
+        Otherwise they're abandoned, since the server doesn't know them.
+        """
+        self.wakeup = socket.socketpair()
+        self.running = True
+        attempts = 0
         try:
-            while self.connected:
-                self.wait_for_command()
+            while not self.stopping.is_set():
+                if not self.connected:
+                    try:
+                        self.init_client()
+                    except OSError as err:
+                        logger.error("[{}] Can't connect to {}: {}".format(
+                            self.name, (self.host, self.port), err))
+                        self.close(abandon=False)
+                    if not self.connected:
+                        if not self.reconnect:
+                            break
+                        self.stopping.wait(self.backoff(attempts))
+                        attempts += 1
+                        continue
+                    attempts = 0
+                try:
+                    self.serve()
+                except OSError as err:
+                    logger.error("[{}] Connection lost: {}".format(self.name, err))
+                self.close(abandon=False)
+                if not self.reconnect:
+                    break
         except KeyboardInterrupt:
             print('caught keyboard interrupt, exiting')
+        finally:
+            self.running = False
+            self.close()
+            for sock in self.wakeup:
+                sock.close()
+
+    def backoff(self, attempt):
+        """Return the seconds to wait before the connection `attempt`, with some jitter."""
+        delay = min(self.max_reconnect_delay, self.reconnect_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def serve(self):
+        """Event loop of a connection, until it's closed or `stop` is called.
+
+        Raise OSError (ConnectionError if the server stopped answering the heartbeats) if the
+        connection is lost.
+        """
+        while self.pending:  # Received along with the handshake answers
+            self.process_message(*self.pending.popleft())
+        self.socket.setblocking(False)
+        self.last_received = time.monotonic()
+        writing = False
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.socket, selectors.EVENT_READ)
+            selector.register(self.wakeup[0], selectors.EVENT_READ)
+            while self.connected and not self.stopping.is_set():
+                self.finish_tasks()
+                self.heartbeat()
+                if writing != bool(self.outgoing):
+                    writing = bool(self.outgoing)
+                    selector.modify(self.socket, selectors.EVENT_READ | (
+                        selectors.EVENT_WRITE if writing else 0))
+                for key, mask in selector.select(self.next_timeout()):
+                    if key.fileobj is self.wakeup[0]:
+                        self.wakeup[0].recv(64)
+                        continue
+                    if mask & selectors.EVENT_WRITE:
+                        self.flush()
+                    if mask & selectors.EVENT_READ:
+                        self.receive()
+        if self.connected and self.stopping.is_set():
+            self.socket.settimeout(self.handshake_timeout)
+            self.write(TYPE_DISCONNECT)
+
+    def receive(self):
+        """Process the messages that can be read from the socket without blocking."""
+        try:
+            data = self.socket.recv(65536)
+        except BlockingIOError:
+            return
+        if not data:
+            logger.error("[{}] Connection closed by the server".format(self.name))
+            self.connected = False
+            return
+        self.last_received = time.monotonic()
+        self.received(data)
+        while self.pending:
+            self.process_message(*self.pending.popleft())
+
+    def received(self, data):
+        """Queue the messages in `data` to be processed."""
+        messages = self.protocol.feed(data)
+        self.bytes_received += len(data)
+        self.messages_received += len(messages)
+        if message_log.active:
+            for kind, fields in messages:
+                message_log.log(tracing.RECEIVED, self.name, self.peer, kind, fields)
+        self.pending.extend(messages)
+
+    def heartbeat(self):
+        """Send a heartbeat if the client has been idle, and check that the server answers."""
+        if MSG_HEARTBEAT not in self.features:
+            return
+        now = time.monotonic()
+        if now - self.last_received > self.heartbeat_timeout:
+            raise ConnectionError("No answer from the server in {}s".format(
+                self.heartbeat_timeout))
+        if now - self.last_sent >= self.heartbeat_interval:
+            self.write(TYPE_HEARTBEAT)
+
+    def next_timeout(self):
+        """Return the seconds until the next task finishes or heartbeat is due, None to wait."""
+        deadlines = []
+        if self.completions:
+            deadlines.append(self.completions[0][0])
+        if MSG_HEARTBEAT in self.features:
+            deadlines.append(self.last_sent + self.heartbeat_interval)
+            deadlines.append(self.last_received + self.heartbeat_timeout)
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - time.monotonic())
+
+    def close(self, abandon=True):
+        """Close the connection, abandoning the tasks in execution unless `abandon` is False."""
+        self.connected = False
+        if self.socket is not None:
+            self.socket.close()
+        metrics.SATELLITE_CONNECTIONS.close(self)
+        if abandon:
+            self.abandon_tasks()
+
+    def abandon_tasks(self):
+        """Forget the tasks in execution, all the resources are available again."""
+        if self.tasks:
+            logger.warning("[{}] Abandoned {} tasks in execution".format(
+                self.name, len(self.tasks)))
+        self.tasks = {}
+        self.completions = []
+        self.available = [r for r in self.resources]
 
     def stop(self):
-        """Stop and close current socket. Clean used resources."""
-        self.write(MSG_DISCONNECT)
-        self.socket.close()
+        """Stop and close current socket. Clean used resources.
+
+        If `run` is in progress, it's signaled to say goodbye to the server and close the
+        connection, so the socket isn't used from two threads at once.
+        """
+        if self.running:
+            self.stopping.set()
+            try:
+                self.wakeup[1].send(b'\0')
+            except OSError:
+                pass  # `run` already finished
+            return
+        if self.connected:
+            self.write(TYPE_DISCONNECT)
+            self.close()
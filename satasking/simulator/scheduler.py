@@ -0,0 +1,223 @@
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from simulator.solvers import payoff_density, task_resources
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class Samples:
+    """Keep the last `size` values of a measure, to report its percentiles."""
+
+    def __init__(self, size=1024):
+        self.values = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct):
+        if not self.values:
+            return 0.0
+        values = sorted(self.values)
+        return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+    def summary(self):
+        """Return a dict with the amount of values, the mean and percentiles of the last ones."""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': max(self.values, default=0.0),
+        }
+
+
+class DispatchScheduler:
+    """Queue of tasks waiting to be dispatched, as soon as some client can execute them.
+
+    Tasks are kept by payoff density (payoff per required resource), with an inverted index
+    from each resource to the queued tasks that require it. A dispatch round is triggered when
+    tasks arrive (`submit`) and when clients have new resources available (`trigger`), and it
+    only evaluates the tasks that could be assigned since the last time they were evaluated:
+    the new ones and the ones that require some of the new resources, in density order. So the
+    cost of a round is proportional to the change, not to the amount of queued tasks. Tasks
+    that can't be assigned stay queued until some of their resources are available again.
+    With a `window` of 0 seconds each round runs in the thread that triggered it. Otherwise a
+    background thread waits `window` seconds since the first trigger, so all the tasks and
+    resources of that period are solved together: it trades latency for better assignments and
+    less rounds.
+    The assignments of each round are given to `on_dispatch`, if it's set (e.g. to save them).
+    """
+
+    def __init__(self, server, window=0.0, solver=None, samples=1024, on_dispatch=None):
+        self.server = server
+        self.window = window
+        self.solver = solver  # Solver of each round, `settings.DISPATCH_SOLVER` if it's None
+        self.on_dispatch = on_dispatch  # Called with the (task, satellite) pairs of each round
+        # Queued tasks, by arrival order: (-payoff density, arrival order, arrival time, task)
+        self.queue = {}
+        self.waiting = defaultdict(set)  # resource -> arrival order of the tasks requiring it
+        self.affected = set()  # Arrival order of the tasks to evaluate in the next round
+        self.in_round = set()  # Arrival order of the tasks being evaluated
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.triggered = False
+        self.stopped = False
+        self.thread = None
+        # Amount of tasks submitted, dispatched and evaluated by the rounds, and of rounds
+        self.counters = Counter()
+        self.wait_times = Samples(samples)  # Seconds since arrival until dispatch, by task
+        self.dispatch_latencies = Samples(samples)  # Seconds spent by round
+
+    def __len__(self):
+        return len(self.queue)
+
+    @property
+    def tasks(self):
+        """Return the queued tasks, in dispatch order."""
+        with self.condition:
+            return [entry[3] for entry in sorted(self.queue.values())]
+
+    def submit(self, tasks, released=()):
+        """Queue `tasks` and trigger a dispatch round for them.
+
+        `released` are the resources made available along with them (e.g. by a failed task), so
+        the tasks waiting for those are evaluated too.
+        """
+        now = time.monotonic()
+        with self.condition:
+            for task in tasks:
+                order = next(self.order)
+                self.queue[order] = (-payoff_density(task), order, now, task)
+                for res in task_resources(task):
+                    self.waiting[res].add(order)
+                self.affected.add(order)
+            self._affect(released)
+            self.counters['submitted'] += len(tasks)
+        self._wake()
+
+    def trigger(self, resources=None):
+        """Dispatch now, or at the end of the current window, the queued tasks that require
+        some of `resources` (the resources that have been made available), all of them if it's
+        None.
+        """
+        with self.condition:
+            if resources is None:
+                self.affected.update(self.queue)
+            else:
+                self._affect(resources)
+        self._wake()
+
+    def _affect(self, resources):
+        for res in resources:
+            self.affected.update(self.waiting.get(res, ()))
+
+    def _wake(self):
+        if not self.window:
+            self.dispatch()
+            return
+        with self.condition:
+            if self.stopped:
+                return
+            self.triggered = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        """Dispatch rounds until `stop` is called, `window` seconds after each trigger."""
+        while True:
+            with self.condition:
+                while not self.triggered and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+            time.sleep(self.window)
+            with self.condition:
+                self.triggered = False
+            self.dispatch()
+
+    def stop(self):
+        """Stop the background thread, queued tasks are kept."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def dispatch(self):
+        """Run dispatch rounds with the affected tasks, and return the assignments.
+
+        Tasks being evaluated by a round of other thread are left for the next round, which
+        this thread runs after the current one.
+        """
+        assignments = []
+        while True:
+            with self.condition:
+                orders = self.affected - self.in_round
+                if not orders:
+                    return assignments
+                self.affected -= orders
+                self.in_round |= orders
+                entries = sorted(self.queue[order] for order in orders if order in self.queue)
+            try:
+                assignments.extend(self._round(entries))
+            finally:
+                with self.condition:
+                    self.in_round -= orders
+
+    def _round(self, entries):
+        if not entries:
+            return []
+        start = time.monotonic()
+        assignments, _ = self.server._dispatch([entry[3] for entry in entries], self.solver)
+        end = time.monotonic()
+        assigned = {id(task) for task, _ in assignments}
+        with self.condition:
+            for entry in entries:
+                task = entry[3]
+                if id(task) in assigned:
+                    self.wait_times.add(end - entry[2])
+                    del self.queue[entry[1]]
+                    for res in task_resources(task):
+                        waiting = self.waiting[res]
+                        waiting.discard(entry[1])
+                        if not waiting:
+                            del self.waiting[res]
+            self.dispatch_latencies.add(end - start)
+            self.counters['rounds'] += 1
+            self.counters['dispatched'] += len(assignments)
+            self.counters['evaluated'] += len(entries)
+        logger.debug("Dispatch round of %d tasks: %d dispatched in %.3fs",
+                     len(entries), len(assignments), end - start)
+        if assignments and self.on_dispatch is not None:
+            try:
+                self.on_dispatch(assignments)
+            except Exception:
+                # The tasks are already sent, the round goes on
+                logger.exception("Couldn't handle the %d assignments of a dispatch round",
+                                 len(assignments))
+        return assignments
+
+    def metrics(self):
+        """Return a dict with the queue depth, the counters and the wait and dispatch times."""
+        with self.condition:
+            return {
+                'queue_depth': len(self.queue),
+                'submitted': self.counters['submitted'],
+                'dispatched': self.counters['dispatched'],
+                'evaluated': self.counters['evaluated'],
+                'rounds': self.counters['rounds'],
+                'wait_time': self.wait_times.summary(),
+                'dispatch_latency': self.dispatch_latencies.summary(),
+            }
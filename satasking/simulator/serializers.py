@@ -1,6 +1,10 @@
+import json
+
 from rest_framework import serializers
 
-from simulator.models import Satellite, Task, TaskExecution
+from simulator.filters import TaskFilter
+from simulator.models import DispatchJob, Satellite, Task, TaskExecution
+from simulator.solvers import SOLVERS
 
 
 class SatelliteSerializer(serializers.ModelSerializer):
@@ -23,3 +27,67 @@ class TaskExecutionSerializer(serializers.ModelSerializer):
     class Meta:
         model = TaskExecution
         fields = ('task', 'satellite', 'date_time')
+
+
+class SatelliteHourSerializer(serializers.Serializer):
+    hour = serializers.DateTimeField(format='iso-8601')
+    satellite = serializers.CharField(source='satellite__name')
+    executions = serializers.IntegerField()
+    payoff = serializers.IntegerField()
+
+
+class UtilizationSerializer(serializers.Serializer):
+    hour = serializers.DateTimeField(format='iso-8601')
+    executions = serializers.IntegerField()
+    payoff = serializers.IntegerField()
+    resources = serializers.IntegerField()
+    utilization = serializers.FloatField()
+
+
+class IdsField(serializers.Field):
+    """Non-empty list of ids, checked at once instead of by a field for each one."""
+    default_error_messages = {'invalid': "Expected a non-empty list of positive integer ids."}
+
+    def to_internal_value(self, data):
+        if not (isinstance(data, list) and data and
+                all(type(pk) is int and pk > 0 for pk in data)):
+            self.fail('invalid')
+        return data
+
+    def to_representation(self, value):
+        return value
+
+
+class DispatchJobSerializer(serializers.ModelSerializer):
+    """A dispatch job, created with either the `tasks` ids or a `filter` of `TaskFilter`."""
+    url = serializers.HyperlinkedIdentityField(view_name='dispatch-detail')
+    tasks = IdsField(required=False, write_only=True)
+    filter = serializers.DictField(child=serializers.CharField(), required=False,
+                                   write_only=True)
+    solver = serializers.ChoiceField(choices=sorted(SOLVERS), required=False)
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DispatchJob
+        fields = ('id', 'url', 'status', 'tasks', 'filter', 'solver', 'total', 'processed',
+                  'progress', 'dispatched', 'payoff', 'error', 'created', 'started', 'finished')
+        read_only_fields = ('status', 'total', 'processed', 'dispatched', 'payoff', 'error',
+                            'created', 'started', 'finished')
+
+    def validate(self, data):
+        if ('tasks' in data) == ('filter' in data):
+            raise serializers.ValidationError("Give either the `tasks` ids or a `filter`.")
+        if 'filter' in data:
+            unknown = set(data['filter']) - set(TaskFilter.Meta.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {'filter': "Unknown filters: {}".format(', '.join(sorted(unknown)))})
+            filterset = TaskFilter(data['filter'], Task.objects.none())
+            if not filterset.is_valid():
+                raise serializers.ValidationError({'filter': filterset.errors})
+        return data
+
+    def create(self, validated_data):
+        query = {key: validated_data[key] for key in ('tasks', 'filter') if key in validated_data}
+        return DispatchJob.objects.create(query=json.dumps(query),
+                                          solver=validated_data.get('solver', ''))
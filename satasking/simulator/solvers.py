@@ -0,0 +1,398 @@
+import logging
+import time
+from collections import namedtuple
+from itertools import islice, repeat
+from operator import attrgetter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# `assignments` is a list of (task, client) pairs, in the order they should be delivered
+SolverResult = namedtuple('SolverResult', ['solver', 'assignments', 'total_payoff', 'elapsed'])
+
+
+def task_resources(task):
+    """Return the list of resources required by `task`."""
+    return task.resources.split(',')
+
+
+def payoff_density(task):
+    """Return the payoff of `task` by required resource."""
+    return float(task.payoff) / len(task_resources(task))
+
+
+def bit_count(mask):
+    return bin(mask).count('1')
+
+
+class Solver:
+    """Base class for the algorithms that choose which client executes each task.
+
+    Subclasses must implement `assign`, that receives a scratch copy of the server
+    `ResourceIndex` (so it can be freely modified) and returns the list of (task, client)
+    assignments.
+    """
+    name = None
+
+    def solve(self, tasks, index):
+        """Return a `SolverResult` for `tasks` with the clients available in `index`.
+
+        `index` isn't modified, the server is in charge of commiting the assignments.
+        """
+        start = time.perf_counter()
+        assignments = self.assign(tasks, index.copy())
+        elapsed = time.perf_counter() - start
+        total_payoff = sum(task.payoff for task, _ in assignments)
+        return SolverResult(self.name, assignments, total_payoff, elapsed)
+
+    def assign(self, tasks, index):
+        raise NotImplementedError
+
+
+class GreedySolver(Solver):
+    """The original greedy choice.
+
+    Tasks are sorted by `payoff / len(resources)` (where `resources` is the comma separated
+    string) and each one is assigned to the first registered client with its resources available.
+    """
+    name = 'greedy'
+
+    def assign(self, tasks, index):
+        assignments = []
+        payoff_by_resources = [
+            # Keep idx of task in original list
+            (idx, float(t.payoff) / len(t.resources)) for idx, t in enumerate(tasks)
+        ]
+        payoff_by_resources.sort(key=lambda x: x[1], reverse=True)
+        for idx, _ in payoff_by_resources:
+            resources = task_resources(tasks[idx])
+            candidate = index.first_candidate(resources)
+            if candidate is not None:
+                index.allocate(candidate, resources)
+                assignments.append((tasks[idx], candidate))
+        return assignments
+
+
+class DensityGreedySolver(Solver):
+    """Greedy choice by payoff per required resource, with a best fit choice of client.
+
+    Among the clients that can execute a task it chooses the one with less resources available,
+    keeping the clients with more resources free for the following tasks. Only the first
+    `max_candidates` clients are compared to keep the cost bounded with big constellations.
+    """
+    name = 'density'
+
+    def __init__(self, max_candidates=64):
+        self.max_candidates = max_candidates
+
+    def best_fit(self, resources, index):
+        candidates = islice(index.iter_candidates(resources), self.max_candidates)
+        return min(candidates, key=lambda c: bit_count(index.available[c]), default=None)
+
+    def assign(self, tasks, index):
+        assignments = []
+        for task in sorted(tasks, key=payoff_density, reverse=True):
+            resources = task_resources(task)
+            candidate = self.best_fit(resources, index)
+            if candidate is not None:
+                index.allocate(candidate, resources)
+                assignments.append((task, candidate))
+        return assignments
+
+
+class BranchAndBoundSolver(Solver):
+    """Exact search of the assignment with maximum payoff, for small batches.
+
+    Explores assigning each task (in density order) to each candidate client or leaving it
+    unassigned, pruning the branches that can't beat the best payoff found even if all the
+    remaining tasks were assigned. Clients with the same resources available are interchangeable,
+    so only one of them is tried.
+    Only the best `max_tasks` tasks are searched, the rest of the batch is assigned with
+    `DensityGreedySolver` on the resources left. If `time_limit` seconds pass, the best
+    assignment found so far is used.
+    """
+    name = 'exact'
+
+    def __init__(self, max_tasks=20, time_limit=2.0):
+        self.max_tasks = max_tasks
+        self.time_limit = time_limit
+
+    def assign(self, tasks, index):
+        deadline = time.perf_counter() + self.time_limit
+        tasks = sorted(tasks, key=payoff_density, reverse=True)
+        batch, rest = tasks[:self.max_tasks], tasks[self.max_tasks:]
+        # Tasks that no client can execute now will never be assigned
+        batch = [(task, index.resource_mask(task_resources(task)), task_resources(task))
+                 for task in batch]
+        batch = [(task, mask, list(index.iter_candidates(resources)))
+                 for task, mask, resources in batch if mask is not None]
+        batch = [item for item in batch if item[2]]
+        available = {c: index.available[c] for _, _, candidates in batch for c in candidates}
+        remaining = [0] * (len(batch) + 1)  # Payoff of the tasks from a position to the end
+        for pos in range(len(batch) - 1, -1, -1):
+            remaining[pos] = remaining[pos + 1] + batch[pos][0].payoff
+
+        best = {'payoff': -1, 'chosen': []}
+        chosen = []
+        search_state = {'nodes': 0, 'stopped': False}
+
+        def search(pos, payoff):
+            search_state['nodes'] += 1
+            if search_state['nodes'] % 1024 == 0 and time.perf_counter() > deadline:
+                search_state['stopped'] = True
+            if payoff + remaining[pos] <= best['payoff']:
+                return
+            if pos == len(batch) or search_state['stopped']:
+                if payoff > best['payoff']:
+                    best['payoff'], best['chosen'] = payoff, list(chosen)
+                return
+            task, mask, candidates = batch[pos]
+            tried = set()
+            for client in candidates:
+                free = available[client]
+                if free & mask != mask or free in tried:
+                    continue
+                tried.add(free)
+                available[client] = free & ~mask
+                chosen.append((pos, client))
+                search(pos + 1, payoff + task.payoff)
+                chosen.pop()
+                available[client] = free
+            search(pos + 1, payoff)
+
+        search(0, 0)
+        assignments = []
+        for pos, client in best['chosen']:
+            task = batch[pos][0]
+            index.allocate(client, task_resources(task))
+            assignments.append((task, client))
+        if search_state['stopped']:
+            logger.warning("Branch and bound search stopped after {} nodes"
+                           .format(search_state['nodes']))
+        return assignments + DensityGreedySolver().assign(rest, index)
+
+
+class LocalSearchSolver(Solver):
+    """Improve a `DensityGreedySolver` assignment with swaps until `time_limit` seconds pass.
+
+    For each unassigned task it looks for a client where the already assigned tasks that
+    compete for its resources have less total payoff, swaps them and tries to move the evicted
+    tasks to other clients. Passes over the unassigned tasks are repeated while they improve
+    the total payoff.
+    """
+    name = 'local'
+
+    def __init__(self, time_limit=1.0, max_candidates=64):
+        self.time_limit = time_limit
+        self.max_candidates = max_candidates
+
+    def assign(self, tasks, index):
+        deadline = time.perf_counter() + self.time_limit
+        start = index.copy()  # Resources available before the batch
+        tasks = sorted(tasks, key=payoff_density, reverse=True)
+        position = {id(task): pos for pos, task in enumerate(tasks)}
+        resources = [task_resources(task) for task in tasks]
+        masks = [index.resource_mask(res) for res in resources]
+
+        assigned = {}  # task position -> client
+        by_client = {}  # client -> set of task positions
+        for task, client in DensityGreedySolver(self.max_candidates).assign(tasks, index):
+            pos = position[id(task)]
+            assigned[pos] = client
+            by_client.setdefault(client, set()).add(pos)
+
+        def place(pos, client):
+            index.allocate(client, resources[pos])
+            assigned[pos] = client
+            by_client.setdefault(client, set()).add(pos)
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for pos in range(len(tasks)):
+                if pos in assigned or masks[pos] is None:
+                    continue
+                if time.perf_counter() > deadline:
+                    break
+                best = None
+                for client in islice(start.iter_candidates(resources[pos]), self.max_candidates):
+                    evicted = [q for q in by_client.get(client, ()) if masks[q] & masks[pos]]
+                    loss = sum(tasks[q].payoff for q in evicted)
+                    if loss < tasks[pos].payoff and (best is None or loss < best[0]):
+                        best = (loss, client, evicted)
+                if best is None:
+                    continue
+                _, client, evicted = best
+                for q in evicted:
+                    index.release(client, resources[q])
+                    by_client[client].remove(q)
+                    del assigned[q]
+                place(pos, client)
+                for q in evicted:
+                    candidate = index.first_candidate(resources[q])
+                    if candidate is not None:
+                        place(q, candidate)
+                improved = True
+        return [(tasks[pos], assigned[pos]) for pos in sorted(assigned)]
+
+
+class VectorGreedySolver(Solver):
+    """The original greedy choice, with NumPy array operations instead of a loop over the tasks.
+
+    The task batch is loaded as a task x resource incidence matrix (the resource slots of each
+    task, padded to the same width) and the availability as a resource x client matrix of bits,
+    64 clients by word, like `ResourceIndex.clients_by_resource`. The candidates of a block of
+    tasks are the AND of the rows of their resources, and the first candidate the lowest bit set.
+
+    The assignments are the same as `GreedySolver`. In each block, a task whose candidate gets
+    one of its resources from an earlier task of the block is held back, and so are the later
+    tasks whose choice it may change. They're solved again in the next block, the rest of the
+    block doesn't depend on them. Tasks without candidates are dropped at once, since resources
+    are only taken until the end of the batch. Only available if `numpy` is installed.
+    """
+    name = 'vector'
+
+    def __init__(self, block_size=512, window=4):
+        self.block_size = block_size
+        self.window = window
+
+    def first_candidates(self, words, rows, first_word):
+        """Return the lowest client slot with the resources of each of `rows` available, or -1 if
+        there's none, looking in windows of words from `first_word` that grow until one is found.
+        """
+        slots = numpy.full(len(rows), -1, dtype=numpy.int64)
+        pending = numpy.arange(len(rows))
+        n_words = words.shape[1] // 2
+        width = min(self.window, n_words)
+        while len(pending):
+            columns = first_word[pending, None] + numpy.arange(width)
+            candidates = words[rows[pending, :1], columns]
+            for column in range(1, rows.shape[1]):
+                candidates &= words[rows[pending, column:column + 1], columns]
+            word = (candidates != 0).argmax(axis=1)
+            bits = candidates[numpy.arange(len(pending)), word]
+            lowest = bits & (~bits + numpy.uint64(1))  # Powers of two, exact as floats
+            found = bits != 0
+            slots[pending[found]] = ((first_word[pending] + word) * 64
+                                     + numpy.frexp(lowest.astype(numpy.float64))[1] - 1)[found]
+            first_word[pending] += width
+            pending = pending[~found & (first_word[pending] < n_words)]
+            width = min(width * 2, n_words)
+        return slots
+
+    def assign(self, tasks, index):
+        if not tasks or not index.all_clients:
+            return []
+        n_resources = len(index.clients_by_resource)
+        n_words = (len(index.slot_clients) + 63) // 64
+        # Rows for the resources that nobody has (no clients) and for padding (every client),
+        # and as many empty words after the last client, for the windows that go past it
+        missing, padding = n_resources, n_resources + 1
+        words = numpy.zeros((n_resources + 2, n_words * 2), dtype=numpy.uint64)
+        for slot, clients in enumerate(index.clients_by_resource):
+            words[slot, :n_words] = numpy.frombuffer(clients.to_bytes(n_words * 8, 'little'),
+                                                     dtype='<u8')
+        words[padding] = ~numpy.uint64(0)
+
+        # Every resource id of the batch at once, the slot of each one and its task
+        required = list(map(attrgetter('resources'), tasks))
+        lengths = numpy.fromiter(map(str.count, required, repeat(',')), dtype=numpy.int64,
+                                 count=len(tasks)) + 1
+        ids = ','.join(required).split(',')
+        entries = numpy.fromiter(map(index.resource_slots.get, ids, repeat(missing)),
+                                 dtype=numpy.int64, count=len(ids))
+        entry_tasks = numpy.repeat(numpy.arange(len(tasks)), lengths)
+        # A resource repeated in a task is only taken once
+        by_task = numpy.lexsort((entries, entry_tasks))
+        repeated = ((entry_tasks[by_task][1:] == entry_tasks[by_task][:-1])
+                    & (entries[by_task][1:] == entries[by_task][:-1]))
+        entries[by_task[1:][repeated]] = padding
+        incidence = numpy.full((len(tasks), int(lengths.max())), padding, dtype=numpy.int64)
+        incidence[entry_tasks, numpy.arange(len(ids)) - numpy.repeat(
+            numpy.cumsum(lengths) - lengths, lengths)] = entries
+        density = (numpy.fromiter(map(attrgetter('payoff'), tasks), dtype=numpy.float64,
+                                  count=len(tasks))
+                   / numpy.fromiter(map(len, required), dtype=numpy.float64, count=len(tasks)))
+        order = numpy.argsort(-density, kind='stable')
+
+        assigned, chosen_slots = [], []  # Positions in `order` and client slots, by block
+        held = order[:0]
+        lower_bound = numpy.zeros(len(tasks), dtype=numpy.int64)  # First word to look at
+        pos = 0
+        while pos < len(order) or len(held):
+            block = numpy.concatenate([held, order[pos:pos + self.block_size - len(held)]])
+            pos += len(block) - len(held)
+            rows = incidence[block]
+            # Candidates can't be before the first word with clients of any of the resources,
+            # nor before the one found for a task held back
+            nonempty = words[:, :n_words] != 0
+            first_word = numpy.where(nonempty.any(axis=1), nonempty.argmax(axis=1), n_words)
+            chosen = self.first_candidates(words, rows, numpy.maximum(
+                first_word[rows].max(axis=1), lower_bound[block]))
+            feasible = chosen >= 0
+            block, rows, chosen = block[feasible], rows[feasible], chosen[feasible]
+
+            # (block position, resource) of every resource to take
+            owners, columns = numpy.nonzero(rows != padding)
+            resources = rows[owners, columns]
+            keys = chosen[owners] * (n_resources + 1) + resources
+            _, first = numpy.unique(keys, return_index=True)
+            conflicts = numpy.ones(len(keys), dtype=bool)
+            conflicts[first] = False
+            held_back = numpy.zeros(len(block), dtype=bool)
+            held_back[owners[conflicts]] = True
+            # A held back task ends in its candidate or a later one, so it can only change the
+            # choice of the later tasks that share a resource and have the same or a later one.
+            # Entries sorted by resource and position, each segment shifted below the previous
+            # ones, so a running minimum gives the first held back candidate of the resource.
+            by_resource = numpy.lexsort((owners, resources))
+            shift = resources[by_resource] * (len(index.slot_clients) + 1)
+            limit = chosen[owners[by_resource]] - shift
+            while True:
+                earliest = numpy.where(held_back[owners[by_resource]], limit,
+                                       len(index.slot_clients) - shift)
+                numpy.minimum.accumulate(earliest, out=earliest)
+                tainted = owners[by_resource][earliest <= limit]
+                if held_back[tainted].all():
+                    break
+                held_back[tainted] = True
+
+            take = ~held_back[owners]
+            clients = chosen[owners[take]]
+            numpy.bitwise_and.at(words, (resources[take], clients // 64),
+                                 ~(numpy.uint64(1) << (clients % 64).astype(numpy.uint64)))
+            assigned.append(block[~held_back])
+            chosen_slots.append(chosen[~held_back])
+            held = block[held_back]
+            lower_bound[held] = chosen[held_back] // 64
+
+        rank = numpy.empty(len(order), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        assigned, chosen_slots = numpy.concatenate(assigned), numpy.concatenate(chosen_slots)
+        in_order = numpy.argsort(rank[assigned])
+        return list(zip(map(tasks.__getitem__, assigned[in_order].tolist()),
+                        map(index.slot_clients.__getitem__, chosen_slots[in_order].tolist())))
+
+
+SOLVERS = {
+    solver.name: solver
+    for solver in (GreedySolver, DensityGreedySolver, BranchAndBoundSolver, LocalSearchSolver)
+}
+if numpy is not None:
+    SOLVERS[VectorGreedySolver.name] = VectorGreedySolver
+
+
+def get_solver(solver):
+    """Return a `Solver` instance from a solver name, or `solver` itself if it's already one."""
+    if isinstance(solver, Solver):
+        return solver
+    try:
+        return SOLVERS[solver]()
+    except KeyError:
+        raise ValueError("Unknown solver '{}', choose one of: {}".format(
+            solver, ', '.join(sorted(SOLVERS))))
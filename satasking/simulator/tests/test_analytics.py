@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+
+from simulator import analytics
+from simulator.models import GroundStation, Satellite, SatelliteHour, Task, TaskExecution
+
+
+class AnalyticsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gs = GroundStation.objects.create()
+        self.satellites = [Satellite.objects.create(resources="1,2,3", name="s%d" % i)
+                           for i in range(2)]
+        self.tasks = [Task.objects.create(name="t%d" % i, payoff=i + 1,
+                                          resources=["1", "1,2", "1,2,3"][i % 3])
+                      for i in range(6)]
+
+    def tearDown(self):
+        settings.SERVER = None
+
+    def dispatch(self, tasks):
+        settings.SERVER = MagicMock()
+        settings.SERVER.dispatch_assignments.return_value = [
+            (task, self.satellites[i % 2].name) for i, task in enumerate(tasks)]
+        return self.gs.dispatch_tasks(tasks)
+
+    def assert_rollups_match_executions(self):
+        rollups = list(SatelliteHour.objects.order_by('hour', 'satellite').values(
+            'satellite', 'hour', 'executions', 'payoff', 'resources'))
+        self.assertListEqual(
+            rollups, list(analytics.scan_satellite_hours(TaskExecution.objects.all())))
+        self.assertListEqual(list(analytics.payoff_by_hour(SatelliteHour.objects.all())),
+                             list(analytics.scan_payoff_by_hour(TaskExecution.objects.all())))
+        self.assertListEqual(list(analytics.utilization(SatelliteHour.objects.all())),
+                             list(analytics.scan_utilization(TaskExecution.objects.all())))
+
+    def test_rollups_are_updated_incrementally(self):
+        """Check that the rollups are updated as dispatches and single executions are saved, and
+        that they match the aggregates of the executions table.
+        """
+        self.dispatch(self.tasks[:4])
+        self.assert_rollups_match_executions()
+        self.dispatch(self.tasks)
+        TaskExecution.objects.create(task=self.tasks[5], satellite=self.satellites[0])
+        self.assertEqual(SatelliteHour.objects.count(), 2)
+        rollup = SatelliteHour.objects.get(satellite=self.satellites[0])
+        self.assertEqual(rollup.executions, 6)
+        self.assertEqual(rollup.payoff, 1 + 3 + 1 + 3 + 5 + 6)
+        self.assert_rollups_match_executions()
+
+    def test_rebuild(self):
+        """Check that the rollups are computed again from executions in several hours."""
+        self.dispatch(self.tasks)
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for idx, execution in enumerate(TaskExecution.objects.order_by('id')):
+            execution.date_time = start + timedelta(minutes=25 * idx)
+            execution.save()
+        SatelliteHour.rebuild()
+        self.assertEqual(SatelliteHour.objects.filter(hour__lt=start + timedelta(days=1)).count(),
+                         5)
+        self.assert_rollups_match_executions()
+
+    def test_api(self):
+        """Check the payoff and utilization endpoints, filtered by satellite."""
+        self.dispatch(self.tasks)
+        response = self.client.get('/api/analytics/payoff/', {'satellite': 's1'})
+        self.assertListEqual([(row['satellite'], row['executions'], row['payoff'])
+                              for row in response.json()['results']], [('s1', 3, 2 + 4 + 6)])
+        response = self.client.get('/api/analytics/utilization/')
+        row, = response.json()['results']
+        self.assertEqual(row['resources'], 2 * (1 + 2 + 3))
+        self.assertAlmostEqual(row['utilization'], 12 / 6)
+        self.assertEqual(self.client.get('/api/analytics/utilization/',
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
@@ -0,0 +1,189 @@
+import json
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from simulator import jobs
+from simulator.models import (DispatchJob, GroundStation, Satellite, TableVersion, Task,
+                              TaskExecution)
+
+
+class TaskExecutionAPITestCase(TestCase):
+    url = '/api/taskexecution/'
+
+    def setUp(self):
+        cache.clear()
+        self.s1 = Satellite.objects.create(resources="1", name="s1")
+        self.s2 = Satellite.objects.create(resources="1", name="s2")
+        self.tasks = [Task.objects.create(name="t%d" % i, payoff=i, resources="1")
+                      for i in range(30)]
+
+    def execute(self, tasks, satellite):
+        TaskExecution.objects.bulk_create(
+            [TaskExecution(task=task, satellite=satellite) for task in tasks])
+        TaskExecution.changed()
+
+    def test_list_pages_with_constant_queries(self):
+        """Check that the pages are served newest first with a single query (and the one of the
+        executions version) for any amount of executions, following the cursor of the next page.
+        """
+        self.execute(self.tasks[:5], self.s1)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'page_size': 5})
+        self.assertEqual(len(response.json()['results']), 5)
+        self.execute(self.tasks[5:], self.s2)
+        with self.assertNumQueries(2):
+            page = self.client.get(self.url, {'page_size': 20}).json()
+        self.assertListEqual([execution['task']['name'] for execution in page['results']],
+                             ["t%d" % i for i in range(29, 9, -1)])
+        with self.assertNumQueries(2):
+            page = self.client.get(page['next']).json()
+        self.assertListEqual([execution['task']['name'] for execution in page['results']],
+                             ["t%d" % i for i in range(9, -1, -1)])
+        self.assertIsNone(page['next'])
+
+    def test_filters(self):
+        """Check the filters by satellite, task and time range."""
+        self.execute(self.tasks[:10], self.s1)
+        self.execute(self.tasks[10:], self.s2)
+        old = TaskExecution.objects.filter(task__in=self.tasks[:3])
+        old.update(date_time=timezone.now() - timedelta(days=1))
+
+        def names(**params):
+            results = self.client.get(self.url, params).json()['results']
+            return {execution['task']['name'] for execution in results}
+
+        self.assertSetEqual(names(satellite='s1'), {"t%d" % i for i in range(10)})
+        self.assertSetEqual(names(task='t12'), {'t12'})
+        until = (timezone.now() - timedelta(hours=1)).isoformat()
+        self.assertSetEqual(names(until=until), {'t0', 't1', 't2'})
+        self.assertSetEqual(names(satellite='s1', since=until), {"t%d" % i for i in range(3, 10)})
+
+    def test_etag_and_cache_invalidation(self):
+        """Check that unchanged pages are served from the cache or answered with a 304, until
+        new executions are saved, from this process or another one.
+        """
+        self.execute(self.tasks[:5], self.s1)
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(2):  # Only the executions version
+            self.assertEqual(self.client.get(self.url).json(), response.json())
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        TaskExecution.objects.create(task=self.tasks[5], satellite=self.s2)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['results']), 6)
+        # Another process saves executions, without sending signals in this one
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        TaskExecution.objects.bulk_create([TaskExecution(task=self.tasks[6], satellite=self.s2)])
+        TableVersion.objects.filter(name=TaskExecution.VERSION_KEY).update(
+            version=F('version') + 1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 7)
+
+
+class GroundStationAPITestCase(TestCase):
+    url = '/api/groundstation/'
+
+    def test_only_admins(self):
+        with patch('simulator.models.GroundStation.run') as run_mock:
+            self.assertEqual(self.client.post(self.url + 'run/').status_code, 403)
+            self.client.force_login(User.objects.create_user('user'))
+            self.assertEqual(self.client.post(self.url + 'run/').status_code, 403)
+        run_mock.assert_not_called()
+
+    def test_status_run_and_stop(self):
+        self.client.force_login(User.objects.create_superuser('admin', '', 'admin'))
+        self.assertDictEqual(self.client.get(self.url).json(), {
+            'hostname': GroundStation.load().hostname, 'port': GroundStation.load().port,
+            'running': False, 'alive': False})
+        with patch('simulator.models.GroundStationServer') as gs_mock:
+            with patch('simulator.models.threading') as th_mock:
+                response = self.client.post(self.url + 'run/')
+        self.assertTrue(response.json()['running'])
+        self.assertTrue(response.json()['alive'])
+        response = self.client.post(self.url + 'stop/')
+        self.assertEqual(gs_mock.return_value.server_close.call_count, 1)
+        self.assertFalse(response.json()['running'])
+        self.assertFalse(response.json()['alive'])
+
+
+class DispatchJobAPITestCase(TestCase):
+    url = '/api/dispatch/'
+
+    def setUp(self):
+        settings.SERVER = None
+        self.client.force_login(User.objects.create_superuser('admin', '', 'admin'))
+        self.s1 = Satellite.objects.create(resources="1", name="s1")
+        self.tasks = [Task.objects.create(name="t%d" % i, payoff=i + 1, resources="1")
+                      for i in range(5)]
+
+    def tearDown(self):
+        settings.SERVER = None
+
+    def test_create_queues_the_job(self):
+        with patch('simulator.jobs.worker') as worker_mock:
+            response = self.client.post(self.url, {'tasks': [self.tasks[0].pk]},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job = DispatchJob.objects.get()
+        self.assertEqual(response['Location'], 'http://testserver{}{}/'.format(self.url, job.pk))
+        self.assertEqual(response.json()['status'], DispatchJob.QUEUED)
+        self.assertIsNone(response.json()['progress'])
+        worker_mock.enqueue.assert_called_once_with(job)
+
+    def test_only_admins(self):
+        self.client.logout()
+        response = self.client.post(self.url, {'tasks': [self.tasks[0].pk]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertFalse(DispatchJob.objects.exists())
+
+    def test_create_validation(self):
+        for data in ({}, {'tasks': [1], 'filter': {'name': 't1'}}, {'filter': {'owner': 'me'}},
+                     {'filter': {'min_payoff': 'high'}}, {'tasks': [1], 'solver': 'unknown'},
+                     {'tasks': []}, {'tasks': [1, '2']}, {'tasks': [0]}):
+            response = self.client.post(self.url, data, content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertFalse(DispatchJob.objects.exists())
+
+    def test_run_job_by_chunks(self):
+        """Check that the filtered tasks are dispatched by chunks, saving the progress and
+        results of the job.
+        """
+        job = DispatchJob.objects.create(query=json.dumps({'filter': {'min_payoff': '2'}}),
+                                         solver='density')
+        settings.SERVER = MagicMock()
+        chunks = []
+
+        def dispatch(tasks, solver):
+            chunks.append([task.name for task in tasks])
+            return [(task, 's1') for task in tasks if task.payoff % 2]
+        settings.SERVER.dispatch_assignments.side_effect = dispatch
+        with self.settings(DISPATCH_JOB_CHUNK=3):
+            jobs.run_job(job.pk)
+        self.assertListEqual(chunks, [['t1', 't2', 't3'], ['t4']])
+        self.assertEqual(settings.SERVER.dispatch_assignments.call_args[1]['solver'], 'density')
+        data = self.client.get('{}{}/'.format(self.url, job.pk)).json()
+        self.assertEqual(data['status'], DispatchJob.DONE)
+        self.assertEqual((data['total'], data['processed'], data['progress']), (4, 4, 1.0))
+        self.assertEqual((data['dispatched'], data['payoff']), (2, 3 + 5))
+        self.assertEqual(TaskExecution.objects.count(), 2)
+
+    def test_run_job_without_ground_station(self):
+        job = DispatchJob.objects.create(query=json.dumps({'tasks': [self.tasks[0].pk]}))
+        job = jobs.run_job(job.pk)
+        self.assertEqual(job.status, DispatchJob.FAILED)
+        self.assertEqual(job.error, "The GroundStation isn't running")
+        self.assertIsNotNone(job.finished)
@@ -0,0 +1,79 @@
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.test import TestCase
+
+from simulator.cluster import Coordinator, HashRing
+
+
+FakeTask = namedtuple('FakeTask', ['pk', 'name', 'payoff', 'resources'])
+
+
+class FakeClient:
+    """Client registered in a node, it doesn't send anything."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def new_task_available(self, task):
+        pass
+
+    def new_tasks_available(self, tasks):
+        pass
+
+
+class HashRingTestCase(TestCase):
+    def test_keys_are_spread_between_nodes(self):
+        ring = HashRing(4)
+        counts = Counter(ring.node_for('sat-%d' % i) for i in range(4000))
+        self.assertSetEqual(set(counts), {0, 1, 2, 3})
+        self.assertTrue(all(count > 500 for count in counts.values()), counts)
+
+    def test_adding_a_node_moves_few_keys(self):
+        """Check that only the keys that go to the new node change of node."""
+        before, after = HashRing(3), HashRing(4)
+        keys = ['sat-%d' % i for i in range(4000)]
+        moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+        self.assertTrue(all(after.node_for(key) == 3 for key in moved))
+        self.assertLess(len(moved), len(keys) / 2)
+
+
+class CoordinatorTestCase(TestCase):
+    def setUp(self):
+        self.dispatch_window = settings.DISPATCH_WINDOW
+        settings.DISPATCH_WINDOW = 0
+        self.coordinator = Coordinator(settings.DEFAULT_SERVER_HOSTNAME, 0, 2)
+        self.addCleanup(self.coordinator.server_close)
+
+    def tearDown(self):
+        settings.DISPATCH_WINDOW = self.dispatch_window
+
+    def register(self, node, name, resources):
+        self.coordinator.call(node, 'update_resources', FakeClient(name), resources, name)
+
+    def test_nodes_listen_in_their_addresses(self):
+        addresses = self.coordinator.addresses
+        self.assertEqual(len(addresses), 2)
+        self.assertNotEqual(addresses[0], addresses[1])
+        self.assertIn(self.coordinator.address_for('sat'), addresses)
+
+    def test_dispatch_merges_the_assignments_of_every_node(self):
+        self.register(0, 's0', ['1', '2'])
+        self.register(1, 's1', ['1', '2'])
+        tasks = [FakeTask(i, 't%d' % i, 10, '1') for i in range(2)]
+        assignments = self.coordinator.dispatch_assignments(tasks)
+        self.assertCountEqual([(task.name, name) for task, name in assignments],
+                              [('t0', 's0'), ('t1', 's1')])
+        self.assertIs(assignments[0][0], tasks[0])  # The same objects, to keep their ids
+
+    def test_unassigned_tasks_are_rerouted_to_other_nodes(self):
+        """Check that the tasks that a node can't execute go to the node that has their
+        resources, and the ones that no node can execute are left out.
+        """
+        self.register(0, 's0', ['1'])
+        self.register(1, 's1', ['2', '3'])
+        tasks = [FakeTask(0, 't0', 10, '2'), FakeTask(1, 't1', 10, '1'),
+                 FakeTask(2, 't2', 10, '4')]
+        self.assertDictEqual(self.coordinator.dispatch_tasks(tasks), {'t0': 's1', 't1': 's0'})
+        self.assertDictEqual(self.coordinator.dispatch_tasks([FakeTask(3, 't3', 10, '3')]),
+                             {'t3': 's1'})
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+from django.conf import settings
+from django.test import TestCase
+
+from simulator.control import ControlClient, ControlServer
+from simulator.ground_station import GroundStationServer
+
+
+FakeTask = namedtuple('FakeTask', ['pk', 'name', 'payoff', 'resources'])
+
+
+class ControlTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.address = os.path.join(directory, 'control.sock')
+        self.server = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.addCleanup(self.server.server_close)
+        self.control = ControlServer(self.server, self.address)
+        self.addCleanup(self.control.server_close)
+        self.thread = threading.Thread(target=self.control.serve_forever)
+        self.thread.start()
+        self.addCleanup(self.thread.join, 1)
+        self.addCleanup(self.control.shutdown)
+        self.client = ControlClient(self.address)
+        self.addCleanup(self.client.close)
+
+    def test_dispatch(self):
+        """Check that tasks are dispatched by the daemon, and the assignments are returned with
+        the same task objects.
+        """
+        client = type('FakeClient', (), {'new_tasks_available': lambda self, tasks: None})()
+        self.server.update_resources(client, ['1', '2'], 's1')
+        tasks = [FakeTask(1, 't1', 10, '1'), FakeTask(2, 't1', 5, '3')]
+        assignments = self.client.dispatch_assignments(tasks)
+        self.assertEqual(len(assignments), 1)
+        self.assertIs(assignments[0][0], tasks[0])
+        self.assertEqual(assignments[0][1], 's1')
+        status = self.client.status()
+        self.assertEqual(status['clients'], 1)
+        self.assertEqual(status['stats']['dispatched'], 1)
+        self.assertIn('satasking_clients_connected 1', self.client.metrics())
+
+    def test_errors_are_raised_in_the_client(self):
+        with self.assertRaises(ValueError):
+            self.client.dispatch_assignments([FakeTask(1, 't1', 10, '1')], solver='unknown')
+        self.assertTrue(self.client.ping())  # The connection is still usable
+
+    def test_stop(self):
+        self.assertTrue(self.client.stop())
+        self.thread.join(1)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_rejects_clients_without_the_key(self):
+        with self.assertRaises(AuthenticationError):
+            Client(self.address, family='AF_UNIX', authkey=b'wrong')
+        self.assertTrue(self.client.ping())
+
+    def test_ping_without_daemon(self):
+        self.assertFalse(ControlClient(self.address + '.missing').ping())
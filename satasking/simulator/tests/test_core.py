@@ -1,11 +1,24 @@
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
 from collections import defaultdict
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
 from django.test import TestCase
 
-from simulator.ground_station import GroundStationServer
+from simulator.aio_ground_station import AsyncGroundStationServer
+from simulator.ground_station import GroundStationHandler, GroundStationServer
+from simulator.journal import task_record
+from simulator.messages import (MSG_ENCODING, MSG_HEARTBEAT, MSG_OK, MSG_PING, MSG_PONG,
+                                MSG_RESOURCES_PREFIX, MSG_RESUME, MSG_SEPARATOR, MSG_TASK_PREFIX,
+                                TYPE_TASK_BATCH)
 from simulator.models import Task
+from simulator.protocol import FramedProtocol, TextProtocol
+from simulator.satellite import SatelliteClient
 
 
 class GroundStationServerTestCase(TestCase):
@@ -25,8 +38,8 @@ class GroundStationServerTestCase(TestCase):
         client_id2 = 'client2'
         client_resources2 = ['6', '7', '8', '9', '0']
         gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, settings.DEFAULT_SERVER_PORT)
-        gss.update_resources(client_id1, client_resources1)
-        gss.update_resources(client_id2, client_resources2)
+        gss.update_resources(client_id1, client_resources1, 's1')
+        gss.update_resources(client_id2, client_resources2, 's2')
         for res in gss.resources_by_clients:
             # Checks that for each resource, the resource has the correct client adressed
             if res in client_resources1:
@@ -42,22 +55,39 @@ class GroundStationServerTestCase(TestCase):
         client_resources1 = ['1', '2', '3', '5']  # Can execute t1
         client_id2 = MagicMock(name='c2')  # Client can be anything in this context
         client_resources2 = ['2', '3', '4', '9']  # Can execute t2
-        # MonkeyPatch 'new_task_available' method from client handlers to prevent a miscalling
-        client_id1.new_task_available = MagicMock()
-        client_id2.new_task_available = MagicMock()
+        # MonkeyPatch 'new_tasks_available' method from client handlers to prevent a miscalling
+        client_id1.new_tasks_available = MagicMock()
+        client_id2.new_tasks_available = MagicMock()
         gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, settings.DEFAULT_SERVER_PORT)
-        gss.update_resources(client_id1, client_resources1)
-        gss.update_resources(client_id2, client_resources2)
+        gss.update_resources(client_id1, client_resources1, 's1')
+        gss.update_resources(client_id2, client_resources2, 's2')
         # First check that clients havent tasks assigned
         for c in gss.clients:
             self.assertListEqual(gss.clients[c]['tasks'], [])
         gss.dispatch_tasks([self.t1, self.t2, self.t3])
         # Check that correct tasks were assigned
-        client_id1.new_task_available.assert_called_with(self.t1)
-        client_id2.new_task_available.assert_called_with(self.t2)
+        client_id1.new_tasks_available.assert_called_once_with([self.t1])
+        client_id2.new_tasks_available.assert_called_once_with([self.t2])
         self.assertListEqual(gss.clients[client_id1]['tasks'], [self.t1])
         self.assertListEqual(gss.clients[client_id2]['tasks'], [self.t2])
 
+    def test_dispatch_tasks_disconnects_clients_that_fail(self):
+        """Check that a client whose batch can't be sent is disconnected and its tasks left
+        unassigned, while the rest of the clients get their batches.
+        """
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.addCleanup(gss.server_close)
+        broken, client = MagicMock(name='c1'), MagicMock(name='c2')
+        broken.new_tasks_available.side_effect = BrokenPipeError
+        broken.disconnect_client.side_effect = lambda: gss.remove_client(broken)
+        gss.update_resources(broken, ['1', '2', '3'], 's1')
+        gss.update_resources(client, ['2', '3', '4'], 's2')
+        self.assertDictEqual(gss.dispatch_tasks([self.t1, self.t2]), {'t2': 's2'})
+        broken.disconnect_client.assert_called_once_with()
+        client.new_tasks_available.assert_called_once_with([self.t2])
+        self.assertNotIn(broken, gss.clients)
+        self.assertEqual(gss.stats['dispatched'], 1)
+
     def test_dispatch_tasks_removes_candidate_from_resources_if_assign_task(self):
         """Check that if a task is assigned to a client, then required resources arent available
         anymore in that client.
@@ -70,8 +100,8 @@ class GroundStationServerTestCase(TestCase):
         client_id1.new_task_available = MagicMock()
         client_id2.new_task_available = MagicMock()
         gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, settings.DEFAULT_SERVER_PORT)
-        gss.update_resources(client_id1, client_resources1)
-        gss.update_resources(client_id2, client_resources2)
+        gss.update_resources(client_id1, client_resources1, 's1')
+        gss.update_resources(client_id2, client_resources2, 's2')
 
         gss.dispatch_tasks([self.t1, self.t2, self.t3])
         for res in gss.resources_by_clients:
@@ -80,6 +110,363 @@ class GroundStationServerTestCase(TestCase):
             if res in client_resources2 and res not in self.t2.resources.split(','):
                     self.assertIn(client_id2, gss.resources_by_clients[res])
 
+    def test_dispatch_tasks_with_solver(self):
+        """Check that the solver can be chosen by dispatch call and its result is kept."""
+        client_id1 = MagicMock(name='c1')
+        client_id2 = MagicMock(name='c2')
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, settings.DEFAULT_SERVER_PORT)
+        gss.update_resources(client_id1, ['1', '2', '3', '4', '5'], 's1')
+        gss.update_resources(client_id2, ['3', '4', '5'], 's2')
+        results = gss.dispatch_tasks([self.t1, self.t2, self.t3], solver='density')
+        self.assertDictEqual(results, {'t2': 's1', 't3': 's2'})
+        self.assertEqual(gss.last_solution.solver, 'density')
+        self.assertEqual(gss.last_solution.total_payoff, 40)
+
+    def test_task_completed_releases_resources(self):
+        """Check that finished tasks give back their resources and failed ones are dispatched
+        again.
+        """
+        client_id1 = MagicMock(name='c1')
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, settings.DEFAULT_SERVER_PORT)
+        gss.update_resources(client_id1, ['1', '2', '3', '5'], 's1')
+        self.assertDictEqual(gss.dispatch_tasks([self.t1]), {'t1': 's1'})
+        gss.task_failed(client_id1, 't1')
+        self.assertEqual(client_id1.new_tasks_available.call_count, 2)
+        self.assertListEqual(gss.clients[client_id1]['tasks'], [self.t1])
+        self.assertSetEqual(set(gss.index.available_resources(client_id1)), {'5'})
+        gss.task_started(client_id1, 't1')
+        gss.task_completed(client_id1, 't1')
+        self.assertSetEqual(set(gss.index.available_resources(client_id1)), {'1', '2', '3', '5'})
+        self.assertListEqual(gss.clients[client_id1]['tasks'], [])
+        self.assertDictEqual(dict(gss.stats), {'dispatched': 2, 'started': 1, 'failed': 1,
+                                               'completed': 1, 'dispatched_payoff': 20,
+                                               'completed_payoff': 10})
+
+    def test_submitted_tasks_wait_for_resources(self):
+        """Check that submitted tasks that can't be dispatched wait until a client finishes a
+        task or a new client is registered.
+        """
+        client_id1 = MagicMock(name='c1')
+        client_id2 = MagicMock(name='c2')
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, settings.DEFAULT_SERVER_PORT)
+        gss.update_resources(client_id1, ['1', '2', '3', '4'], 's1')
+        gss.submit_tasks([self.t1, self.t2, self.t3])
+        self.assertListEqual(gss.clients[client_id1]['tasks'], [self.t2])
+        self.assertListEqual(gss.scheduler.tasks, [self.t3, self.t1])  # By payoff density
+        gss.task_completed(client_id1, 't2')
+        self.assertListEqual(gss.clients[client_id1]['tasks'], [self.t1])
+        self.assertListEqual(gss.scheduler.tasks, [self.t3])
+        gss.update_resources(client_id2, ['3', '4', '5'], 's2')
+        self.assertListEqual(gss.clients[client_id2]['tasks'], [self.t3])
+        self.assertEqual(len(gss.scheduler), 0)
+
+    def test_disconnected_client_tasks_are_dispatched_again(self):
+        """Check that the tasks of a disconnected client are dispatched again when it connects
+        without resuming them, or when it doesn't come back in time.
+        """
+        client_id1 = MagicMock(name='c1')
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.addCleanup(gss.server_close)
+        gss.update_resources(client_id1, ['1', '2', '3'], 's1')
+        gss.dispatch_tasks([self.t1])
+        gss.remove_client(client_id1)
+        self.assertListEqual(gss.detached['s1'][0], [self.t1])
+        client_id2 = MagicMock(name='c2')
+        gss.update_resources(client_id2, ['1', '2', '3'], 's1')
+        client_id2.new_tasks_available.assert_called_once_with([self.t1])
+        self.assertDictEqual(gss.detached, {})
+        with self.settings(RESUME_TIMEOUT=0.01):
+            gss.remove_client(client_id2)
+            for _ in range(100):
+                if len(gss.scheduler):
+                    break
+                time.sleep(0.01)
+        self.assertListEqual(gss.scheduler.tasks, [self.t1])
+
+    def test_restart_restores_state(self):
+        """Check that a restarted server restores the assignments and queued tasks, and that
+        the satellites that connect again resume their tasks.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(STATE_DIR=directory):
+            gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+            gss.update_resources(MagicMock(name='c1'), ['1', '2', '3', '4'], 's1')
+            gss.submit_tasks([self.t1, self.t2, self.t3])
+            gss.socket.close()  # It dies, without saving a snapshot
+            restarted = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+            self.addCleanup(restarted.server_close)
+        self.assertListEqual([task.name for task in restarted.scheduler.tasks], ['t3', 't1'])
+        self.assertListEqual(restarted.detached['s1'][0], [task_record(self.t2)])
+        client_id2 = MagicMock(name='c2', features=[MSG_RESUME])
+        restarted.update_resources(client_id2, ['1', '2', '3', '4'], 's1')
+        restarted.resume_tasks(client_id2, ['t2'])
+        client_id2.new_tasks_available.assert_not_called()
+        self.assertListEqual([task.name for task in restarted.clients[client_id2]['tasks']],
+                             ['t2'])
+        restarted.task_completed(client_id2, 't2')
+        self.assertListEqual([task.name for task in restarted.clients[client_id2]['tasks']],
+                             ['t1'])
+        self.assertListEqual(restarted.store.state.assigned['s1'], [task_record(self.t1)])
+
+
+    def test_server_close_disconnects_clients(self):
+        """Check that a server is closed while a client is connected, without waiting for it."""
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        th_server = threading.Thread(target=gss.serve_forever)
+        th_server.start()
+        sock = socket.create_connection(gss.server_address, timeout=5)
+        self.addCleanup(sock.close)
+        sock.sendall(bytes("{}1,2,3{}s1".format(MSG_RESOURCES_PREFIX, MSG_SEPARATOR),
+                           MSG_ENCODING))
+        self.assertEqual(str(sock.recv(1024), MSG_ENCODING), MSG_OK)
+        closing = threading.Thread(target=lambda: (gss.shutdown(), gss.server_close()),
+                                   daemon=True)
+        closing.start()
+        closing.join(5)
+        self.assertFalse(closing.is_alive())
+        th_server.join()
+        self.assertEqual(sock.recv(1024), b'')
+        self.assertEqual(len(gss.clients), 0)
+
+class GroundStationHandlerTestCase(TestCase):
+    def test_writes_from_threads_dont_interleave(self):
+        """Check that writes from several threads to the same client are serialized."""
+        class SlowSocket:
+            writing = False
+            overlapped = False
+
+            def sendall(self, data):
+                if self.writing:
+                    self.overlapped = True
+                self.writing = True
+                time.sleep(0.001)  # Like a partial write of a big message
+                self.writing = False
+
+        handler = GroundStationHandler.__new__(GroundStationHandler)
+        handler.write_lock = threading.Lock()
+        handler.request = SlowSocket()
+        threads = [threading.Thread(target=lambda: [handler._write(b'x') for _ in range(20)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(handler.request.overlapped)
+
+
 class SatelliteClientTestCase(TestCase):
     def setUp(self):
-        pass
+        self.gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.th_server = threading.Thread(target=self.gss.serve_forever)
+        self.th_server.start()
+        self.addCleanup(self.stop_server)  # Cleanups run after stopping the clients
+        self.host, self.port = self.gss.server_address
+
+    def stop_server(self):
+        self.gss.shutdown()
+        self.th_server.join()
+        self.gss.server_close()
+
+    def run_client(self, **kwargs):
+        client = SatelliteClient(self.host, self.port, '1,2,3', 's1', **kwargs)
+        client.init_client()
+        self.addCleanup(client.stop)
+        self.assertTrue(client.connected)
+        task = Task(name='t1', payoff=10, resources='1,2')
+        self.assertDictEqual(self.gss.dispatch_tasks([task]), {'t1': 's1'})
+        with patch('simulator.satellite.random_dice_execution', return_value=True):
+            client.wait_for_command()
+        self.assertListEqual(list(client.tasks.values()), [('t1', 10, ['1', '2'])])
+        self.assertListEqual(client.available, ['3'])
+        return client
+
+    def test_reset_connection_removes_client(self):
+        """Check that a client whose connection is reset is removed with its resources."""
+        sock = socket.create_connection((self.host, self.port), timeout=5)
+        sock.sendall(bytes("{}1,2,3{}s1".format(MSG_RESOURCES_PREFIX, MSG_SEPARATOR),
+                           MSG_ENCODING))
+        self.assertEqual(str(sock.recv(1024), MSG_ENCODING), MSG_OK)
+        # Closing with a zero linger time sends a RST instead of a FIN
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        sock.close()
+        deadline = time.monotonic() + 5
+        while len(self.gss.clients) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.gss.clients), 0)
+        self.assertDictEqual(self.gss.dispatch_tasks([Task(name='t1', payoff=1, resources='1')]),
+                             {})
+
+    def test_negotiates_framed_protocol(self):
+        """Check that the client and the server switch to the framed protocol on the ping."""
+        client = self.run_client()
+        self.assertIsInstance(client.protocol, FramedProtocol)
+
+    def test_text_protocol(self):
+        """Check that clients without the framed protocol keep using the text one."""
+        client = self.run_client(framed=False)
+        self.assertIsInstance(client.protocol, TextProtocol)
+
+    def test_receives_tasks_batch(self):
+        """Check that all the tasks dispatched to a client arrive in a single message."""
+        client = SatelliteClient(self.host, self.port, '1,2,3', 's1')
+        client.init_client()
+        self.addCleanup(client.stop)
+        tasks = [Task(name='t1', payoff=10, resources='1'),
+                 Task(name='t2', payoff=5, resources='2,3')]
+        self.assertDictEqual(self.gss.dispatch_tasks(tasks), {'t1': 's1', 't2': 's1'})
+        with patch('simulator.satellite.random_dice_execution', return_value=True):
+            kind, fields = client.read()
+            self.assertEqual(kind, TYPE_TASK_BATCH)
+            client.process_message(kind, fields)
+        self.assertListEqual(list(client.tasks.values()),
+                             [('t1', 10, ['1']), ('t2', 5, ['2', '3'])])
+        self.assertListEqual(client.available, [])
+
+    def test_finished_task_releases_server_resources(self):
+        """Check that the client tells the server when it finishes a task, and the resources
+        are available again.
+        """
+        client = SatelliteClient(self.host, self.port, '1,2,3', 's1', task_duration=(0.01, 0.01))
+        client.init_client()
+        self.addCleanup(client.stop)
+        task = Task(name='t1', payoff=10, resources='1,2')
+        self.assertDictEqual(self.gss.dispatch_tasks([task]), {'t1': 's1'})
+        with patch('simulator.satellite.random_dice_execution', return_value=True):
+            client.wait_for_command()  # Receives the task
+        self.assertListEqual(client.available, ['3'])
+        client.wait_for_command()  # Finishes the task
+        self.assertListEqual(sorted(client.available), ['1', '2', '3'])
+        for _ in range(100):
+            if self.gss.stats['completed']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.gss.stats['started'], 1)
+        self.assertEqual(self.gss.stats['completed'], 1)
+        self.assertDictEqual(self.gss.dispatch_tasks([task]), {'t1': 's1'})
+
+    def test_tasks_with_the_same_name(self):
+        """Check that the client executes and finishes tasks with the same name."""
+        client = SatelliteClient(self.host, self.port, '1,2,3', 's1', task_duration=(0.01, 0.01))
+        client.init_client()
+        self.addCleanup(client.stop)
+        tasks = [Task(name='t1', payoff=10, resources='1'),
+                 Task(name='t1', payoff=5, resources='2')]
+        self.assertEqual(len(self.gss.dispatch_assignments(tasks)), 2)
+        with patch('simulator.satellite.random_dice_execution', return_value=True):
+            client.wait_for_command()  # Receives the tasks
+        self.assertListEqual(list(client.tasks.values()), [('t1', 10, ['1']), ('t1', 5, ['2'])])
+        time.sleep(0.02)
+        client.finish_tasks()
+        self.assertDictEqual(client.tasks, {})
+        self.assertListEqual(sorted(client.available), ['1', '2', '3'])
+        for _ in range(100):
+            if self.gss.stats['completed'] == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.gss.stats['completed'], 2)
+
+    def wait_until(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def registered(self):
+        return [c for c in self.gss.clients if self.gss.clients[c].get('name') == 's1']
+
+    def start_client(self, **attributes):
+        client = SatelliteClient(self.host, self.port, '1,2,3', 's1')
+        for name, value in attributes.items():
+            setattr(client, name, value)
+        th_client = threading.Thread(target=client.run)
+        th_client.start()
+        self.addCleanup(th_client.join, 5)
+        self.addCleanup(client.stop)
+        self.wait_until(lambda: len(self.registered()) == 1)
+        return client, th_client
+
+    def test_stop_ends_run_loop(self):
+        """Check that `stop` from another thread disconnects the client and ends `run`."""
+        client, th_client = self.start_client()
+        client.stop()
+        th_client.join(5)
+        self.assertFalse(th_client.is_alive())
+        self.wait_until(lambda: len(self.gss.clients) == 0)
+
+    def test_reconnects_when_connection_is_lost(self):
+        """Check that the client connects again and registers its resources."""
+        client, _ = self.start_client(reconnect_delay=0.01)
+        handler = self.registered()[0]
+        handler.request.shutdown(socket.SHUT_RDWR)
+        self.wait_until(lambda: client.connections == 2 and len(self.registered()) == 1)
+        self.assertIsNot(self.registered()[0], handler)
+        self.assertSetEqual(set(self.gss.index.available_resources(self.registered()[0])),
+                            {'1', '2', '3'})
+
+    def test_resumes_tasks_when_connection_is_lost(self):
+        """Check that the client keeps executing its tasks while it connects again, and that the
+        server keeps them assigned to it.
+        """
+        client, _ = self.start_client(reconnect_delay=0.1, task_duration=(30, 30))
+        with patch('simulator.satellite.random_dice_execution', return_value=True):
+            self.gss.dispatch_tasks([Task(name='t1', payoff=10, resources='1,2')])
+            self.wait_until(lambda: len(client.tasks) == 1)
+        handler = self.registered()[0]
+        handler.request.shutdown(socket.SHUT_RDWR)
+        self.wait_until(lambda: client.connections == 2 and len(self.registered()) == 1)
+        info = self.gss.clients[self.registered()[0]]
+        self.wait_until(lambda: 'attached' not in info)  # Until the client resumed its tasks
+        self.assertListEqual([task.name for task in info['tasks']], ['t1'])
+        self.assertSetEqual(set(self.gss.index.available_resources(self.registered()[0])), {'3'})
+        self.assertDictEqual(self.gss.detached, {})
+        self.assertListEqual([name for name, _, _ in client.tasks.values()], ['t1'])
+
+    def test_heartbeats_keep_idle_connection(self):
+        """Check that the server answers the heartbeats, so idle clients stay connected."""
+        client, _ = self.start_client(heartbeat_interval=0.02, heartbeat_timeout=0.1)
+        self.assertIn(MSG_HEARTBEAT, client.features)
+        time.sleep(0.3)
+        self.assertEqual(client.connections, 1)
+
+    def test_reconnects_without_heartbeat_answers(self):
+        """Check that the client drops a connection whose server doesn't answer heartbeats."""
+        with patch('simulator.ground_station.TYPE_HEARTBEAT', None):
+            client, _ = self.start_client(heartbeat_interval=0.02, heartbeat_timeout=0.1,
+                                          reconnect_delay=0.01)
+            self.wait_until(lambda: client.connections > 1)
+
+
+class AsyncGroundStationServerTestCase(TestCase):
+    def setUp(self):
+        self.gss = AsyncGroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.th_server = threading.Thread(target=self.gss.serve_forever)
+        self.th_server.start()
+        self.sock = socket.create_connection(self.gss.server_address, timeout=5)
+
+    def tearDown(self):
+        self.sock.close()
+        self.gss.shutdown()
+        self.th_server.join()
+        self.gss.server_close()
+
+    def exchange(self, message):
+        self.sock.sendall(bytes(message, MSG_ENCODING))
+        return str(self.sock.recv(1024), MSG_ENCODING)
+
+    def test_handshake_registers_client(self):
+        """Check that the asyncio server answers the handshake and registers the resources."""
+        self.assertEqual(self.exchange(MSG_PING), MSG_PONG)
+        self.assertEqual(self.exchange("{}1,2,3{}s1".format(MSG_RESOURCES_PREFIX, MSG_SEPARATOR)),
+                         MSG_OK)
+        clients = [c for c in self.gss.clients if self.gss.clients[c].get('name') == 's1']
+        self.assertEqual(len(clients), 1)
+        self.assertSetEqual(set(self.gss.index.available_resources(clients[0])), {'1', '2', '3'})
+
+    def test_dispatch_tasks_sends_task_from_other_thread(self):
+        """Check that tasks dispatched from outside the event loop are sent to the client."""
+        self.exchange("{}1,2,3{}s1".format(MSG_RESOURCES_PREFIX, MSG_SEPARATOR))
+        task = Task(name='t1', payoff=10, resources='1,2')
+        self.assertDictEqual(self.gss.dispatch_tasks([task]), {'t1': 's1'})
+        message = str(self.sock.recv(1024), MSG_ENCODING)
+        self.assertEqual(message, "{p}t1{s}10{s}1,2".format(p=MSG_TASK_PREFIX, s=MSG_SEPARATOR))
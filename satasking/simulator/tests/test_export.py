@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from simulator import export
+from simulator.models import Satellite, Task, TaskExecution
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        satellites = [Satellite.objects.create(resources="1", name="s%d" % i) for i in range(2)]
+        tasks = [Task.objects.create(name="t%d" % i, payoff=i, resources="1") for i in range(5)]
+        TaskExecution.objects.bulk_create(
+            [TaskExecution(task=tasks[i % 5], satellite=satellites[i % 2]) for i in range(7)])
+        self.expected = [
+            (execution.pk, execution.date_time, execution.task.name, execution.task.payoff,
+             execution.satellite.name)
+            for execution in TaskExecution.objects.select_related('task', 'satellite')
+            .order_by('id')]
+
+    def exported(self, format, queryset=None, chunk_size=3):
+        queryset = TaskExecution.objects.all() if queryset is None else queryset
+        return b''.join(export.export(queryset, format, chunk_size))
+
+    def test_ndjson(self):
+        lines = self.exported('ndjson').decode().splitlines()
+        self.assertListEqual(
+            [tuple(json.loads(line).values()) for line in lines],
+            [(pk, date_time.isoformat(), task, payoff, satellite)
+             for pk, date_time, task, payoff, satellite in self.expected])
+
+    def test_csv(self):
+        lines = list(csv.reader(io.StringIO(self.exported('csv').decode())))
+        self.assertListEqual(lines[0], list(export.COLUMNS))
+        self.assertListEqual(lines[1:], [[str(pk), date_time.isoformat(), task, str(payoff),
+                                          satellite]
+                                         for pk, date_time, task, payoff, satellite
+                                         in self.expected])
+        self.assertEqual(self.exported('csv', TaskExecution.objects.none()),
+                         b'id,date_time,task,payoff,satellite\r\n')
+
+    def test_binary(self):
+        """Check that the binary export is read back, and that it's smaller than the others."""
+        data = self.exported('binary')
+        self.assertListEqual(
+            list(export.read_binary(io.BytesIO(data))),
+            [(pk, date_time.timestamp(), task, payoff, satellite)
+             for pk, date_time, task, payoff, satellite in self.expected])
+        self.assertLess(len(self.exported('binary', chunk_size=export.CHUNK_SIZE)),
+                        len(self.exported('csv', chunk_size=export.CHUNK_SIZE)))
+        self.assertListEqual(list(export.read_binary(io.BytesIO(
+            self.exported('binary', TaskExecution.objects.none())))), [])
+
+    @unittest.skipIf(export.pyarrow is None, "pyarrow isn't installed")
+    def test_parquet(self):
+        table = export.pyarrow.parquet.read_table(export.pyarrow.BufferReader(
+            self.exported('parquet')))
+        self.assertListEqual(table.column('id').to_pylist(), [row[0] for row in self.expected])
+        self.assertListEqual(table.column('satellite').to_pylist(),
+                             [row[4] for row in self.expected])
+
+    def test_view_streams_filtered_executions(self):
+        response = self.client.get('/export/executions.ndjson', {'satellite': 's1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertListEqual([json.loads(line)['id'] for line in lines],
+                             [row[0] for row in self.expected if row[4] == 's1'])
+        self.assertEqual(self.client.get('/export/executions.xml').status_code, 404)
+        self.assertEqual(self.client.get('/export/executions.csv', {'since': 'x'}).status_code,
+                         400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'executions.bin')
+            call_command('export_executions', format='binary', output=path, task='t1',
+                         stderr=io.StringIO())
+            with open(path, 'rb') as exported:
+                self.assertListEqual([row[0] for row in export.read_binary(exported)],
+                                     [row[0] for row in self.expected if row[2] == 't1'])
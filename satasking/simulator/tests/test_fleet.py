@@ -0,0 +1,109 @@
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from simulator.aio_ground_station import AsyncGroundStationServer
+from simulator.fleet import Fleet
+from simulator.models import Satellite
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class FleetTestCase(TestCase):
+    def start_server(self):
+        server = AsyncGroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        th_server = threading.Thread(target=server.serve_forever)
+        th_server.start()
+
+        def stop():
+            server.shutdown()
+            th_server.join()
+            server.server_close()
+        self.addCleanup(stop)
+        return server
+
+    def wait_clients(self, server, amount, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while len(server.clients) != amount and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(server.clients)
+
+    def test_shards_satellites_between_processes(self):
+        """Check that every satellite runs in one of the processes."""
+        satellites = [('localhost', 0, '1', 's%d' % idx) for idx in range(10)]
+        shards = Fleet(satellites, processes=3).shards()
+        self.assertEqual(len(shards), 3)
+        self.assertCountEqual([sat for shard in shards for sat in shard], satellites)
+        self.assertEqual(Fleet(satellites[:2], processes=3).processes, 2)
+
+    def test_fleet_satellites_execute_tasks(self):
+        """Check that the satellites of a fleet connect, execute tasks and disconnect."""
+        server = self.start_server()
+        host, port = server.server_address
+        satellites = [(host, port, 'r%d' % idx, 's%d' % idx) for idx in range(20)]
+        fleet = Fleet(satellites, processes=2)
+        fleet.start()
+        self.addCleanup(fleet.stop, 5)
+        self.assertTrue(fleet.wait_connected(timeout=10))
+        self.assertEqual(self.wait_clients(server, 20), 20)
+
+        tasks = [FakeTask('t%d' % idx, 1, 'r%d' % idx) for idx in range(20)]
+        self.assertEqual(len(server.dispatch_tasks(tasks)), 20)
+        deadline = time.monotonic() + 10
+        while server.stats['started'] + server.stats['failed'] < 20:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        fleet.stop(5)
+        self.assertFalse(fleet.is_alive())
+        self.assertEqual(self.wait_clients(server, 0), 0)
+
+    def test_run_fleet_from_models(self):
+        """Check that the satellites run in a fleet are marked as running until it's stopped."""
+        server = self.start_server()
+        host, port = server.server_address
+        for idx in range(3):
+            Satellite.objects.create(name='s%d' % idx, hostname=host, port=port,
+                                     resources='r%d' % idx)
+        Satellite.run_fleet(Satellite.objects.all(), processes=1)
+        self.addCleanup(lambda: settings.FLEET and Satellite.stop_fleet())
+        self.assertTrue(settings.FLEET.wait_connected(timeout=10))
+        self.assertEqual(Satellite.objects.filter(running=True).count(), 3)
+
+        Satellite.stop_fleet()
+        self.assertIsNone(settings.FLEET)
+        self.assertEqual(Satellite.objects.filter(running=True).count(), 0)
+
+    def test_run_fleet_command_shards_saved_satellites(self):
+        """Check that saved satellites run by the command connect to the node of their shard."""
+        for idx in range(20):
+            Satellite.objects.create(name='s%d' % idx, hostname='localhost', port=9000,
+                                     resources='1')
+        with self.settings(GROUND_STATION_NODES=3), \
+                patch('simulator.management.commands.run_fleet.Fleet') as fleet:
+            fleet.return_value.is_alive.return_value = False
+            call_command('run_fleet', stdout=io.StringIO())
+            expected = [sat.address + (sat.resources, sat.name)
+                        for sat in Satellite.objects.all()]
+        satellites = fleet.call_args[0][0]
+        self.assertCountEqual(satellites, expected)
+        self.assertSetEqual({port for _, port, _, _ in satellites}, {9000, 9001, 9002})
+
+    def test_run_fleet_command_skips_alive_satellites(self):
+        """Check that the command runs the satellites left running by a dead process, but not
+        the ones running in another process.
+        """
+        Satellite.objects.create(name='s1', resources='1', running=True, pid=os.getppid())
+        Satellite.objects.create(name='s2', resources='1', running=True)
+        with patch('simulator.management.commands.run_fleet.Fleet') as fleet:
+            fleet.return_value.is_alive.return_value = False
+            call_command('run_fleet', stdout=io.StringIO())
+        self.assertListEqual([name for _, _, _, name in fleet.call_args[0][0]], ['s2'])
@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from simulator.ingest import ingest
+from simulator.models import Resource, Task
+
+
+def ndjson(*rows):
+    return [(row if isinstance(row, str) else json.dumps(row)).encode() + b'\n' for row in rows]
+
+
+class IngestTestCase(TestCase):
+    def setUp(self):
+        Task.objects.create(name='existing', payoff=1, resources='1')
+
+    def test_ndjson_by_chunks(self):
+        """Check that valid tasks are created and linked to their resources by chunks, and the
+        duplicated and invalid rows are reported.
+        """
+        chunks = []
+        report = ingest(ndjson(
+            {'name': 't1', 'payoff': 10, 'resources': '1, 2'},
+            {'name': 't2', 'payoff': '5', 'resources': ['3']},
+            '',
+            {'name': 't1', 'payoff': 1, 'resources': '1'},
+            {'name': 'existing', 'payoff': 1, 'resources': '1'},
+            '{"name": "broken"',
+            {'name': '', 'payoff': 1, 'resources': '1'},
+            {'name': 't3', 'payoff': -1, 'resources': '1'},
+            {'name': 't3', 'payoff': True, 'resources': '1'},
+            {'name': 't3', 'payoff': 'many', 'resources': '1'},
+            {'name': 't3', 'payoff': 1, 'resources': ' , '},
+            {'name': 't3', 'payoff': 1, 'resources': ['1,2']},
+            {'name': 't3', 'payoff': 1, 'resources': '4'},
+        ), 'ndjson', chunk_size=2, progress=lambda report: chunks.append(report.created))
+        self.assertEqual((report.rows, report.created, report.duplicates, report.invalid),
+                         (12, 3, 2, 7))
+        self.assertListEqual([line for line, _ in report.errors], [6, 7, 8, 9, 10, 11, 12])
+        self.assertListEqual(chunks, [2, 2, 3])  # The 2nd chunk only had duplicates
+        t1 = Task.objects.get(name='t1')
+        self.assertEqual((t1.payoff, t1.resources), (10, '1,2'))
+        self.assertListEqual(sorted(t1.resource_set.values_list('name', flat=True)), ['1', '2'])
+        self.assertListEqual(list(Task.objects.get(name='t3').resource_set.values_list(
+            'name', flat=True)), ['4'])
+        self.assertEqual(Task.objects.count(), 4)
+
+    def test_csv_with_known_resources(self):
+        Resource.objects.create(name='2')
+        lines = io.BytesIO(b'name,payoff,resources\nt1,10,"1,2"\nt2,5,3\nt3,,1\n')
+        report = ingest(lines, 'csv', known_resources=True)
+        self.assertEqual((report.rows, report.created, report.invalid), (3, 1, 2))
+        self.assertListEqual(report.errors, [(4, "Payoff isn't an integer: ''"),
+                                             (3, "Unknown resources: 3")])
+        self.assertListEqual(list(Task.objects.filter(name__startswith='t').values_list(
+            'name', 'resources')), [('t1', '1,2')])
+
+
+    def test_csv_invalid_utf8(self):
+        """Check that rows with invalid UTF-8, even in a multiline field, are only rejected."""
+        lines = io.BytesIO(b'name,payoff,resources\nt1,1,1\n\xff\xfe,1,1\nt2,1,"1,\n\xff"\n'
+                           b't3,1,2\n')
+        report = ingest(lines, 'csv')
+        self.assertEqual((report.rows, report.created, report.invalid), (4, 2, 2))
+        self.assertListEqual(report.errors, [(3, "Invalid UTF-8"), (5, "Invalid UTF-8")])
+        self.assertListEqual(list(Task.objects.filter(name__startswith='t').values_list(
+            'name', flat=True)), ['t1', 't3'])
+
+class IngestAPITestCase(TestCase):
+    url = '/api/ingest/'
+
+    def test_only_admins(self):
+        response = self.client.post(self.url, b''.join(ndjson(
+            {'name': 't1', 'payoff': 10, 'resources': '1'})), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Task.objects.exists())
+
+    def test_post_stream(self):
+        self.client.force_login(User.objects.create_superuser('admin', '', 'admin'))
+        response = self.client.post(self.url, b''.join(ndjson(
+            {'name': 't1', 'payoff': 10, 'resources': '1'},
+            {'name': 't1', 'payoff': 10, 'resources': '1'})),
+            content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['rows'], data['created'], data['duplicates']), (2, 1, 1))
+        response = self.client.post(self.url, b'name,payoff,resources\nt2,1,2\n',
+                                    content_type='text/csv; charset=utf-8')
+        self.assertEqual(response.json()['created'], 1)
+        response = self.client.post(self.url, b'name,payoff,resources\n\xff,1,2\n',
+                                    content_type='text/csv; charset=utf-8')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['invalid'], 1)
+        self.assertListEqual(list(Task.objects.values_list('name', flat=True)), ['t1', 't2'])
+
+
+class IngestCommandTestCase(TestCase):
+    def test_ingest_files(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'tasks.csv')
+            with open(path, 'w') as tasks:
+                tasks.write('name,payoff,resources\nt1,1,1\nt2,x,1\n')
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('ingest_tasks', path, stdout=stdout, stderr=stderr)
+        self.assertIn('2 rows, 1 tasks created, 0 duplicates, 1 invalid', stdout.getvalue())
+        self.assertIn("tasks.csv:3: Payoff isn't an integer: 'x'", stderr.getvalue())
+        self.assertTrue(Task.objects.filter(name='t1').exists())
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+from django.test import TestCase
+
+from simulator.journal import (ASSIGNED, FINISHED, QUEUED, REGISTERED, StateStore, TaskRecord,
+                               restored_tasks, task_record)
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class StateStoreTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.t1 = task_record(FakeTask('t1', 10, '1,2'))
+        self.t2 = task_record(FakeTask('t2', 5, '3'))
+        self.t3 = task_record(FakeTask('t3', 1, '4'))
+
+    def fill(self, store):
+        store.restore()
+        store.append((REGISTERED, 's1', ['1', '2', '3']))
+        store.append((QUEUED, [self.t1, self.t2, self.t3]))
+        store.append((ASSIGNED, [('s1', self.t1), ('s1', self.t2)]))
+        store.append((FINISHED, 's1', ['t1']))
+
+    def assertRestored(self, state):
+        self.assertDictEqual(state.satellites, {'s1': ['1', '2', '3']})
+        self.assertDictEqual(state.assigned, {'s1': [self.t2]})
+        self.assertListEqual(list(state.queued.elements()), [self.t3])
+        self.assertEqual(len(state), 1)
+
+    def test_task_record(self):
+        """Check that tasks are kept with their id and comma separated resources, and restored
+        as `TaskRecord`.
+        """
+        self.assertTupleEqual(self.t1, (None, 't1', 10, '1,2'))
+        restored = restored_tasks([self.t1, FakeTask('t4', 1, '5')])
+        self.assertEqual(restored[0], TaskRecord(None, 't1', 10, '1,2'))
+        self.assertEqual(restored[0].name, 't1')
+        self.assertEqual(restored[1], FakeTask('t4', 1, '5'))
+        self.assertIs(type(task_record(restored[0])), tuple)
+
+    def test_restore_replays_journal(self):
+        """Check that the state is restored from the journal, and from the snapshot that
+        replaces it.
+        """
+        self.fill(StateStore(self.directory))
+        self.assertRestored(StateStore(self.directory).restore())
+        store = StateStore(self.directory)
+        store.restore()
+        store.close()
+        store = StateStore(self.directory)
+        state = store.restore()
+        self.assertRestored(state)
+        self.assertEqual(store.records, 1)  # Just the generation of the snapshot
+
+    def test_snapshot_every(self):
+        """Check that the journal starts again after `snapshot_every` records."""
+        store = StateStore(self.directory, snapshot_every=3)
+        self.fill(store)
+        self.assertEqual(store.records, 1)  # Snapshot on the 2nd and 4th, plus the generation
+        self.assertRestored(StateStore(self.directory).restore())
+
+    def test_cut_record_ends_journal(self):
+        """Check that a record cut by a crash is dropped, and the next ones are kept."""
+        self.fill(StateStore(self.directory))
+        path = os.path.join(self.directory, 'journal')
+        with open(path, 'ab') as journal:
+            journal.write(b'\x80\x05\x95')
+        store = StateStore(self.directory)
+        self.assertRestored(store.restore())
+        store.append((FINISHED, 's1', ['t2']))
+        self.assertDictEqual(StateStore(self.directory).restore().assigned, {})
+
+    def test_journal_of_previous_snapshot_is_ignored(self):
+        """Check that the records of a journal already in the snapshot aren't applied again."""
+        store = StateStore(self.directory)
+        self.fill(store)
+        with open(store.journal_path, 'rb') as journal:
+            previous = journal.read()
+        store.close()
+        with open(store.journal_path, 'wb') as journal:
+            journal.write(previous)  # As if it crashed before starting the journal again
+        self.assertRestored(StateStore(self.directory).restore())
@@ -0,0 +1,65 @@
+import random
+from collections import defaultdict
+
+from django.test import TestCase
+
+from simulator.matching import ResourceIndex
+
+
+class ResourceIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = ResourceIndex()
+        self.index.add_client('c1', ['1', '2', '3'])
+        self.index.add_client('c2', ['2', '3', '4'])
+
+    def test_candidates_requires_all_resources(self):
+        """Check that only clients with all required resources are candidates."""
+        self.assertListEqual(list(self.index.iter_candidates(['2', '3'])), ['c1', 'c2'])
+        self.assertListEqual(list(self.index.iter_candidates(['1', '3'])), ['c1'])
+        self.assertListEqual(list(self.index.iter_candidates(['1', '4'])), [])
+        self.assertIsNone(self.index.first_candidate(['unknown']))
+
+    def test_allocate_and_release(self):
+        """Check that allocated resources aren't available until they are released."""
+        self.index.allocate('c1', ['2', '3'])
+        self.assertEqual(self.index.first_candidate(['2', '3']), 'c2')
+        self.assertSetEqual(self.index.clients_with('1'), {'c1'})
+        self.assertListEqual(self.index.available_resources('c1'), ['1'])
+        self.index.release('c1', ['2', '3', '4'])  # '4' isn't owned by c1
+        self.assertEqual(self.index.first_candidate(['2', '3']), 'c1')
+        self.assertSetEqual(self.index.clients_with('4'), {'c2'})
+
+    def test_remove_client_frees_slot(self):
+        """Check that a removed client isn't a candidate anymore and its slot is reused."""
+        self.index.remove_client('c1')
+        self.assertNotIn('c1', self.index)
+        self.assertSetEqual(self.index.clients_with('2'), {'c2'})
+        self.index.add_client('c3', ['1'])
+        self.assertEqual(self.index.client_slots['c3'], 0)
+        self.assertEqual(self.index.first_candidate(['1']), 'c3')
+
+    def test_matches_set_based_greedy(self):
+        """Check that the index assigns the same tasks as the set intersection greedy."""
+        rnd = random.Random(7)
+        universe = [str(r) for r in range(30)]
+        clients = ['c%d' % i for i in range(50)]
+        client_resources = {c: rnd.sample(universe, 8) for c in clients}
+        tasks = [rnd.sample(universe, rnd.randint(1, 3)) for _ in range(200)]
+
+        index = ResourceIndex()
+        resources_by_clients = defaultdict(set)
+        for c in clients:
+            index.add_client(c, client_resources[c])
+            for res in client_resources[c]:
+                resources_by_clients[res].add(c)
+
+        for task_resources in tasks:
+            available = set(clients)
+            for res in task_resources:
+                available &= resources_by_clients[res]
+            expected = min(available, key=clients.index) if available else None
+            self.assertEqual(index.first_candidate(task_resources), expected)
+            if expected is not None:
+                index.allocate(expected, task_resources)
+                for res in task_resources:
+                    resources_by_clients[res].remove(expected)
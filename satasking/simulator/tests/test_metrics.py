@@ -0,0 +1,107 @@
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.test import TestCase
+
+from simulator import metrics
+from simulator.ground_station import GroundStationServer
+from simulator.satellite import SatelliteClient
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class FakeClient:
+    def new_tasks_available(self, tasks):
+        pass
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        """Check that counters add the amounts by label values."""
+        counter = metrics.Counter('requests_total', "Requests.", labels=('code',),
+                                  registry=self.registry)
+        counter.inc(labels=('200',))
+        counter.inc(2, labels=('200',))
+        counter.inc(labels=('500',))
+        self.assertDictEqual(counter.snapshot(), {'200': 3, '500': 1})
+        self.assertIn('requests_total{code="200"} 3', metrics.render(registry=self.registry))
+
+    def test_histogram(self):
+        """Check that histograms count the observations by bucket, cumulative when read."""
+        histogram = metrics.Histogram('latency_seconds', "Latency.", buckets=(0.1, 1.0),
+                                      registry=self.registry)
+        for value in (0.05, 0.5, 0.7, 5.0):
+            histogram.observe(value)
+        summary = histogram.snapshot()
+        self.assertEqual(summary['count'], 4)
+        self.assertAlmostEqual(summary['sum'], 6.25)
+        self.assertDictEqual(summary['buckets'], {0.1: 1, 1.0: 3, float('inf'): 4})
+        text = metrics.render(registry=self.registry)
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count 4', text)
+
+    def test_disabled_registry(self):
+        """Check that nothing is recorded while the registry is disabled."""
+        counter = metrics.Counter('requests_total', "Requests.", registry=self.registry)
+        histogram = metrics.Histogram('latency_seconds', "Latency.", registry=self.registry)
+        self.registry.enabled = False
+        counter.inc()
+        with histogram.time():
+            pass
+        self.assertEqual(counter.snapshot(), 0)
+        self.assertEqual(histogram.snapshot()['count'], 0)
+
+    def test_dispatch_metrics(self):
+        """Check that dispatches record the tasks assigned, the phases and the utilization."""
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.addCleanup(gss.server_close)
+        gss.update_resources(FakeClient(), ['1', '2', '3', '4'], 's1')
+        before = metrics.snapshot(gss)
+        gss.dispatch_tasks([FakeTask('t1', 10, '1,2'), FakeTask('t2', 10, '5')])
+        after = metrics.snapshot(gss)
+        self.assertEqual(after['satasking_tasks_assigned_total'] -
+                         before['satasking_tasks_assigned_total'], 1)
+        self.assertEqual(after['satasking_tasks_unassigned_total'] -
+                         before['satasking_tasks_unassigned_total'], 1)
+        phases = after['satasking_dispatch_phase_seconds']
+        for phase in ('snapshot', 'solve', 'commit', 'send'):
+            count = before['satasking_dispatch_phase_seconds'].get(phase, {'count': 0})['count']
+            self.assertEqual(phases[phase]['count'] - count, 1)
+        self.assertEqual(after['satasking_clients_registered'], 1)
+        self.assertEqual(after['satasking_resources_total'], 4)
+        self.assertEqual(after['satasking_resources_available'], 2)
+        self.assertEqual(after['satasking_resource_utilization'], 0.5)
+
+    def test_connection_metrics(self):
+        """Check that the bytes and messages exchanged with each client are counted."""
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        th_server = threading.Thread(target=gss.serve_forever)
+        th_server.start()
+
+        def stop_server():
+            gss.shutdown()
+            th_server.join()
+            gss.server_close()
+        self.addCleanup(stop_server)
+        client = SatelliteClient(gss.server_address[0], gss.server_address[1], '1,2', 's1')
+        client.init_client()
+        self.addCleanup(client.stop)
+        self.assertGreaterEqual(metrics.snapshot()['satasking_satellite_messages_sent_total'], 2)
+        stats = metrics.connections(gss)['s1']
+        self.assertEqual(stats['messages_received'], 2)  # Ping and resources
+        self.assertEqual(stats['messages_sent'], 2)  # Pong and ok
+        self.assertGreater(stats['bytes_received'], 0)
+        self.assertGreater(stats['bytes_sent'], 0)
+
+    def test_metrics_endpoint(self):
+        """Check that the metrics are served in the Prometheus text format."""
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'# TYPE satasking_tasks_assigned_total counter', response.content)
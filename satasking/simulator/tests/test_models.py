@@ -1,9 +1,15 @@
-from unittest.mock import patch
+import os
+import socket
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
 from django.test import TestCase
 
-from simulator.models import GroundStation, Satellite
+from simulator.cluster import hash_ring
+from simulator.models import (GroundStation, Resource, Satellite, SatelliteHour, Task,
+                              TaskExecution, link_resources, save_executions)
 
 
 class GroundStationModelTestCase(TestCase):
@@ -28,6 +34,17 @@ class GroundStationModelTestCase(TestCase):
                 gs.run()
         self.assertIsNotNone(settings.SERVER)
 
+    def test_run_asyncio_server_mode(self):
+        """Check that run() method starts the server class of the chosen mode."""
+        gs = GroundStation.objects.create(server_mode=GroundStation.ASYNCIO)
+        with patch('simulator.models.AsyncGroundStationServer') as aio_mock:
+            with patch('simulator.models.GroundStationServer') as gs_mock:
+                with patch('simulator.models.threading') as th_mock:
+                    gs.run()
+        self.assertEqual(aio_mock.call_count, 1)
+        self.assertEqual(gs_mock.call_count, 0)
+        self.assertIs(settings.SERVER, aio_mock.return_value)
+
     def test_run_cant_run_twice(self):
         """Check that if a server is currenctly running, then you cant run other instance."""
         gs = GroundStation.objects.create()
@@ -42,6 +59,127 @@ class GroundStationModelTestCase(TestCase):
                 gs.run()  # This call should print a log message
                 self.assertEqual(th_mock.call_count, 0)  # Here th_mock differs from previous mock
 
+    def test_run_after_stale_running_flag(self):
+        """Check that a server marked as running by a process that died can run again."""
+        gs = GroundStation.objects.create()
+        GroundStation.objects.update(running=True)
+        gs.refresh_from_db()
+        with patch('simulator.models.GroundStationServer') as gs_mock:
+            with patch('simulator.models.threading') as th_mock:
+                gs.run()
+        self.assertEqual(th_mock.Thread.return_value.start.call_count, 1)
+        self.assertIs(settings.SERVER, gs_mock.return_value)
+
+    def test_run_listening_in_another_process(self):
+        """Check that a server listening in the address, like the one of another process, isn't
+        run again, and that it's not run if the address is in use.
+        """
+        listener = socket.socket()
+        self.addCleanup(listener.close)
+        listener.bind((settings.DEFAULT_SERVER_HOSTNAME, 0))
+        listener.listen()
+        gs = GroundStation.objects.create(port=listener.getsockname()[1], running=True)
+        self.assertTrue(gs.alive)
+        with patch('simulator.models.threading') as th_mock:
+            gs.run()
+            self.assertEqual(th_mock.Thread.call_count, 0)
+        GroundStation.objects.update(running=False)
+        gs.refresh_from_db()
+        with self.assertLogs('simulator.models', 'ERROR'):
+            gs.run()
+        self.assertIsNone(settings.SERVER)
+        self.assertFalse(GroundStation.objects.get().running)
+
+    def test_run_nodes(self):
+        """Check that run() method starts a `Coordinator` of the nodes in settings."""
+        gs = GroundStation.objects.create(port=9000)
+        with self.settings(GROUND_STATION_NODES=3):
+            with patch('simulator.models.Coordinator') as coordinator_mock:
+                with patch('simulator.models.threading') as th_mock:
+                    gs.run()
+            self.assertIs(settings.SERVER, coordinator_mock.return_value)
+        coordinator_mock.assert_called_once_with(gs.hostname, 9000, 3, GroundStation.THREADED,
+                                                 on_dispatch=save_executions)
+
+    def test_scheduler_saves_executions(self):
+        """Check that the tasks dispatched by the scheduler of the server, as they arrive and
+        when they fail, are saved as executions.
+        """
+        gs = GroundStation.objects.create(port=0)
+        sat = Satellite.objects.create(resources="1,2", name="s1")
+        t1 = Task.objects.create(name="t1", payoff=3, resources="1,2")
+        with self.settings(DISPATCH_WINDOW=0):
+            server = gs.create_server()
+        self.addCleanup(server.server_close)
+        client = MagicMock(name='c1')
+        server.update_resources(client, ['1', '2'], 's1')
+        server.submit_tasks([t1])
+        self.assertListEqual(list(TaskExecution.objects.values_list('task_id', 'satellite_id')),
+                             [(t1.pk, sat.pk)])
+        server.task_failed(client, 't1')  # Dispatched again to the same satellite
+        self.assertEqual(TaskExecution.objects.filter(task=t1, satellite=sat).count(), 2)
+        self.assertListEqual(list(SatelliteHour.objects.values_list('executions', 'payoff')),
+                             [(2, 6)])
+
+    def test_dispatch_tasks_bulk_creates_executions(self):
+        """Check that the executions are saved with the same amount of queries for any amount of
+        dispatched tasks, and that tasks with the same name are told apart.
+        """
+        gs = GroundStation.objects.create()
+        satellites = [Satellite.objects.create(resources="1", name="s%d" % i) for i in range(3)]
+        tasks = [Task.objects.create(name="t%d" % (i % 50), payoff=1, resources="1")
+                 for i in range(100)]
+        settings.SERVER = MagicMock()
+        settings.SERVER.dispatch_assignments.return_value = [
+            (task, satellites[i % 3].name) for i, task in enumerate(tasks)]
+        # Satellites, savepoint, insert, rollups, insert rollups, release savepoint, version
+        with self.assertNumQueries(7):
+            executions = gs.dispatch_tasks(tasks, solver='density')
+        settings.SERVER.dispatch_assignments.assert_called_once_with(tasks, solver='density')
+        self.assertEqual(len(executions), 100)
+        self.assertSetEqual(
+            set(TaskExecution.objects.values_list('task_id', 'satellite__name')),
+            {(task.pk, satellites[i % 3].name) for i, task in enumerate(tasks)})
+
+    def test_daemon(self):
+        """Check that with a control socket the daemon is started, dispatches and is stopped
+        through the control channel.
+        """
+        gs = GroundStation.objects.create()
+        t1 = Task.objects.create(name="t1", payoff=1, resources="1")
+        sat = Satellite.objects.create(resources="1", name="s1")
+        with self.settings(GROUND_STATION_SOCKET='/tmp/gs.sock'):
+            with patch('simulator.models.ControlClient') as control_mock:
+                control_mock.return_value.ping.side_effect = [False, True]
+                with patch('simulator.models.subprocess') as subprocess_mock:
+                    gs.run()
+                self.assertEqual(subprocess_mock.Popen.call_args[0][0][-1], 'run_ground_station')
+                control_mock.assert_called_with('/tmp/gs.sock')
+                self.assertIsNone(settings.SERVER)
+
+                control_mock.return_value.dispatch_assignments.return_value = [(t1, "s1")]
+                gs.dispatch_tasks([t1])
+                self.assertListEqual(
+                    list(TaskExecution.objects.values_list('task_id', 'satellite_id')),
+                    [(t1.pk, sat.pk)])
+
+                gs.running = True
+                gs.stop()
+                self.assertEqual(control_mock.return_value.stop.call_count, 1)
+                self.assertFalse(GroundStation.objects.get().running)
+
+    def test_dispatch_tasks_skips_unknown_satellites(self):
+        """Check that tasks dispatched to clients without a `Satellite` aren't saved."""
+        gs = GroundStation.objects.create()
+        sat = Satellite.objects.create(resources="1", name="s1")
+        t1 = Task.objects.create(name="t1", payoff=1, resources="1")
+        t2 = Task.objects.create(name="t2", payoff=1, resources="1")
+        settings.SERVER = MagicMock()
+        settings.SERVER.dispatch_assignments.return_value = [(t1, "s1"), (t2, "unknown")]
+        gs.dispatch_tasks([t1, t2])
+        self.assertListEqual(list(TaskExecution.objects.values_list('task_id', 'satellite_id')),
+                             [(t1.pk, sat.pk)])
+
 
 class SatelliteModelTestCase(TestCase):
     def setUp(self):
@@ -85,3 +223,85 @@ class SatelliteModelTestCase(TestCase):
                 sat.run()  # This call should print a log message
                 self.assertEqual(th_mock.call_count, 0)  # Here th_mock differs from previous mock
         self.assertLess(len(settings.SATELLITES), 2)
+
+
+    def test_run_after_stale_running_flag(self):
+        """Check that a satellite marked as running by a process that died can run again."""
+        sat = Satellite.objects.create(resources="1", name="Coso", running=True)
+        self.assertFalse(sat.alive)
+        with patch('simulator.models.SatelliteClient') as sat_mock:
+            with patch('simulator.models.threading') as th_mock:
+                sat.run()
+        self.assertEqual(th_mock.Thread.return_value.start.call_count, 1)
+        self.assertTrue(sat.alive)
+        self.assertEqual(Satellite.objects.get().pid, os.getpid())
+
+    def test_alive_in_another_process(self):
+        """Check that a satellite is alive while the process that runs it is."""
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        sat = Satellite.objects.create(resources="1", name="Coso", running=True, pid=process.pid)
+        self.assertTrue(sat.alive)
+        with patch('simulator.models.threading') as th_mock:
+            sat.run()
+            self.assertEqual(th_mock.Thread.call_count, 0)
+        process.kill()
+        process.wait()
+        self.assertFalse(sat.alive)
+
+    def test_address_of_its_node(self):
+        """Check that satellites connect to the node of their shard when there are nodes."""
+        sat = Satellite.objects.create(resources="1", name="Coso", port=9000)
+        self.assertTupleEqual(sat.address, (sat.hostname, 9000))
+        with self.settings(GROUND_STATION_NODES=2):
+            self.assertTupleEqual(sat.address,
+                                  (sat.hostname, 9000 + hash_ring(2).node_for("Coso")))
+
+
+class ResourceModelTestCase(TestCase):
+    def setUp(self):
+        self.s1 = Satellite.objects.create(resources="1,2,3", name="s1")
+        self.s2 = Satellite.objects.create(resources="2,3,4", name="s2")
+        self.t1 = Task.objects.create(name="t1", payoff=1, resources="1,2")
+        self.t2 = Task.objects.create(name="t2", payoff=1, resources="2, 3,3")
+        self.t3 = Task.objects.create(name="t3", payoff=1, resources="4,5")
+
+    def test_save_links_resources(self):
+        """Check that saving links the resources of the comma separated field, and relinks them
+        only when they change.
+        """
+        self.assertSetEqual(set(Resource.objects.values_list('name', flat=True)),
+                            {'1', '2', '3', '4', '5'})
+        self.assertSetEqual(set(self.t2.resource_set.values_list('name', flat=True)), {'2', '3'})
+        self.s1.running = True
+        with self.assertNumQueries(1):
+            self.s1.save()
+        self.s1.resources = "1,5"
+        self.s1.save()
+        self.assertSetEqual(set(Satellite.objects.get(pk=self.s1.pk).resource_set.values_list(
+            'name', flat=True)), {'1', '5'})
+
+    def test_link_resources_after_bulk_create(self):
+        """Check that objects inserted in bulk are linked with a few queries."""
+        Task.objects.bulk_create([Task(name="b%d" % i, payoff=1, resources="%d,9" % i)
+                                  for i in range(50)])
+        tasks = list(Task.objects.filter(name__startswith="b"))
+        # Resources, insert missing, new ones ids, savepoint, delete, insert links, release
+        with self.assertNumQueries(7):
+            link_resources(tasks)
+        self.assertEqual(Task.objects.requiring('9').count(), 50)
+
+    def test_querysets(self):
+        """Check the queries of tasks requiring resources and satellites able to run them."""
+        self.assertSetEqual(set(Task.objects.requiring('2')), {self.t1, self.t2})
+        self.assertSetEqual(set(Task.objects.requiring('2', '3')), {self.t2})
+        self.assertSetEqual(set(Satellite.objects.with_resources('3', '4')), {self.s2})
+        self.assertSetEqual(set(Satellite.objects.able_to_run(self.t1)), {self.s1})
+        self.assertSetEqual(set(Satellite.objects.able_to_run(self.t2)), {self.s1, self.s2})
+        self.assertSetEqual(set(Satellite.objects.able_to_run(self.t3)), set())
+        self.assertSetEqual(set(Task.objects.runnable_by(self.s2)), {self.t2})
+        with self.assertNumQueries(2):
+            candidates = Task.objects.all().candidates()
+        self.assertDictEqual(candidates, {self.t1.pk: {'s1'}, self.t2.pk: {'s1', 's2'},
+                                          self.t3.pk: set()})
@@ -0,0 +1,89 @@
+from django.test import TestCase
+
+from simulator.messages import (MSG_BATCH, MSG_FRAMED, TYPE_ACK, TYPE_DISCONNECT, TYPE_DONE,
+                                TYPE_HEARTBEAT, TYPE_NACK, TYPE_OK, TYPE_PING, TYPE_PONG,
+                                TYPE_RESOURCES, TYPE_RESUME, TYPE_TASK, TYPE_TASK_BATCH)
+from simulator.protocol import FramedProtocol, TextProtocol, pack_varint, unpack_varint
+
+
+MESSAGES = [
+    (TYPE_PING, ([MSG_FRAMED, MSG_BATCH],)),
+    (TYPE_PONG, ([],)),
+    (TYPE_OK, ()),
+    (TYPE_DISCONNECT, ()),
+    (TYPE_RESOURCES, (['1', '2', '3'], 'sat-1')),
+    (TYPE_TASK, ('t1', 10, ['1', '2'])),
+    (TYPE_TASK_BATCH, ([('t1', 10, ['1', '2']), ('t2', 5, ['3'])],)),
+    (TYPE_ACK, ('t1',)),
+    (TYPE_NACK, ('t::t1',)),
+    (TYPE_DONE, ('t1',)),
+    (TYPE_HEARTBEAT, ()),
+]
+
+
+class TextProtocolTestCase(TestCase):
+    def test_roundtrip(self):
+        """Check that every message type is decoded as it was encoded."""
+        protocol = TextProtocol()
+        for kind, fields in MESSAGES:
+            self.assertListEqual(protocol.feed(protocol.encode(kind, *fields)), [(kind, fields)])
+
+    def test_legacy_messages(self):
+        """Check that the messages of the original protocol keep the same format."""
+        protocol = TextProtocol()
+        self.assertEqual(protocol.encode(TYPE_PING, []), b'hello')
+        self.assertEqual(protocol.encode(TYPE_RESOURCES, ['1', '2'], 's1'), b'::r::1,2::s1')
+        self.assertEqual(protocol.encode(TYPE_TASK, 't1', 10, ['1']), b'::t::t1::10::1')
+        self.assertListEqual(protocol.feed(b'unknown'), [])
+
+
+class FramedProtocolTestCase(TestCase):
+    def test_roundtrip(self):
+        """Check that every message type is decoded as it was encoded."""
+        protocol = FramedProtocol()
+        for kind, fields in MESSAGES:
+            self.assertListEqual(protocol.feed(protocol.encode(kind, *fields)), [(kind, fields)])
+
+    def test_coalesced_frames(self):
+        """Check that several frames received together are all decoded."""
+        protocol = FramedProtocol()
+        data = b''.join(protocol.encode(kind, *fields) for kind, fields in MESSAGES)
+        self.assertListEqual(protocol.feed(data), MESSAGES)
+        self.assertEqual(len(protocol.buffer), 0)
+
+    def test_partial_frames(self):
+        """Check that frames split in several reads are decoded once complete."""
+        protocol = FramedProtocol()
+        messages = [MESSAGES[4], (TYPE_TASK, ('t' * 2000, 10, [str(r) for r in range(500)]))]
+        data = b''.join(protocol.encode(kind, *fields) for kind, fields in messages)
+        received = []
+        for start in range(0, len(data), 7):
+            received.extend(protocol.feed(data[start:start + 7]))
+        self.assertListEqual(received, messages)
+        self.assertEqual(len(protocol.buffer), 0)
+
+    def test_long_fields(self):
+        """Check that strings and lists longer than 64KB are encoded and decoded."""
+        protocol = FramedProtocol()
+        names = ['task-%d' % idx for idx in range(20000)]
+        messages = [(TYPE_RESUME, (names,)), (TYPE_RESOURCES, ([str(r) for r in range(20000)],
+                                                               's' * 70000))]
+        data = b''.join(protocol.encode(kind, *fields) for kind, fields in messages)
+        self.assertListEqual(protocol.feed(data), messages)
+
+    def test_varints(self):
+        """Check that unsigned ints are packed in the least bytes and unpacked back."""
+        for value, size in [(0, 1), (127, 1), (128, 2), (16383, 2), (16384, 3), (2 ** 32, 5)]:
+            data = pack_varint(value)
+            self.assertEqual(len(data), size)
+            self.assertTupleEqual(unpack_varint(b'x' + data, 1), (value, 1 + size))
+        with self.assertRaises(IndexError):
+            unpack_varint(pack_varint(300)[:1], 0)
+
+    def test_smaller_than_text(self):
+        """Check that the messages take less bytes than in the text protocol."""
+        framed, text = FramedProtocol(), TextProtocol()
+        task = (TYPE_TASK, ('task-1', 10, ['1', '2', '3', '4']))
+        self.assertLess(len(framed.encode(task[0], *task[1])), len(text.encode(task[0], *task[1])))
+        self.assertLess(sum(len(framed.encode(kind, *fields)) for kind, fields in MESSAGES),
+                        sum(len(text.encode(kind, *fields)) for kind, fields in MESSAGES))
@@ -0,0 +1,151 @@
+import random
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.test import TestCase
+
+from simulator.ground_station import GroundStationServer
+from simulator.registry import ClientRegistry
+from simulator.solvers import task_resources
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class FakeClient:
+    """Stand in for a handler, it keeps the tasks sent."""
+
+    def __init__(self, name):
+        self.name = name
+        self.received = []
+
+    def new_tasks_available(self, tasks):
+        self.received.extend(tasks)
+
+
+class ClientRegistryTestCase(TestCase):
+    def test_servers_dont_share_clients(self):
+        """Check that each server has its own clients."""
+        gss1 = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        gss2 = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.addCleanup(gss1.server_close)
+        self.addCleanup(gss2.server_close)
+        gss1.update_resources(FakeClient('c1'), ['1'], 's1')
+        self.assertEqual(len(gss1.clients), 1)
+        self.assertEqual(len(gss2.clients), 0)
+
+    def test_register_again_keeps_tasks(self):
+        """Check that a client that sends its resources again keeps its tasks allocated."""
+        registry = ClientRegistry()
+        client = FakeClient('c1')
+        registry.register(client, ['1', '2', '3'], 's1')
+        task = FakeTask('t1', 1, '1,2')
+        registry.commit([(task, client)])
+        registry.register(client, ['1', '2', '3', '4'], 's1')
+        self.assertListEqual(registry[client]['tasks'], [task])
+        self.assertListEqual(sorted(registry.index.available_resources(client)), ['3', '4'])
+        self.assertListEqual(registry.commit([(FakeTask('t2', 1, '1'), client)]), [])
+
+    def test_release_tasks(self):
+        """Check that released tasks are unassigned and their resources available again."""
+        registry = ClientRegistry()
+        client = FakeClient('c1')
+        registry.register(client, ['1', '2', '3'], 's1')
+        t1, t2 = FakeTask('t', 1, '1'), FakeTask('t', 1, '2')
+        registry.commit([(t1, client), (t2, client)])
+        registry.release(client, [t2])
+        self.assertListEqual(registry[client]['tasks'], [t1])
+        self.assertListEqual(sorted(registry.index.available_resources(client)), ['2', '3'])
+
+    def test_commit_skips_changed_clients(self):
+        """Check that assignments solved over a snapshot are skipped if the client left or lost
+        the resources meanwhile.
+        """
+        registry = ClientRegistry()
+        registry.register('c1', ['1', '2'], 's1')
+        registry.register('c2', ['1', '2'], 's2')
+        snapshot = registry.snapshot()
+        t1, t2, t3 = FakeTask('t1', 1, '1'), FakeTask('t2', 1, '1'), FakeTask('t3', 1, '2')
+        registry.commit([(t1, 'c1')])  # Made by other dispatch meanwhile
+        registry.remove('c2')
+        self.assertTrue(snapshot.has_available('c1', ['1']))
+        committed = registry.commit([(t2, 'c1'), (t3, 'c2'), (t3, 'c1')])
+        self.assertListEqual(committed, [(t3, 'c1', 's1')])
+        self.assertListEqual(registry['c1']['tasks'], [t1, t3])
+        self.assertIs(registry.finish('c1', 't1'), t1)
+        self.assertIsNone(registry.finish('c1', 't1'))
+        self.assertListEqual(registry.index.available_resources('c1'), ['1'])
+
+    def assertConsistent(self, registry):
+        """Check that the index agrees with the registered clients and their tasks."""
+        with registry.lock:
+            registered = [c for c in registry if 'name' in registry[c]]
+            self.assertSetEqual(set(registry.index.client_slots), set(registered))
+            for client in registered:
+                info = registry[client]
+                busy = 0
+                for task in info['tasks']:
+                    mask = registry.index.resource_mask(task_resources(task))
+                    self.assertTrue(set(task_resources(task)) <= set(info['resources']))
+                    self.assertEqual(busy & mask, 0, "Tasks share resources")
+                    busy |= mask
+                self.assertEqual(registry.index.owned[client],
+                                 registry.index.resource_mask(info['resources']))
+                self.assertEqual(registry.index.available[client],
+                                 registry.index.owned[client] & ~busy)
+
+    def test_concurrent_joins_leaves_and_dispatches(self):
+        """Stress the server with clients joining, leaving and finishing tasks while tasks are
+        dispatched from other threads, checking the registry invariants.
+        """
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        self.addCleanup(gss.server_close)
+        universe = [str(r) for r in range(20)]
+        errors = []
+        created, dispatched = [], []
+
+        def worker(seed):
+            rnd = random.Random(seed)
+            try:
+                for step in range(300):
+                    action = rnd.random()
+                    if action < 0.3:
+                        client = FakeClient('c{}-{}'.format(seed, step))
+                        created.append(client)
+                        gss.clients.connect(client, ('localhost', step))
+                        gss.update_resources(client, rnd.sample(universe, 5), client.name)
+                    elif action < 0.45:
+                        clients = list(gss.clients)
+                        if clients:
+                            gss.remove_client(rnd.choice(clients))
+                    elif action < 0.75:
+                        tasks = [FakeTask('t{}-{}-{}'.format(seed, step, idx), rnd.randint(1, 9),
+                                          ','.join(rnd.sample(universe, rnd.randint(1, 2))))
+                                 for idx in range(10)]
+                        dispatched.extend(gss.dispatch_assignments(tasks, solver='density'))
+                    else:
+                        for client in list(gss.clients):
+                            tasks = list(gss.clients.get(client, {}).get('tasks', []))
+                            if tasks:
+                                gss.task_completed(client, rnd.choice(tasks).name)
+                                break
+                    if step % 50 == 0:
+                        self.assertConsistent(gss.clients)
+            except Exception as err:  # Reported from the main thread
+                errors.append(err)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+        with self.assertLogs('simulator.ground_station'):  # Keep the dispatch logs quiet
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+        self.assertListEqual(errors, [])
+        self.assertConsistent(gss.clients)
+        # Each dispatched task was sent once, to the client it was assigned
+        received = sorted((task.name, client.name) for client in created
+                          for task in client.received)
+        self.assertListEqual(received, sorted((task.name, name) for task, name in dispatched))
+        self.assertEqual(gss.stats['dispatched'], len(dispatched))
+        self.assertGreater(gss.stats['completed'], 0)
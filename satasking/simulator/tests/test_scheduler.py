@@ -0,0 +1,141 @@
+import threading
+from collections import namedtuple
+
+from django.test import TestCase
+
+from simulator.scheduler import DispatchScheduler, Samples
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class FakeServer:
+    """Assigns the tasks whose name is in `assignable`, recording each round."""
+
+    def __init__(self, assignable):
+        self.assignable = set(assignable)
+        self.rounds = []
+        self.dispatched = threading.Event()
+
+    def _dispatch(self, tasks, solver=None):
+        self.rounds.append([task.name for task in tasks])
+        assignments = [(task, 's1') for task in tasks if task.name in self.assignable]
+        unassigned = [task for task in tasks if task.name not in self.assignable]
+        self.dispatched.set()
+        return assignments, unassigned
+
+
+class DispatchSchedulerTestCase(TestCase):
+    def setUp(self):
+        self.tasks = [
+            FakeTask('low', 1, '1,2'),
+            FakeTask('high', 10, '1'),
+            FakeTask('mid', 10, '1,2'),
+        ]
+
+    def test_rounds_by_payoff_density(self):
+        """Check that tasks are dispatched by payoff density and unassigned ones are kept."""
+        server = FakeServer(['mid'])
+        scheduler = DispatchScheduler(server)
+        scheduler.submit(self.tasks)
+        self.assertListEqual(server.rounds, [['high', 'mid', 'low']])
+        self.assertListEqual([task.name for task in scheduler.tasks], ['high', 'low'])
+        server.assignable.add('low')
+        scheduler.trigger()
+        self.assertListEqual(server.rounds[1], ['high', 'low'])
+        self.assertListEqual([task.name for task in scheduler.tasks], ['high'])
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics['queue_depth'], 1)
+        self.assertEqual(metrics['submitted'], 3)
+        self.assertEqual(metrics['dispatched'], 2)
+        self.assertEqual(metrics['rounds'], 2)
+        self.assertEqual(metrics['wait_time']['count'], 2)
+        self.assertEqual(metrics['dispatch_latency']['count'], 2)
+
+    def test_rounds_evaluate_only_affected_tasks(self):
+        """Check that a round only evaluates the tasks that require the resources made
+        available, in density order.
+        """
+        server = FakeServer([])
+        scheduler = DispatchScheduler(server)
+        scheduler.submit(self.tasks + [FakeTask('other', 5, '3')])
+        scheduler.trigger(['2'])
+        self.assertListEqual(server.rounds[1], ['mid', 'low'])
+        scheduler.trigger(['4'])
+        self.assertEqual(len(server.rounds), 2)
+        server.assignable.add('other')
+        scheduler.submit([FakeTask('new', 1, '4')], released=['3'])
+        self.assertListEqual(server.rounds[2], ['other', 'new'])
+        self.assertListEqual([task.name for task in scheduler.tasks], ['high', 'mid', 'new', 'low'])
+        self.assertEqual(scheduler.metrics()['evaluated'], 4 + 2 + 2)
+        self.assertDictEqual({res: len(orders) for res, orders in scheduler.waiting.items()},
+                             {'1': 3, '2': 2, '4': 1})
+
+    def test_triggers_during_a_round_are_evaluated_after_it(self):
+        """Check that the tasks affected while they are being evaluated get another round."""
+        server = FakeServer([])
+        scheduler = DispatchScheduler(server)
+        dispatch = server._dispatch
+
+        def release_during_round(tasks, solver=None):
+            if not server.rounds:
+                server.assignable.add('high')
+                scheduler.trigger(['1'])  # The tasks are in this round, so it's deferred
+            return dispatch(tasks, solver)
+
+        server._dispatch = release_during_round
+        scheduler.submit(self.tasks[:2])
+        self.assertListEqual(server.rounds, [['high', 'low'], ['low']])
+        self.assertListEqual([task.name for task in scheduler.tasks], ['low'])
+
+    def test_empty_queue_doesnt_dispatch(self):
+        """Check that triggers without queued tasks don't run a round."""
+        server = FakeServer([])
+        scheduler = DispatchScheduler(server)
+        scheduler.trigger()
+        self.assertListEqual(server.rounds, [])
+        self.assertEqual(scheduler.metrics()['rounds'], 0)
+
+    def test_window_batches_arrivals(self):
+        """Check that the tasks that arrive during the window are dispatched in one round."""
+        server = FakeServer(['low', 'high', 'mid'])
+        scheduler = DispatchScheduler(server, window=0.05)
+        self.addCleanup(scheduler.stop)
+        for task in self.tasks:
+            scheduler.submit([task])
+        self.assertTrue(server.dispatched.wait(5))
+        scheduler.stop()
+        self.assertListEqual(server.rounds, [['high', 'mid', 'low']])
+        self.assertEqual(len(scheduler), 0)
+
+
+    def test_on_dispatch(self):
+        """Check that the assignments of each round are given to `on_dispatch`, and that the
+        round goes on if it fails.
+        """
+        server = FakeServer(['mid'])
+        rounds = []
+
+        def on_dispatch(assignments):
+            rounds.append([(task.name, name) for task, name in assignments])
+            raise RuntimeError("Database unavailable")
+
+        scheduler = DispatchScheduler(server, on_dispatch=on_dispatch)
+        with self.assertLogs('simulator.scheduler', 'ERROR'):
+            scheduler.submit(self.tasks)
+        scheduler.trigger()  # Nothing is assigned, it isn't called
+        self.assertListEqual(rounds, [[('mid', 's1')]])
+        self.assertListEqual([task.name for task in scheduler.tasks], ['high', 'low'])
+
+class SamplesTestCase(TestCase):
+    def test_summary(self):
+        """Check the percentiles of the last values kept."""
+        samples = Samples(size=100)
+        for value in range(200):
+            samples.add(value)
+        summary = samples.summary()
+        self.assertEqual(summary['count'], 200)
+        self.assertEqual(summary['mean'], 99.5)
+        self.assertEqual(summary['p50'], 150)
+        self.assertEqual(summary['p99'], 199)
+        self.assertEqual(summary['max'], 199)
@@ -0,0 +1,105 @@
+import random
+import unittest
+from collections import namedtuple
+
+from django.test import TestCase
+
+from simulator.matching import ResourceIndex
+from simulator.solvers import (BranchAndBoundSolver, DensityGreedySolver, GreedySolver,
+                               LocalSearchSolver, VectorGreedySolver, get_solver, numpy)
+
+
+FakeTask = namedtuple('FakeTask', ['name', 'payoff', 'resources'])
+
+
+class SolversTestCase(TestCase):
+    def setUp(self):
+        # The original greedy assigns 'a' to c1 and then 'b' can't be assigned anywhere
+        self.index = ResourceIndex()
+        self.index.add_client('c1', ['1', '2', '3'])
+        self.index.add_client('c2', ['1'])
+        self.tasks = [
+            FakeTask('a', 10, '1'),
+            FakeTask('b', 16, '1,2'),
+            FakeTask('c', 7, '3'),
+        ]
+        # The density greedy only assigns 'x', but 'y' alone has a higher payoff
+        self.small_index = ResourceIndex()
+        self.small_index.add_client('c1', ['1', '2'])
+        self.small_tasks = [FakeTask('x', 10, '1'), FakeTask('y', 15, '1,2')]
+
+    def assertValidAssignments(self, result):
+        used = set()
+        for task, client in result.assignments:
+            for res in task.resources.split(','):
+                self.assertIn(res, self.index.available_resources(client))
+                self.assertNotIn((client, res), used)
+                used.add((client, res))
+
+    def test_solvers_dont_modify_index(self):
+        """Check that solving doesn't reserve resources in the server index."""
+        GreedySolver().solve(self.tasks, self.index)
+        self.assertListEqual(self.index.available_resources('c1'), ['1', '2', '3'])
+
+    def test_greedy_keeps_original_order(self):
+        """Check that the original greedy sorts by the length of the resources string."""
+        result = GreedySolver().solve(self.tasks, self.index)
+        self.assertValidAssignments(result)
+        self.assertListEqual(result.assignments, [(self.tasks[0], 'c1'), (self.tasks[2], 'c1')])
+        self.assertEqual(result.solver, 'greedy')
+        self.assertEqual(result.total_payoff, 17)
+
+    def test_density_greedy_uses_best_fit(self):
+        """Check that the density greedy chooses the client with less resources available."""
+        result = DensityGreedySolver().solve(self.tasks, self.index)
+        self.assertValidAssignments(result)
+        self.assertListEqual(result.assignments, [
+            (self.tasks[0], 'c2'), (self.tasks[1], 'c1'), (self.tasks[2], 'c1')])
+        self.assertEqual(result.total_payoff, 33)
+
+    def test_exact_finds_optimum(self):
+        """Check that branch and bound finds the assignment with maximum payoff."""
+        self.assertEqual(DensityGreedySolver().solve(self.small_tasks, self.small_index)
+                         .total_payoff, 10)
+        result = BranchAndBoundSolver().solve(self.small_tasks, self.small_index)
+        self.assertEqual(result.solver, 'exact')
+        self.assertListEqual(result.assignments, [(self.small_tasks[1], 'c1')])
+        self.assertEqual(BranchAndBoundSolver().solve(self.tasks, self.index).total_payoff, 33)
+
+    def test_local_search_improves_greedy(self):
+        """Check that local search swaps tasks when it increases the payoff."""
+        result = LocalSearchSolver().solve(self.small_tasks, self.small_index)
+        self.assertEqual(result.total_payoff, 15)
+        self.assertListEqual(result.assignments, [(self.small_tasks[1], 'c1')])
+        self.assertGreaterEqual(result.elapsed, 0)
+
+    @unittest.skipIf(numpy is None, "numpy isn't installed")
+    def test_vector_greedy_matches_greedy(self):
+        """Check that the vectorized greedy makes the same assignments as the original one, also
+        when tasks of a block compete for the same clients and have to be held back.
+        """
+        result = get_solver('vector').solve(self.tasks, self.index)
+        self.assertEqual(result.solver, 'vector')
+        self.assertListEqual(result.assignments, [(self.tasks[0], 'c1'), (self.tasks[2], 'c1')])
+
+        rnd = random.Random(7)
+        index = ResourceIndex()
+        for i in range(130):  # More than two words of clients
+            index.add_client('c%d' % i, [str(r) for r in rnd.sample(range(12), 4)])
+        index.remove_client('c3')
+        tasks = [FakeTask('t%d' % i, rnd.randint(0, 20),
+                          ','.join(str(rnd.randrange(13)) for _ in range(rnd.randint(1, 3))))
+                 for i in range(500)]
+        expected = GreedySolver().solve(tasks, index)
+        for block_size in (1, 16, 512):
+            result = VectorGreedySolver(block_size=block_size).solve(tasks, index)
+            self.assertListEqual(result.assignments, expected.assignments)
+            self.assertEqual(result.total_payoff, expected.total_payoff)
+
+    def test_get_solver(self):
+        """Check that solvers can be chosen by name or instance."""
+        solver = LocalSearchSolver(time_limit=0.1)
+        self.assertIs(get_solver(solver), solver)
+        self.assertIsInstance(get_solver('exact'), BranchAndBoundSolver)
+        with self.assertRaises(ValueError):
+            get_solver('unknown')
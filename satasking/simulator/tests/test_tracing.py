@@ -0,0 +1,98 @@
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from simulator import tracing
+from simulator.ground_station import GroundStationServer
+from simulator.messages import TYPE_ACK, TYPE_PING, TYPE_PONG, TYPE_TASK_BATCH
+from simulator.satellite import SatelliteClient
+
+
+class MessageLogTestCase(TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('simulator.tests.tracing')
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+
+    def trace_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.addCleanup(tracing.stop_trace)
+        return path
+
+    def test_inactive_below_debug(self):
+        """Check that messages aren't logged unless the logger is at DEBUG level."""
+        self.logger.setLevel(logging.INFO)
+        self.assertFalse(tracing.MessageLog(self.logger).active)
+        self.logger.setLevel(logging.DEBUG)
+        self.assertTrue(tracing.MessageLog(self.logger).active)
+
+    def test_sampling(self):
+        """Check that one of every `sample` messages is logged."""
+        self.logger.setLevel(logging.DEBUG)
+        message_log = tracing.MessageLog(self.logger, sample=3)
+        with self.assertLogs(self.logger, logging.DEBUG) as logs:
+            for idx in range(7):
+                message_log.log(tracing.SENT, 's1', 'gs', TYPE_ACK, ('t%d' % idx,))
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("t2", logs.output[0])
+        self.assertIn("t5", logs.output[1])
+
+    def test_trace_formats(self):
+        """Check that both trace formats record every message, without logging them."""
+        self.logger.setLevel(logging.INFO)
+        for format in sorted(tracing.SINKS):
+            path = self.trace_file()
+            tracing.start_trace(path, format)
+            message_log = tracing.MessageLog(self.logger)
+            self.assertTrue(message_log.active)
+            message_log.log(tracing.SENT, 's1', 'localhost:1', TYPE_ACK, ('t1',))
+            message_log.log(tracing.RECEIVED, 's1', 'localhost:1', TYPE_TASK_BATCH,
+                            ([('t1', 1, ['1']), ('t2', 1, ['2'])],))
+            tracing.stop_trace()
+            records = [(r['direction'], r['node'], r['peer'], r['kind'], r['detail'])
+                       for r in tracing.read_trace(path, format)]
+            self.assertListEqual(records, [
+                (tracing.SENT, 's1', 'localhost:1', TYPE_ACK, 't1'),
+                (tracing.RECEIVED, 's1', 'localhost:1', TYPE_TASK_BATCH, '2'),
+            ])
+
+    def test_trace_connection(self):
+        """Check that the messages of the handshake are traced by both sides."""
+        path = self.trace_file()
+        tracing.start_trace(path)
+        gss = GroundStationServer(settings.DEFAULT_SERVER_HOSTNAME, 0)
+        th_server = threading.Thread(target=gss.serve_forever)
+        th_server.start()
+        client = SatelliteClient(gss.server_address[0], gss.server_address[1], '1', 's1')
+        client.init_client()
+        client.stop()
+        gss.shutdown()
+        th_server.join()
+        gss.server_close()
+        tracing.stop_trace()
+        records = [(r['node'], r['direction'], r['kind']) for r in tracing.read_trace(path)]
+        self.assertIn(('s1', tracing.SENT, TYPE_PING), records)
+        self.assertIn(('ground-station', tracing.RECEIVED, TYPE_PING), records)
+        self.assertIn(('ground-station', tracing.SENT, TYPE_PONG), records)
+        self.assertIn(('s1', tracing.RECEIVED, TYPE_PONG), records)
+
+    @override_settings(DEBUG=True)
+    def test_setup_logging_once(self):
+        """Check that the console handler is added once, no matter the instances created."""
+        simulator_logger = logging.getLogger('simulator')
+        handlers, level = list(simulator_logger.handlers), simulator_logger.level
+
+        def restore():
+            simulator_logger.handlers = handlers
+            simulator_logger.setLevel(level)
+        self.addCleanup(restore)
+        simulator_logger.handlers = []
+        for idx in range(3):
+            SatelliteClient('localhost', 0, '1', 's%d' % idx)
+        self.assertEqual(len(simulator_logger.handlers), 1)
+        self.assertEqual(simulator_logger.level, logging.DEBUG)
@@ -0,0 +1,161 @@
+"""Logging of the messages exchanged by the GroundStation and the satellites.
+
+Per message logging is the hot path of the simulator, so it's done through a `MessageLog`:
+callers check `active` (a level check) before building anything, one of every `sample`
+messages is logged at DEBUG level, and every message is recorded in the trace sink if there is
+one. Trace sinks write a record per message to a file, as JSON lines or packed binary records
+(see `read_trace`), to analyze runs without going through the logging formatting.
+"""
+import json
+import logging
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+SENT = 'out'
+RECEIVED = 'in'
+
+# Binary trace record: time, direction (0 received, 1 sent), message type, and the lengths of
+# the node, peer and detail strings that follow it
+RECORD = struct.Struct('!dBBHHH')
+
+
+def setup_logging():
+    """Log the simulator messages at DEBUG level to the console, if `settings.DEBUG` is set.
+
+    It's called by the servers and clients constructors, and configures the logging only once.
+    The trace sink is started too, if there's a `settings.TRACE_FILE`.
+    """
+    simulator_logger = logging.getLogger('simulator')
+    if settings.DEBUG and not simulator_logger.handlers:
+        simulator_logger.setLevel(logging.DEBUG)
+        simulator_logger.addHandler(logging.StreamHandler())
+    if settings.TRACE_FILE and sink is None:
+        start_trace(settings.TRACE_FILE, settings.TRACE_FORMAT)
+
+
+def detail(fields):
+    """Return a short description of the message `fields`: the task name or amount of tasks."""
+    if not fields:
+        return ''
+    if isinstance(fields[0], str):
+        return fields[0]
+    return str(len(fields[0]))
+
+
+class JSONLinesSink:
+    """Trace sink that writes a JSON object per message."""
+    format = 'jsonl'
+
+    def __init__(self, path):
+        self.file = open(path, 'a', buffering=1 << 16)
+        self.lock = threading.Lock()
+
+    def record(self, direction, node, peer, kind, fields):
+        line = json.dumps({'time': time.time(), 'direction': direction, 'node': node,
+                           'peer': peer, 'kind': kind, 'detail': detail(fields)})
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class BinarySink:
+    """Trace sink that writes a packed `RECORD` and its strings per message."""
+    format = 'binary'
+
+    def __init__(self, path):
+        self.file = open(path, 'ab', buffering=1 << 16)
+        self.lock = threading.Lock()
+        self.encoded = {}  # Names of the nodes and peers, encoded
+
+    def encode(self, name):
+        try:
+            return self.encoded[name]
+        except KeyError:
+            data = self.encoded[name] = str(name).encode()
+            return data
+
+    def record(self, direction, node, peer, kind, fields):
+        node, peer, text = self.encode(node), self.encode(peer), detail(fields).encode()
+        data = b''.join((RECORD.pack(time.time(), direction == SENT, kind, len(node), len(peer),
+                                     len(text)), node, peer, text))
+        with self.lock:
+            self.file.write(data)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+SINKS = {sink.format: sink for sink in (JSONLinesSink, BinarySink)}
+
+
+def read_trace(path, format='jsonl'):
+    """Iterate over the records of a trace file, as dicts."""
+    if format == 'jsonl':
+        with open(path) as trace:
+            for line in trace:
+                yield json.loads(line)
+        return
+    with open(path, 'rb') as trace:
+        data = trace.read()
+    offset = 0
+    while offset < len(data):
+        timestamp, sent, kind, *lengths = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        strings = []
+        for length in lengths:
+            strings.append(data[offset:offset + length].decode())
+            offset += length
+        yield {'time': timestamp, 'direction': SENT if sent else RECEIVED, 'node': strings[0],
+               'peer': strings[1], 'kind': kind, 'detail': strings[2]}
+
+
+sink = None  # Trace sink of the process, see `start_trace`
+
+
+def start_trace(path, format='jsonl'):
+    """Record every message exchanged in this process to the trace file at `path`."""
+    global sink
+    stop_trace()
+    sink = SINKS[format](path)
+    return sink
+
+
+def stop_trace():
+    global sink
+    if sink is not None:
+        sink.close()
+        sink = None
+
+
+class MessageLog:
+    """Per message logging to `logger`, sampled, and recording to the trace sink.
+
+    The messages are logged lazily: nothing is formatted unless `active` is True.
+    """
+
+    def __init__(self, logger, sample=None):
+        self.logger = logger
+        self.sample = sample or settings.LOG_MESSAGES_SAMPLE  # Log one of every `sample`
+        self.count = 0
+
+    @property
+    def active(self):
+        return sink is not None or self.logger.isEnabledFor(logging.DEBUG)
+
+    def log(self, direction, node, peer, kind, fields):
+        """Log a message of type `kind` with `fields` sent to or received from `peer`."""
+        current = sink  # It can be stopped from other thread meanwhile
+        if current is not None:
+            current.record(direction, node, peer, kind, fields)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.count += 1
+            if self.count >= self.sample:
+                self.count = 0
+                self.logger.debug("[%s] %s %s %s %s", node, direction, peer, kind, fields)
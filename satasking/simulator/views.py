@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+
+from simulator import export, metrics
+from simulator.cluster import Coordinator
+from simulator.control import ControlClient
+from simulator.filters import TaskExecutionFilter
+from simulator.models import TaskExecution
+
+
+def metrics_view(request):
+    """Serve the metrics of the process, and of the running GroundStation server, for Prometheus.
+
+    The nodes of a `Coordinator` keep their own gauges, so they aren't served. With the
+    `run_ground_station` daemon, the metrics are the ones of the daemon.
+    """
+    if settings.GROUND_STATION_SOCKET:
+        try:
+            text = ControlClient(settings.GROUND_STATION_SOCKET).metrics()
+        except OSError:
+            text = metrics.render()
+    else:
+        server = None if isinstance(settings.SERVER, Coordinator) else settings.SERVER
+        text = metrics.render(server)
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def export_view(request, format):
+    """Stream the executions, filtered as in the API, in one of the `export.FORMATS`."""
+    if format not in export.FORMATS:
+        raise Http404("Unknown export format: {}".format(format))
+    filterset = TaskExecutionFilter(request.GET, TaskExecution.objects.all())
+    if not filterset.is_valid():
+        return HttpResponseBadRequest(filterset.errors.as_json(),
+                                      content_type='application/json')
+    _, content_type, extension = export.FORMATS[format]
+    response = StreamingHttpResponse(export.export(filterset.qs, format),
+                                     content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="executions.{}"'.format(extension)
+    return response
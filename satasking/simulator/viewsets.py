@@ -1,10 +1,167 @@
-from rest_framework import viewsets
+import hashlib
 
-from simulator.models import TaskExecution
-from simulator.serializers import TaskExecutionSerializer
+from django.conf import settings
+from django.core.cache import cache
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import mixins, pagination, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from simulator import analytics, ingest, jobs
+from simulator.filters import SatelliteHourFilter, TaskExecutionFilter
+from simulator.models import DispatchJob, GroundStation, SatelliteHour, TaskExecution
+from simulator.serializers import (DispatchJobSerializer, SatelliteHourSerializer,
+                                   TaskExecutionSerializer, UtilizationSerializer)
+
+
+def cached_response(request, compute):
+    """Return a response with the data returned by `compute()`, cached and tagged with an ETag
+    until the executions change.
+
+    Clients can ask for it again with `If-None-Match` and get a 304 response if nothing changed.
+    """
+    key = '{}:{}:{}'.format(TaskExecution.version(), request.get_full_path(),
+                            request.accepted_media_type)
+    etag = '"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    cache_key = 'simulator.api:' + etag
+    data = cache.get(cache_key)
+    if data is None:
+        data = compute()
+        cache.set(cache_key, data, settings.EXECUTIONS_CACHE_TIMEOUT)
+    return Response(data, headers=headers)
+
+
+class TaskExecutionPagination(pagination.CursorPagination):
+    """Pages of executions from the newest, that take the same time at any depth."""
+    ordering = ('-date_time', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
 
 
 class TaskExecutionViewSet(viewsets.ModelViewSet):
-    """API endpoint that serves the logs of task execution."""
-    queryset = TaskExecution.objects.all().order_by('-date_time')
+    """API endpoint that serves the logs of task execution.
+
+    Listed pages are cached and tagged with an ETag until new executions are saved.
+    """
+    queryset = TaskExecution.objects.select_related('task', 'satellite').order_by('-date_time')
     serializer_class = TaskExecutionSerializer
+    pagination_class = TaskExecutionPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = TaskExecutionFilter
+
+    def list(self, request, *args, **kwargs):
+        parent = super()
+        return cached_response(request, lambda: parent.list(request, *args, **kwargs).data)
+
+
+class DispatchJobPagination(pagination.CursorPagination):
+    ordering = '-id'
+    page_size = 100
+
+
+class DispatchJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                         mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """API endpoint to dispatch tasks in the background.
+
+    Creating a job only saves it and queues it to the worker of `simulator.jobs`, so it answers
+    with 202 at once for any amount of tasks. The job is then polled for its progress and
+    results. Only admin users can use it.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+    queryset = DispatchJob.objects.all()
+    serializer_class = DispatchJobSerializer
+    pagination_class = DispatchJobPagination
+
+    def perform_create(self, serializer):
+        jobs.worker.enqueue(serializer.save())
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+class TaskIngestViewSet(viewsets.ViewSet):
+    """API endpoint to create tasks in bulk from an upload, see `simulator.ingest`.
+
+    The body is read as a stream of NDJSON rows, or CSV with a header if its content type is
+    `text/csv`, and the tasks are inserted by chunks as they're read. It answers with the counts
+    of created, duplicated and invalid rows, and the rows by second. Only admin users can use it.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def create(self, request):
+        content_type = request.content_type.split(';')[0].strip()
+        format = 'csv' if content_type == 'text/csv' else 'ndjson'
+        report = ingest.ingest(request._request, format, settings.INGEST_CHUNK)
+        return Response(report.as_dict())
+
+
+class AnalyticsPagination(pagination.PageNumberPagination):
+    page_size = 1000
+    page_size_query_param = 'page_size'
+    max_page_size = 10000
+
+
+class AnalyticsViewSet(viewsets.GenericViewSet):
+    """API endpoints of the executions aggregated by hour, computed from their rollups.
+
+    `payoff` serves the executions and payoff of each satellite by hour, and `utilization` the
+    ones of all the satellites with the resources used. Both are cached as the executions.
+    """
+    queryset = SatelliteHour.objects.all()
+    pagination_class = AnalyticsPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = SatelliteHourFilter
+
+    def aggregate(self, request, function, serializer_class):
+        def compute():
+            page = self.paginate_queryset(function(self.filter_queryset(self.get_queryset())))
+            return self.get_paginated_response(serializer_class(page, many=True).data).data
+        return cached_response(request, compute)
+
+    @action(detail=False)
+    def payoff(self, request):
+        return self.aggregate(request, analytics.payoff_by_hour, SatelliteHourSerializer)
+
+    @action(detail=False)
+    def utilization(self, request):
+        return self.aggregate(request, analytics.utilization, UtilizationSerializer)
+
+
+class GroundStationViewSet(viewsets.ViewSet):
+    """API endpoints to run and stop the GroundStation, and to get its status.
+
+    With `settings.GROUND_STATION_SOCKET` the server is the `run_ground_station` daemon, so any
+    web process can control it. Only admin users can use them.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def status(self, station):
+        data = {'hostname': station.hostname, 'port': station.port,
+                'running': station.running, 'alive': station.alive}
+        if data['alive'] and settings.GROUND_STATION_SOCKET:
+            try:
+                data.update(station.server.status())
+            except OSError:
+                data['alive'] = False
+        return Response(data)
+
+    def list(self, request):
+        return self.status(GroundStation.load())
+
+    @action(detail=False, methods=['post'])
+    def run(self, request):
+        station = GroundStation.load()
+        station.run()
+        return self.status(station)
+
+    @action(detail=False, methods=['post'])
+    def stop(self, request):
+        station = GroundStation.load()
+        station.stop()
+        return self.status(station)